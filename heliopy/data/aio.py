@@ -0,0 +1,86 @@
+"""
+Methods for loading data from inside an :mod:`asyncio` event loop.
+
+Loading data involves blocking network and file access, so calling the data
+import methods directly from a coroutine stops the event loop until all the
+data has been loaded. :func:`load` instead runs them in the event loop's
+executor, so many datasets and intervals can be loaded concurrently::
+
+    import asyncio
+    from datetime import datetime
+
+    from heliopy.data import aio, ace, wind
+
+    async def main():
+        starttime = datetime(2010, 1, 1)
+        endtime = datetime(2010, 1, 5)
+        return await asyncio.gather(
+            aio.load(wind.mfi_h0, starttime, endtime),
+            aio.load(ace.mfi_h0, starttime, endtime))
+
+    loop = asyncio.get_event_loop()
+    mfi_wind, mfi_ace = loop.run_until_complete(main())
+
+The blocking work is run using the event loop's default executor, which can be
+changed with :meth:`asyncio.loop.set_default_executor` to limit the number of
+threads in use. Missing intervals of a :class:`~heliopy.data.util.Downloader`
+are downloaded the same way as by its
+:meth:`~heliopy.data.util.Downloader.load` method, using up to
+``max_workers`` threads of their own.
+"""
+import asyncio
+import functools
+
+from heliopy.data import quota, util
+
+
+async def load(loader, *args, **kwargs):
+    """
+    Load data without blocking the event loop.
+
+    Parameters
+    ----------
+    loader : callable or :class:`~heliopy.data.util.Downloader`
+        Either a data import method (e.g. :func:`heliopy.data.wind.mfi_h0`),
+        or a :class:`~heliopy.data.util.Downloader` instance. If a
+        :class:`~heliopy.data.util.Downloader` is given, the missing
+        intervals are downloaded in the executor before the data is read in,
+        with at most *max_workers* downloads running at the same time.
+    args, kwargs :
+        Arguments passed to *loader*, or to
+        :meth:`~heliopy.data.util.Downloader.load` if *loader* is a
+        :class:`~heliopy.data.util.Downloader`.
+
+    Returns
+    -------
+    data : :class:`~sunpy.timeseries.TimeSeries`
+        Requested data.
+    """
+    if isinstance(loader, util.Downloader):
+        return await _load_downloader(loader, *args, **kwargs)
+    return await _run(loader, *args, **kwargs)
+
+
+async def _load_downloader(downloader, starttime, endtime, max_workers=None,
+                           columns=None):
+    intervals = downloader.intervals(starttime, endtime)
+    if not len(intervals):
+        raise RuntimeError('No intervals provided')
+    # Downloaded by _download_missing, so downloaders that combine
+    # neighbouring intervals into one request (e.g. CDAS) still do so
+    no_data = await _run(downloader._download_missing, intervals,
+                         max_workers=max_workers)
+    data = await _run(downloader._load_intervals,
+                      intervals, no_data, starttime, endtime,
+                      columns=columns)
+    await _run(quota.enforce)
+    return data
+
+
+def _run(func, *args, **kwargs):
+    """
+    Run ``func(*args, **kwargs)`` in the default executor of the running
+    event loop.
+    """
+    loop = asyncio.get_event_loop()
+    return loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
@@ -0,0 +1,675 @@
+"""
+Formats for storing data that has been converted from the downloaded files.
+
+When ``use_hdf`` is set in the heliopyrc file (or when prefetching data),
+each downloaded file is converted to a :class:`pandas.DataFrame` and saved
+next to the original file, so it is much quicker to load next time. The
+format of these files is set by the ``cache_format`` option, and can be:
+
+- ``hdf``: HDF5 files, which needs pytables. This is the default.
+- ``parquet``: Parquet files, which needs pyarrow. These are usually much
+  smaller than HDF files.
+- ``numpy``: uncompressed arrays, which are memory-mapped instead of being
+  read in (see :class:`NumpyBackend`). These are the quickest to load,
+  especially when only a few columns or a short time range of long, high
+  cadence data is used, but are the largest files.
+
+Files already saved in any of these formats are read whichever format is
+chosen, so changing the format doesn't require converting the files again.
+The units of data converted from CDF files are saved along with it, so the
+original file isn't needed to load the data.
+
+Data converted with different loader parameters (e.g. the data rate of
+:func:`heliopy.data.artemis.fgm`) is saved in different files, whose names
+end with a tag made from the parameters (see :func:`tag`). Each file also
+records the version of the code that converted it, and the name and size of
+the original file. If the loader's version changes, or a different original
+file is downloaded, the data is converted again the next time it is loaded.
+
+Which copies of the data are kept is set by the ``cache_tier`` option:
+
+- ``both``: keep the downloaded files and any converted copies. This is the
+  default.
+- ``raw``: only keep the downloaded files, and never save converted copies.
+- ``converted``: convert each downloaded file, and remove the original once
+  the converted copy has been saved and read back successfully. This roughly
+  halves the space needed to store data.
+
+Converted data can also be kept in memory, so loading the same data again in
+the same session doesn't need to read any files. This is turned on by setting
+``memory_cache_size`` in the heliopyrc file to the maximum amount of memory
+(in megabytes) to use. When this limit is reached, the least recently used
+data is dropped first. The cache can be emptied with
+``memory_cache.clear()``.
+"""
+import abc
+import collections
+import glob
+import hashlib
+import json
+import os
+import pathlib
+import re
+import sys
+import threading
+
+import astropy.units as u
+import numpy as np
+import pandas as pd
+
+from heliopy import config
+
+
+class UnsupportedDataError(TypeError):
+    """
+    Raised when a backend can't store the data it is given without changing
+    it.
+    """
+    pass
+
+
+class CacheBackend(abc.ABC):
+    """
+    A file format that converted data can be stored in.
+
+    Sub-classes must set :attr:`suffix` and implement :meth:`write`,
+    :meth:`read` and :meth:`read_metadata`.
+
+    Parameters
+    ----------
+    compression : str, optional
+        Compression codec to use when writing files. Valid values depend on
+        the format. If not given, the default for the format is used.
+    compression_level : int, optional
+        Compression level to use with *compression*.
+    """
+    #: File suffix, including the leading dot.
+    suffix = None
+
+    def __init__(self, compression=None, compression_level=None):
+        self.compression = compression
+        self.compression_level = compression_level
+
+    def path(self, raw_path, tag=None):
+        """
+        Path of the file storing converted data from *raw_path*.
+
+        Parameters
+        ----------
+        raw_path : pathlib.Path
+        tag : str, optional
+            Tag for the parameters the data was converted with, as returned
+            by :func:`tag`.
+        """
+        return _converted_path(raw_path, tag, self.suffix)
+
+    @abc.abstractmethod
+    def write(self, df, path, metadata=None):
+        """
+        Save *df* to *path*.
+
+        Parameters
+        ----------
+        df : pandas.DataFrame
+        path : pathlib.Path
+        metadata : dict, optional
+            Information to save along with the data, which must be able to be
+            stored as JSON.
+        """
+        pass
+
+    @abc.abstractmethod
+    def read_metadata(self, path):
+        """
+        Read the metadata saved in *path*.
+
+        Returns
+        -------
+        dict
+            Metadata, which is empty if none was saved.
+        """
+        pass
+
+    @abc.abstractmethod
+    def read(self, path, columns=None, starttime=None, endtime=None):
+        """
+        Read the data saved in *path*.
+
+        Parameters
+        ----------
+        path : pathlib.Path
+        columns : list of str, optional
+            Columns to read, as for :func:`select_columns`. If not given, all
+            columns are read.
+        starttime : datetime.datetime, optional
+            If given, rows before *starttime* can be skipped.
+        endtime : datetime.datetime, optional
+            If given, rows after *endtime* can be skipped.
+
+        Returns
+        -------
+        df : pandas.DataFrame
+            Data, which might still contain rows outside of *starttime* and
+            *endtime* if the format can't skip them.
+        """
+        pass
+
+
+class HDFBackend(CacheBackend):
+    """
+    Store data in HDF5 files, using :meth:`pandas.DataFrame.to_hdf`.
+
+    Data is saved in the table format, with an indexed time column, so only
+    the rows between the requested start and end times are read. Files saved
+    in the fixed format by older versions of heliopy are read whole.
+
+    *compression* can be any compression library supported by pytables (e.g.
+    ``'zlib'``, ``'blosc'``, ``'bzip2'``), and by default files are not
+    compressed.
+    """
+    suffix = '.hdf'
+
+    def write(self, df, path, metadata=None):
+        kwargs = {}
+        if self.compression is not None:
+            kwargs['complib'] = self.compression
+            kwargs['complevel'] = \
+                9 if self.compression_level is None else self.compression_level
+        try:
+            df.to_hdf(path, key='data', mode='w', format='table', **kwargs)
+        except (TypeError, ValueError):
+            # Some data, e.g. object columns with mixed types, can only be
+            # stored in the fixed format, which is read whole
+            df.to_hdf(path, key='data', mode='w', format='fixed', **kwargs)
+        if metadata:
+            with pd.HDFStore(path, mode='a') as store:
+                store.get_storer('data').attrs.heliopy_metadata = \
+                    json.dumps(metadata)
+
+    def read_metadata(self, path):
+        with pd.HDFStore(path, mode='r') as store:
+            attrs = store.get_storer('data').attrs
+            if 'heliopy_metadata' in attrs:
+                return json.loads(attrs.heliopy_metadata)
+        return {}
+
+    def read(self, path, columns=None, starttime=None, endtime=None):
+        with pd.HDFStore(path, mode='r') as store:
+            if not store.get_storer('data').is_table:
+                return select_columns(store['data'], columns)
+            # Only tables with a time index can be queried by time
+            index = store.select('data', stop=0).index
+            where = []
+            if isinstance(index, pd.DatetimeIndex):
+                if starttime is not None:
+                    where.append(f"index >= '{pd.Timestamp(starttime)}'")
+                if endtime is not None:
+                    where.append(f"index <= '{pd.Timestamp(endtime)}'")
+            df = store.select('data', where=where or None)
+        return select_columns(df, columns)
+
+
+class ParquetBackend(CacheBackend):
+    """
+    Store data in Parquet files, using :meth:`pandas.DataFrame.to_parquet`
+    and pyarrow.
+
+    Data is saved in groups of :attr:`row_group_size` rows. Groups that
+    don't overlap the requested start and end times are skipped when reading.
+
+    *compression* can be any codec supported by pyarrow (e.g. ``'snappy'``,
+    ``'zstd'``, ``'gzip'``), and defaults to ``'snappy'``.
+    """
+    suffix = '.parquet'
+    #: Number of rows in each group of rows saved together.
+    row_group_size = 2**14
+
+    def write(self, df, path, metadata=None):
+        import pyarrow
+        import pyarrow.parquet
+        table = pyarrow.Table.from_pandas(df)
+        if metadata:
+            schema_metadata = dict(table.schema.metadata or {})
+            schema_metadata[b'heliopy_metadata'] = \
+                json.dumps(metadata).encode()
+            table = table.replace_schema_metadata(schema_metadata)
+        pyarrow.parquet.write_table(
+            table, path, compression=self.compression or 'snappy',
+            compression_level=self.compression_level,
+            row_group_size=self.row_group_size)
+
+    def read_metadata(self, path):
+        import pyarrow.parquet
+        metadata = pyarrow.parquet.read_schema(path).metadata or {}
+        if b'heliopy_metadata' in metadata:
+            return json.loads(metadata[b'heliopy_metadata'].decode())
+        return {}
+
+    def read(self, path, columns=None, starttime=None, endtime=None):
+        import pyarrow.parquet
+        schema = pyarrow.parquet.read_schema(path)
+        if columns is not None:
+            # The index is read as well as the selected columns
+            columns = [name for name in schema.names
+                       if _selected(name, columns)]
+        filters = []
+        metadata = schema.pandas_metadata or {}
+        index_columns = metadata.get('index_columns', [])
+        if len(index_columns) == 1 and isinstance(index_columns[0], str):
+            time_type = schema.field(index_columns[0]).type
+            if pyarrow.types.is_timestamp(time_type):
+                if starttime is not None:
+                    filters.append((index_columns[0], '>=',
+                                    pd.Timestamp(starttime)))
+                if endtime is not None:
+                    filters.append((index_columns[0], '<=',
+                                    pd.Timestamp(endtime)))
+        return pd.read_parquet(path, engine='pyarrow', columns=columns,
+                               filters=filters or None)
+
+
+class NumpyBackend(CacheBackend):
+    """
+    Store the index and each column of the data as uncompressed arrays in a
+    single file, which are memory-mapped when read.
+
+    Reading data doesn't copy it: the columns of the returned data frame
+    refer directly to the file, so only the parts of the columns that are
+    actually used are read from disk. Only the requested columns are mapped,
+    and if the data has a sorted time index the requested rows are found by
+    a binary search of the index, so selecting a short time range of a long
+    file is cheap. Data loaded from a single file stays memory-mapped, but
+    data from several files is joined together into a new data frame.
+
+    Only data whose index and columns all have a fixed size numpy type (e.g.
+    floats, integers, booleans and times without a time zone) can be stored.
+    Other data (e.g. strings stored as Python objects, or times with a time
+    zone) raises :class:`UnsupportedDataError`, and is saved in the ``hdf``
+    format instead when it is converted. Files are never compressed, so
+    *compression* is ignored.
+
+    On Windows a memory-mapped file can't be removed while it is in use, so
+    a file can't be removed (e.g. to keep within the disk quota, or when
+    only converted copies are kept) while any data frame read from it still
+    exists.
+    """
+    suffix = '.npcols'
+    #: Alignment, in bytes, of each array in the file.
+    alignment = 64
+
+    _magic = b'HPYCOLS1'
+
+    def write(self, df, path, metadata=None):
+        if isinstance(df.columns, pd.MultiIndex):
+            raise UnsupportedDataError('Data with multi-level columns cannot '
+                                       'be saved in the numpy format')
+        index = [df.index.get_level_values(i)
+                 for i in range(df.index.nlevels)]
+        # Check everything can be stored before writing anything
+        index = [_fixed_size_array(values, name)
+                 for name, values in zip(df.index.names, index)]
+        values = [_fixed_size_array(df[column], column)
+                  for column in df.columns]
+        header = {'metadata': metadata or {}, 'length': len(df),
+                  'sorted': bool(df.index.is_monotonic_increasing),
+                  'index': [], 'columns': []}
+        with open(path, 'wb') as f:
+            # The offset of the header is filled in once it's been written
+            f.write(self._magic + bytes(8))
+            for key, names, arrays in [
+                    ('index', df.index.names, index),
+                    ('columns', df.columns, values)]:
+                for name, values in zip(names, arrays):
+                    f.write(bytes(-f.tell() % self.alignment))
+                    header[key].append({'name': name,
+                                        'dtype': values.dtype.str,
+                                        'offset': f.tell()})
+                    f.write(values.tobytes())
+            header_offset = f.tell()
+            f.write(json.dumps(header).encode())
+            f.seek(len(self._magic))
+            f.write(header_offset.to_bytes(8, 'little'))
+
+    def _read_header(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(self._magic)) != self._magic:
+                raise ValueError(f'{path} is not a numpy format file')
+            f.seek(int.from_bytes(f.read(8), 'little'))
+            return json.loads(f.read().decode())
+
+    def read_metadata(self, path):
+        return self._read_header(path)['metadata']
+
+    def read(self, path, columns=None, starttime=None, endtime=None):
+        header = self._read_header(path)
+        length = header['length']
+        # Changes made to the data are kept in memory, not written to disk.
+        # The data is given out as plain arrays that refer to the map.
+        buffer = np.memmap(path, mode='c').view(np.ndarray)
+
+        def array(entry, start=0, stop=length):
+            dtype = np.dtype(entry['dtype'])
+            offset = entry['offset'] + start * dtype.itemsize
+            return buffer[offset:offset + (stop - start) * dtype.itemsize] \
+                .view(dtype)
+
+        start, stop = 0, length
+        index = header['index']
+        if (len(index) == 1 and header['sorted'] and
+                np.dtype(index[0]['dtype']).kind == 'M'):
+            times = array(index[0])
+            if starttime is not None:
+                start = np.searchsorted(
+                    times, pd.Timestamp(starttime).to_datetime64(), 'left')
+            if endtime is not None:
+                stop = np.searchsorted(
+                    times, pd.Timestamp(endtime).to_datetime64(), 'right')
+            stop = max(start, stop)
+
+        levels = []
+        for entry in index:
+            values = array(entry, start, stop)
+            if values.dtype.kind == 'M':
+                # pd.Index would copy the times
+                levels.append(pd.DatetimeIndex(values, name=entry['name'],
+                                               copy=False))
+            else:
+                levels.append(pd.Index(values, name=entry['name'],
+                                       copy=False))
+        if len(levels) == 1:
+            index = levels[0]
+        else:
+            index = pd.MultiIndex.from_arrays(levels)
+        data = collections.OrderedDict(
+            (entry['name'], array(entry, start, stop))
+            for entry in header['columns']
+            if columns is None or _selected(entry['name'], columns))
+        return pd.DataFrame(data, index=index, columns=list(data),
+                            copy=False)
+
+
+def _fixed_size_array(values, name):
+    """
+    Values of *values* as a contiguous numpy array with a fixed size type.
+
+    Raises :class:`UnsupportedDataError` if *values*, whose name is *name*,
+    don't have a numpy type that can be stored and read back unchanged.
+    """
+    if not isinstance(values.dtype, np.dtype) or values.dtype.hasobject:
+        raise UnsupportedDataError(
+            f'{name} has type {values.dtype}, so cannot be saved in the '
+            'numpy format')
+    return np.ascontiguousarray(np.asarray(values))
+
+
+def encode_units(units):
+    """
+    Convert *units*, which maps column names to units, so they can be saved
+    in the metadata of a file.
+    """
+    return [[column, unit.to_string()] for column, unit in units.items()]
+
+
+def read_units(path):
+    """
+    Read the units saved with the converted data in *path*.
+
+    Returns
+    -------
+    collections.OrderedDict or None
+        Maps column names to their units, or ``None`` if no units were saved.
+    """
+    units = backend_for(path).read_metadata(path).get('units')
+    if units is not None:
+        return collections.OrderedDict(
+            (column, u.Unit(unit)) for column, unit in units)
+
+
+def tag(params):
+    """
+    Tag identifying the loader parameters that data was converted with.
+
+    Parameters
+    ----------
+    params : dict
+        Parameters that change the converted data.
+
+    Returns
+    -------
+    str or None
+        A short hash of *params*, or ``None`` if there aren't any parameters.
+    """
+    if not params:
+        return None
+    text = json.dumps(params, sort_keys=True, default=repr)
+    return hashlib.sha1(text.encode()).hexdigest()[:_TAG_LENGTH]
+
+
+_TAG_LENGTH = 8
+
+
+def _converted_path(raw_path, tag, suffix):
+    if tag is None:
+        return raw_path.with_suffix(suffix)
+    return raw_path.with_name(f'{raw_path.stem}-{tag}{suffix}')
+
+
+def raw_stem(path):
+    """
+    Name of the converted file *path*, without its suffix or any tag.
+    """
+    return re.sub(f'-[0-9a-f]{{{_TAG_LENGTH}}}$', '', path.stem)
+
+
+#: Available formats, with the names used for ``cache_format``.
+backends = {'hdf': HDFBackend, 'parquet': ParquetBackend,
+            'numpy': NumpyBackend}
+
+
+def get_backend(name=None):
+    """
+    Get the backend used to save newly converted data.
+
+    Parameters
+    ----------
+    name : str, optional
+        Name of the format. If not given, the ``cache_format`` value from the
+        heliopyrc file is used.
+
+    Returns
+    -------
+    CacheBackend
+        Backend, using the compression set in the heliopyrc file.
+    """
+    if name is None:
+        name = config['cache_format']
+    if name not in backends:
+        raise ValueError(f'cache_format must be one of '
+                         f'{", ".join(backends)} (got {name})')
+    return backends[name](compression=config['cache_compression'],
+                          compression_level=config['cache_compression_level'])
+
+
+def suffixes():
+    """
+    File suffixes of all the formats, starting with the one used to save
+    newly converted data.
+    """
+    current = backends[config['cache_format']].suffix
+    return [current] + [backend.suffix for backend in backends.values()
+                        if backend.suffix != current]
+
+
+def backend_for(path):
+    """
+    Get the backend for reading the existing file *path*.
+    """
+    for name, backend in backends.items():
+        if path.suffix == backend.suffix:
+            return get_backend(name)
+    raise ValueError(f'{path} is not a converted data file')
+
+
+def find(raw_path, tag=None):
+    """
+    Find the converted copy of *raw_path*, in any format.
+
+    Parameters
+    ----------
+    raw_path : pathlib.Path
+    tag : str, optional
+        Tag for the parameters the data was converted with.
+
+    Returns
+    -------
+    pathlib.Path or None
+        Path to the converted file, or ``None`` if the data hasn't been
+        converted.
+    """
+    for suffix in suffixes():
+        path = _converted_path(raw_path, tag, suffix)
+        if path.exists():
+            return path
+
+
+def select_columns(df, columns):
+    """
+    Select *columns* from *df*.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    columns : list of str or None
+        Names of the columns to select. A name can also be given without the
+        ``_0``, ``_1``... suffix added to each component of a vector variable
+        (e.g. ``'B'`` for ``'B_0'``, ``'B_1'`` and ``'B_2'``) to select all
+        of the components. Names not in *df* are ignored. If ``None``, *df* is
+        returned unchanged.
+
+    Returns
+    -------
+    pandas.DataFrame
+    """
+    if columns is None:
+        return df
+    return df[[column for column in df.columns if _selected(column, columns)]]
+
+
+def _selected(column, columns):
+    if column in columns:
+        return True
+    name, _, component = str(column).rpartition('_')
+    return component.isdigit() and name in columns
+
+
+def remove(raw_path):
+    """
+    Remove any converted copies of *raw_path*, with any tag.
+
+    Returns
+    -------
+    list of pathlib.Path
+        The files that were removed.
+    """
+    removed = []
+    tagged = glob.escape(str(raw_path.with_suffix(''))) + '-' + \
+        '[0-9a-f]' * _TAG_LENGTH
+    for suffix in suffixes():
+        paths = [raw_path.with_suffix(suffix)]
+        paths += [pathlib.Path(p) for p in glob.glob(tagged + suffix)]
+        for path in paths:
+            if path.exists():
+                os.remove(path)
+                removed.append(path)
+    return removed
+
+
+class MemoryCache:
+    """
+    Converted data kept in memory, up to a maximum size.
+
+    When adding new data would take the total size over *max_bytes*, the
+    least recently used data is removed from the cache.
+
+    Parameters
+    ----------
+    max_bytes : int
+        Maximum size of the data in the cache. If zero, nothing is cached.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        """
+        ``True`` if data can be stored in the cache.
+        """
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """
+        Get the data stored under *key*, or ``None`` if it isn't stored.
+        """
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        """
+        Store *value* under *key*.
+
+        Parameters
+        ----------
+        key : hashable
+        value : pandas.DataFrame or tuple
+            Data to store. If a tuple, the size of any data frames it contains
+            is counted.
+        """
+        nbytes = _nbytes(value)
+        with self._lock:
+            self._discard(key)
+            if nbytes > self.max_bytes:
+                return
+            while self.nbytes + nbytes > self.max_bytes:
+                self._discard(next(iter(self._items)))
+            self._items[key] = (value, nbytes)
+            self.nbytes += nbytes
+
+    def discard(self, key):
+        """
+        Remove the data stored under *key*, if there is any.
+        """
+        with self._lock:
+            self._discard(key)
+
+    def clear(self):
+        """
+        Remove all the data from the cache.
+        """
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+    def _discard(self, key):
+        if key in self._items:
+            self.nbytes -= self._items.pop(key)[1]
+
+    def __len__(self):
+        return len(self._items)
+
+
+def _nbytes(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    elif isinstance(value, tuple):
+        return sum(_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+#: Data kept in memory, limited to ``memory_cache_size`` megabytes.
+memory_cache = MemoryCache(int(config['memory_cache_size'] * 2**20))
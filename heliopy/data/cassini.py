@@ -47,6 +47,8 @@ leapmonth2str = {1: '001_031_JAN',
 
 
 class _mag1minDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, coords):
         valid_coords = ['KRTP', 'KSM', 'KSO', 'RTN']
         if coords not in valid_coords:
@@ -96,7 +98,7 @@ class _mag1minDownloader(util.Downloader):
                               local_dir)
 
     def load_local_file(self, interval):
-        f = open(self.local_path(interval))
+        f = self.open_local_file(interval)
         if 'error_message' in f.readline():
             f.close()
             os.remove(f.name)
@@ -211,4 +213,4 @@ def mag_hires(starttime, endtime, try_download=True):
     return util.process(dirs, fnames, extension, local_base_dir,
                         remote_base_url, download_func, processing_func,
                         starttime, endtime, units=units,
-                        try_download=try_download)
+                        try_download=try_download, compress_raw=True)
@@ -3,16 +3,23 @@ Helper methods for using the CDAS REST web services.
 
 For more information see https://cdaweb.sci.gsfc.nasa.gov/WebServices/REST/
 """
+import concurrent.futures as futures
 import datetime as dt
+import json
+import os
 import pathlib
 import tempfile
+import time
 
-import requests
+import cdflib
+import numpy as np
 import requests.exceptions
 import sunpy.time as stime
-import tqdm.auto as tqdm
 
 import heliopy.data.util as util
+from heliopy.data import lock
+from heliopy.data import manifest
+from heliopy import config
 
 CDAS_BASEURL = 'https://cdaweb.gsfc.nasa.gov/WS/cdasr/1'
 CDAS_HEADERS = {'Accept': 'application/json'}
@@ -57,15 +64,38 @@ def _year_intervals(starttime, endtime):
     return intervallist
 
 
+class CDASRequestError(util.NoDataError):
+    """
+    Raised when the CDAS server rejects a request, e.g. because the requested
+    interval is too long.
+    """
+    pass
+
+
 class CDASDwonloader(util.Downloader):
+    """
+    Downloader for daily files from the CDAS web services.
+
+    Parameters
+    ----------
+    coalesce : bool, optional
+        If ``True``, runs of contiguous missing days are requested from CDAS
+        in a single request, and the returned file is split into daily files.
+        If the server rejects a request the run is split in half and each half
+        requested separately. Defaults to the ``cdas_coalesce`` configuration
+        option.
+    """
     def __init__(self, dataset, identifier, dir, badvalues=None,
-                 warn_missing_units=True, units=None):
+                 warn_missing_units=True, units=None, coalesce=None):
         self.dataset = dataset
         self.identifier = identifier
         self.dir = dir
         self.badvalues = badvalues
         self.units = units
         self.warn_missing_units = warn_missing_units
+        if coalesce is None:
+            coalesce = config['cdas_coalesce']
+        self.coalesce = coalesce
 
     @staticmethod
     def _interval_start(interval):
@@ -97,13 +127,215 @@ class CDASDwonloader(util.Downloader):
     def download(self, interval):
         stime = self._interval_start(interval)
         etime = self._interval_end(interval)
-        return get_data(self.identifier, stime, etime)
+        return get_data(self.identifier, stime, etime,
+                        dl_path=self.local_path(interval))
 
-    def load_local_file(self, interval):
+    def load_local_file(self, interval, columns=None):
         local_path = self.local_path(interval)
         cdf = util._load_cdf(local_path)
         return util.cdf2df(cdf, index_key='Epoch',
-                           badvalues=self.badvalues)
+                           badvalues=self.badvalues, columns=columns)
+
+    def cache_params(self):
+        if self.badvalues is None:
+            return {}
+        return {'badvalues': self.badvalues}
+
+    def _download_missing(self, intervals, max_workers=None):
+        if not self.coalesce:
+            return super()._download_missing(intervals,
+                                             max_workers=max_workers)
+        if max_workers is None:
+            max_workers = config['max_workers']
+        runs = _contiguous_runs(self._missing_intervals(intervals))
+        if max_workers > 1 and len(runs) > 1:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+                no_data = list(ex.map(self._download_run, runs))
+        else:
+            no_data = [self._download_run(run) for run in runs]
+        return [interval for run in no_data for interval in run]
+
+    def _download_run(self, run):
+        """
+        Download a run of contiguous intervals with a single request, and
+        split the result into one file per interval.
+
+        Returns
+        -------
+        no_data : list of sunpy.time.TimeRange
+            Intervals for which no data is available.
+        """
+        if len(run) == 1:
+            return [] if self._download_interval(run[0]) else list(run)
+
+        stime = self._interval_start(run[0])
+        etime = self._interval_end(run[-1])
+        try:
+            # A request that fails is split straight away rather than
+            # retried, as it is most likely too large. Single intervals are
+            # retried as usual.
+            dl_path = get_data(self.identifier, stime, etime, max_retries=0)
+        except (CDASRequestError, requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            util.logger.info(f'Splitting request for {self.identifier} '
+                             f'data from {stime} - {etime}: {e}')
+            half = len(run) // 2
+            return self._download_run(run[:half]) + \
+                self._download_run(run[half:])
+        except util.NoDataError:
+            return list(run)
+
+        try:
+            bounds = [(self._interval_start(i), self._interval_end(i))
+                      for i in run]
+            paths = [self.local_path(i) for i in run]
+            available = _split_cdf(dl_path, bounds, paths)
+        except Exception as e:
+            # Fall back to downloading each interval on its own
+            util.logger.warning(f'Could not split {self.identifier} data '
+                                f'from {stime} - {etime} into daily files: '
+                                f'{e}')
+            available = [self._download_interval(i) for i in run]
+        finally:
+            os.remove(dl_path)
+        return [interval for interval, ok in zip(run, available) if not ok]
+
+
+def _contiguous_runs(intervals):
+    """
+    Split a sorted list of intervals into runs of intervals where each
+    interval starts at the end of the previous one.
+    """
+    runs = []
+    for interval in intervals:
+        if runs and runs[-1][-1].end == interval.start:
+            runs[-1].append(interval)
+        else:
+            runs.append([interval])
+    return runs
+
+
+# CDF data type codes
+_CDF_EPOCH = 31
+_CDF_EPOCH16 = 32
+_CDF_TIME_TT2000 = 33
+_CDF_CHAR_TYPES = (51, 52)
+
+
+def _epoch_bounds(data_type, epochs, bounds):
+    """
+    Convert each (start, end) datetime pair in *bounds* into the indices of
+    the records in *epochs* that lie inside it.
+    """
+    times = [t for bound in bounds for t in bound]
+    if data_type == _CDF_EPOCH:
+        times = cdflib.cdfepoch.compute_epoch(
+            [[t.year, t.month, t.day, t.hour, t.minute, t.second,
+              t.microsecond // 1000] for t in times])
+    elif data_type == _CDF_TIME_TT2000:
+        times = cdflib.cdfepoch.compute_tt2000(
+            [[t.year, t.month, t.day, t.hour, t.minute, t.second,
+              t.microsecond // 1000, t.microsecond % 1000, 0]
+             for t in times])
+    else:
+        epochs = cdflib.cdfepoch.unixtime(epochs, to_np=True)
+        times = [t.replace(tzinfo=dt.timezone.utc).timestamp()
+                 for t in times]
+    indices = np.searchsorted(np.atleast_1d(epochs), times)
+    return list(zip(indices[::2], indices[1::2]))
+
+
+def _split_cdf(cdf_path, bounds, out_paths):
+    """
+    Split a CDF file into several files covering different time intervals.
+
+    Record varying variables are split using the epoch variable they depend
+    on, and all other variables and attributes are copied to each new file.
+
+    Parameters
+    ----------
+    cdf_path : str or pathlib.Path
+        File to split.
+    bounds : list of (datetime.datetime, datetime.datetime)
+        Start and end time of each new file.
+    out_paths : list of pathlib.Path
+        Path of each new file.
+
+    Returns
+    -------
+    available : list of bool
+        ``True`` for each interval that had data in it, and so was written to
+        a new file.
+    """
+    cdf = cdflib.CDF(str(cdf_path))
+    info = cdf.cdf_info()
+    variables = info['rVariables'] + info['zVariables']
+    var_info = {var: cdf.varinq(var) for var in variables}
+    var_attrs = {}
+    for var in variables:
+        attrs = cdf.varattsget(var, expand=True)
+        var_attrs[var] = {key: value for key, value in attrs.items()
+                          if value is not None}
+
+    # Work out which epoch variable each record varying variable depends on
+    depends = {}
+    for var in variables:
+        if not var_info[var]['Rec_Vary']:
+            continue
+        if var_info[var]['Data_Type'] in (
+                _CDF_EPOCH, _CDF_EPOCH16, _CDF_TIME_TT2000):
+            depends[var] = var
+        else:
+            depends[var] = var_attrs[var]['DEPEND_0'][0]
+    records = {}
+    for epoch in set(depends.values()):
+        records[epoch] = _epoch_bounds(
+            var_info[epoch]['Data_Type'], cdf.varget(epoch), bounds)
+
+    cdf_spec = {'Majority': info['Majority'].lower(),
+                'Encoding': info['Encoding'],
+                'Checksum': info['Checksum']}
+    global_attrs = cdf.globalattsget(expand=True)
+    spec_keys = ['Variable', 'Data_Type', 'Num_Elements', 'Rec_Vary',
+                 'Var_Type', 'Dim_Sizes', 'Block_Factor', 'Pad']
+    available = []
+    for i, out_path in enumerate(out_paths):
+        if not any(end > start for start, end in
+                   [r[i] for r in records.values()]):
+            available.append(False)
+            continue
+        out_path = pathlib.Path(out_path)
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        # Other processes might be writing the same file
+        with lock.locked(out_path):
+            if out_path.exists():
+                # Written by another process while waiting for the lock
+                available.append(True)
+                continue
+            # cdflib always writes files with a .cdf extension
+            part_path = out_path.with_suffix('.part.cdf')
+            out_cdf = cdflib.cdfwrite.CDF(str(part_path), cdf_spec=cdf_spec,
+                                          delete=True)
+            out_cdf.write_globalattrs(global_attrs)
+            for var in variables:
+                var_spec = {key: var_info[var][key] for key in spec_keys}
+                data = None
+                if var in depends:
+                    start, end = records[depends[var]][i]
+                    if end > start:
+                        data = cdf.varget(var, startrec=start, endrec=end - 1)
+                else:
+                    data = cdf.varget(var)
+                if data is not None and \
+                        var_info[var]['Data_Type'] in _CDF_CHAR_TYPES:
+                    data = np.asarray(data).ravel().tolist()
+                out_cdf.write_var(var_spec, var_attrs=var_attrs[var],
+                                  var_data=data)
+            out_cdf.close()
+            os.replace(part_path, out_path)
+        manifest.record(out_path, *bounds[i])
+        available.append(True)
+    return available
 
 
 def get_variables(dataset, timeout=10):
@@ -129,15 +361,63 @@ def get_variables(dataset, timeout=10):
         'datasets', dataset,
         'variables'
     ])
-    response = requests.get(url, headers=CDAS_HEADERS, timeout=timeout)
+    response = util._request(url, headers=CDAS_HEADERS, timeout=timeout)
     return response.json()
 
 
+def _variables_cache_path(dataset):
+    return util.data_dir / '.cdas' / 'variables' / f'{dataset}.json'
+
+
+def _get_cached_variables(dataset, timeout=10):
+    """
+    Get the descriptions of variables in a dataset, using a copy cached on
+    disk if it is newer than the ``cdas_metadata_ttl`` configuration option.
+
+    The cache is stored in the download directory, so it is shared between
+    processes. If the server cannot be reached an out of date copy is used
+    instead, if one is available.
+    """
+    cache_path = _variables_cache_path(dataset)
+    ttl = config['cdas_metadata_ttl'] * 24 * 60 * 60
+    cached = None
+    if ttl > 0 and cache_path.exists():
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+        except ValueError:
+            pass
+        else:
+            if time.time() - cache_path.stat().st_mtime < ttl:
+                return cached
+
+    try:
+        var_info = get_variables(dataset, timeout=timeout)
+    except requests.exceptions.RequestException:
+        if cached is None:
+            raise
+        util.logger.info(f'Could not update variables for {dataset}, '
+                         'using cached copy')
+        return cached
+
+    if ttl > 0 and len(var_info):
+        var_info = {'VariableDescription': var_info['VariableDescription']}
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file then move, so other processes never see
+        # a partially written cache file
+        with tempfile.NamedTemporaryFile(
+                'w', dir=cache_path.parent, suffix='.tmp',
+                delete=False) as f:
+            json.dump(var_info, f)
+        os.replace(f.name, cache_path)
+    return var_info
+
+
 def get_cdas_url(starttime, endtime, vars, dataset, timeout=10):
     dataview = 'sp_phys'
     if vars is None:
         try:
-            var_info = get_variables(dataset, timeout=timeout)
+            var_info = _get_cached_variables(dataset, timeout=timeout)
         except requests.exceptions.ReadTimeout:
             raise util.NoDataError(
                 'Connection to CDAweb timed out when getting CDAS URL for '
@@ -145,7 +425,8 @@ def get_cdas_url(starttime, endtime, vars, dataset, timeout=10):
 
         if not len(var_info):
             raise util.NoDataError(
-                f'No {dataset} data available for date {date}')
+                f'No {dataset} data available for interval '
+                f'{starttime} - {endtime}')
 
         vars = [v['Name'] for v in var_info['VariableDescription']]
 
@@ -160,7 +441,8 @@ def get_cdas_url(starttime, endtime, vars, dataset, timeout=10):
     return url
 
 
-def get_data(dataset, starttime, endtime, vars=None, timeout=100):
+def get_data(dataset, starttime, endtime, vars=None, timeout=100,
+             dl_path=None, max_retries=None):
     """
     Download CDAS data.
 
@@ -177,26 +459,46 @@ def get_data(dataset, starttime, endtime, vars=None, timeout=100):
         dataset will be downloaded.
     timeout : float, optional
         Timeout on the CDAweb remote requests, in seconds. Defaults to 10s.
+    dl_path : str or pathlib.Path, optional
+        Path to download the data to. If not given, the data is downloaded to
+        a temporary file.
+    max_retries : int, optional
+        Number of times to retry the request if it fails or times out.
+        Defaults to the ``max_retries`` configuration option.
 
     Returns
     -------
-    data_path : str
-        Path to downloaded data (stored in a temporary directroy)
+    data_path : str or pathlib.Path
+        Path to downloaded data.
+
+    Raises
+    ------
+    CDASRequestError
+        If the server rejects the request.
     """
     url = get_cdas_url(starttime, endtime, vars, dataset, timeout=timeout)
     params = {'format': 'cdf', 'cdfVersion': 3}
-    response = requests.get(
-        url, params=params, headers=CDAS_HEADERS, timeout=timeout)
-
-    if 'FileDescription' in response.json():
+    response = util._request(
+        url, params=params, headers=CDAS_HEADERS, timeout=timeout,
+        max_retries=max_retries)
+    if not response.ok:
+        raise CDASRequestError(
+            f'CDAS request for {dataset} data for interval {starttime} - '
+            f'{endtime} failed with status {response.status_code}')
+    info = response.json()
+    if 'Error' in info:
+        raise CDASRequestError(
+            f'CDAS request for {dataset} data for interval {starttime} - '
+            f'{endtime} failed: {info["Error"]}')
+
+    if 'FileDescription' in info:
         print(f'Downloading {dataset} for interval {starttime} - {endtime}')
-        url = response.json()['FileDescription'][0]['Name']
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            with requests.get(url, stream=True) as request:
-                for chunk in tqdm.tqdm(request.iter_content(chunk_size=128)):
-                    temp_file.write(chunk)
-
-            return temp_file.name
+        url = info['FileDescription'][0]['Name']
+        if dl_path is None:
+            with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+                dl_path = temp_file.name
+        util._download_url(url, dl_path)
+        return dl_path
     else:
         raise util.NoDataError(f'No {dataset} data available for interval '
                                f'{starttime} - {endtime}')
@@ -13,10 +13,12 @@ from datetime import datetime, time
 
 import os
 import pathlib as path
+import shutil
 import tarfile
-import urllib.request as urlreq
 
 from heliopy import config
+from heliopy.data import lock
+from heliopy.data import manifest
 from heliopy.data import util
 
 data_dir = path.Path(config['download_dir'])
@@ -58,9 +60,26 @@ def _load(probe, starttime, endtime, instrument, product_id,
     local_base_dir = cluster_dir / ('c' + probe) / instrument
     remote_base_url = csa_url
 
+    # Days that have already been requested as part of a longer window
+    requested = set()
+    if try_download and config['cluster_coalesce']:
+        missing = [info for directory, fname, info in
+                   zip(dirs, fnames, download_info) if not
+                   _local_file_exists(local_base_dir / directory,
+                                      fname, extension)]
+        for run in _contiguous_days(missing):
+            try:
+                _download_window(probe, run[0][0], run[-1][1],
+                                 instrument, product_id)
+            except util.NoDataError as e:
+                print(str(e))
+            requested.update(run)
+
     def download_func(remote_base_url, local_base_dir,
                       directory, fname, remote_fname, extension,
                       download_info):
+        if download_info in requested:
+            return
         starttime, endtime = download_info
         _download(probe, starttime, endtime, instrument, product_id)
 
@@ -84,6 +103,88 @@ def _load(probe, starttime, endtime, instrument, product_id,
                         download_info=download_info)
 
 
+def _local_file_exists(local_dir, fname, extension):
+    return (util._find_cached_file(local_dir, fname) is not None or
+            util._file_match(local_dir, fname + extension) is not None)
+
+
+def _contiguous_days(days):
+    """
+    Split a list of (start, end) times of days into runs of consecutive days.
+    """
+    runs = []
+    for day in days:
+        if runs and (day[0] - runs[-1][-1][0]).days == 1:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return runs
+
+
+def _request_url(probe, starttime, endtime, product_id, **params):
+    """
+    Create the CSA request URL for data between *starttime* and *endtime*.
+    Any extra request parameters can be given in *params*.
+    """
+    # Add start and end time to request dictionary
+    request_dict = generic_dict.copy()
+    request_dict['START_DATE'] = starttime.strftime(cda_time_fmt)
+    request_dict['END_DATE'] = endtime.strftime(cda_time_fmt)
+    request_dict.update(params)
+
+    # Create request string
+    request_str = ''
+    request_str += 'DATASET_ID' + '='
+    request_str += 'C' + probe + '_' + product_id
+    for item in request_dict:
+        request_str += '&'
+        request_str += item
+        request_str += '='
+        request_str += request_dict[item]
+
+    # Create request url
+    request_str += '&NON_BROWSER'
+    return csa_url + request_str
+
+
+def _download_window(probe, starttime, endtime, instrument, product_id):
+    """
+    Download all data between *starttime* and *endtime* with a single
+    request, and save it to daily files.
+
+    The data is delivered by the CSA as a .tar.gz archive of daily files,
+    which is decompressed and unpacked while it is being downloaded.
+    """
+    if cda_cookie == 'none':
+        raise RuntimeError('Cluster download cookie not set')
+    request_url = _request_url(probe, starttime, endtime, product_id,
+                               DELIVERY_INTERVAL='daily')
+    print(request_url)
+    cutoff = 3 + len(product_id) + 10
+    r = util._request(request_url, stream=True)
+    with util._host_slot(request_url), r:
+        if not r.ok:
+            raise util.NoDataError(
+                f'No C{probe} {product_id} data available for interval '
+                f'{starttime} - {endtime}')
+        r.raw.decode_content = True
+        with tarfile.open(fileobj=r.raw, mode='r|gz') as tar:
+            for member in tar:
+                fname = os.path.basename(member.name)
+                if not member.isfile() or not fname.endswith('.cdf'):
+                    continue
+                # Remove request times from filename
+                local_fname = fname[:cutoff] + '.cdf'
+                year = local_fname[-12:-8]
+                local_dir = cluster_dir / ('c' + probe) / instrument / year
+                util._checkdir(local_dir)
+                local_file = local_dir / local_fname
+                with lock.temporary_path(local_file) as temp_file, \
+                        open(temp_file, 'wb') as f:
+                    shutil.copyfileobj(tar.extractfile(member), f)
+                manifest.record(local_file)
+
+
 def _download(probe, starttime, endtime, instrument, product_id):
     if cda_cookie == 'none':
         raise RuntimeError('Cluster download cookie not set')
@@ -92,24 +193,7 @@ def _download(probe, starttime, endtime, instrument, product_id):
         date = day[0]
         start = datetime.combine(date, time.min)
         end = datetime.combine(date, time.max)
-        # Add start and end time to request dictionary
-        request_dict = generic_dict
-        request_dict['START_DATE'] = start.strftime(cda_time_fmt)
-        request_dict['END_DATE'] = end.strftime(cda_time_fmt)
-
-        # Create request string
-        request_str = ''
-        request_str += 'DATASET_ID' + '='
-        request_str += 'C' + probe + '_' + product_id
-        for item in request_dict:
-            request_str += '&'
-            request_str += item
-            request_str += '='
-            request_str += request_dict[item]
-
-        # Create request url
-        request_str += '&NON_BROWSER'
-        request_url = csa_url + request_str
+        request_url = _request_url(probe, start, end, product_id)
 
         # Work out local directory to download to
         year = str(starttime.year)
@@ -122,9 +206,7 @@ def _download(probe, starttime, endtime, instrument, product_id):
         print(request_url)
         # Download data
         util._checkdir(local_dir)
-        urlreq.urlretrieve(request_url,
-                           filename=local_file,
-                           reporthook=util._reporthook)
+        util._download_url(request_url, local_file)
         print('\n')
         # Extract tar.gz file
         tar = tarfile.open(local_file)
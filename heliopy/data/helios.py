@@ -4,8 +4,6 @@ Methods for importing Helios data.
 from datetime import date, time, datetime, timedelta
 import os
 import pathlib
-import urllib.error
-from urllib.error import URLError
 from collections import OrderedDict
 import warnings
 
@@ -14,12 +12,10 @@ import astropy.units as u
 import numpy as np
 import pandas as pd
 
-from bs4 import BeautifulSoup
-import requests
-
 from heliopy import config
 from heliopy.data import util
 from heliopy.data import cdasrest
+from heliopy.data import lock
 
 data_dir = config['download_dir']
 use_hdf = config['use_hdf']
@@ -184,9 +180,13 @@ def integrated_dists(probe, starttime, endtime, verbose=False):
         # Go through a and b and concat all the data
         for key in todays_dists:
             todays_dists[key] = pd.concat(todays_dists[key])
-            if use_hdf:
-                todays_dists[key].to_hdf(hdffile, key=key, mode='a')
             distlist[key].append(todays_dists[key])
+        if use_hdf:
+            # The file is only read if it exists, so both keys need to be
+            # written before it appears
+            with lock.temporary_path(hdffile) as temp_file:
+                for key in todays_dists:
+                    todays_dists[key].to_hdf(temp_file, key=key, mode='a')
         starttime += timedelta(days=1)
 
     for key in distlist:
@@ -395,7 +395,9 @@ def distparams(probe, starttime, endtime, verbose=False):
             todays_params = todays_params.apply(pd.to_numeric, errors='ignore')
             todays_params['Time'] = pd.to_datetime(todays_params['Time'])
             if use_hdf:
-                todays_params.to_hdf(hdffile, key='distparams', mode='w')
+                with lock.temporary_path(hdffile) as temp_file:
+                    todays_params.to_hdf(temp_file, key='distparams',
+                                         mode='w')
         paramlist.append(todays_params)
         starttime += timedelta(days=1)
 
@@ -627,7 +629,8 @@ def electron_dists(probe, starttime, endtime, remove_advect=False,
         todays_dist = pd.concat(todays_dist)
         todays_dist = todays_dist.set_index('Time', append=True)
         if use_hdf:
-            todays_dist.to_hdf(hdffile, key='electron_dists', mode='w')
+            with lock.temporary_path(hdffile) as temp_file:
+                todays_dist.to_hdf(temp_file, key='electron_dists', mode='w')
         distlist.append(todays_dist)
         starttime += timedelta(days=1)
 
@@ -722,7 +725,8 @@ def ion_dists(probe, starttime, endtime, remove_advect=False, verbose=False):
         todays_dist = pd.concat(todays_dist)
         todays_dist = todays_dist.set_index('Time', append=True)
         if use_hdf:
-            todays_dist.to_hdf(hdffile, key='ion_dist', mode='w')
+            with lock.temporary_path(hdffile) as temp_file:
+                todays_dist.to_hdf(temp_file, key='ion_dist', mode='w')
         distlist.append(todays_dist)
         starttime += timedelta(days=1)
 
@@ -877,12 +881,10 @@ class _CoreFitDownloader(util.Downloader):
                       f'helios{self.probe}' /
                       f'{year}')
         remote_url = '{}{}'.format(remote_base_url, remote_dir)
-        try:
-            util._download_remote(remote_url,
-                                  self.fname(interval),
-                                  local_dir)
-        except urllib.error.HTTPError:
-            raise util.NoDataError
+        # Raises NoDataError if the server doesn't send the file
+        util._download_remote(remote_url,
+                              self.fname(interval),
+                              local_dir)
 
     def load_local_file(self, interval):
         return pd.read_csv(self.local_path(interval), parse_dates=['Time'])
@@ -913,6 +915,8 @@ def corefit(probe, starttime, endtime):
 
 
 class _4hzDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, probe):
         self.probe = _check_probe(probe)
         self.units = OrderedDict([('Bx', u.nT), ('By', u.nT),
@@ -942,22 +946,8 @@ class _4hzDownloader(util.Downloader):
         # Because the filename contains a number between 0 and 24 at the end,
         # get a list of all the filenames and compare them to the filename
         # we want
-        def get_file_list(url, ext='', params={}):
-            response = requests.get(url, params=params)
-            if response.ok:
-                response_text = response.text
-            else:
-                return response.raise_for_status()
-            soup = BeautifulSoup(response_text, 'html.parser')
-            complete_file_list = [node.get('href') for node in
-                                  soup.find_all('a') if
-                                  node.get('href').endswith(ext)]
-            return complete_file_list
-
-        ext = 'asc'
-        remote_file_list = get_file_list(remote_url, ext)
-        for filename in remote_file_list:
-            if local_fname[:-4] in filename:
+        for filename in util._list_remote_dir(remote_url):
+            if filename.endswith('asc') and local_fname[:-4] in filename:
                 remote_fname = filename
                 break
         if remote_fname is None:
@@ -975,8 +965,9 @@ class _4hzDownloader(util.Downloader):
         # Read in data
         headings = ['Time', 'Bx', 'By', 'Bz']
         cols = [0, 4, 5, 6]
-        data = pd.read_csv(self.local_path(interval), names=headings,
-                           header=None, usecols=cols, delim_whitespace=True)
+        with self.open_local_file(interval) as f:
+            data = pd.read_csv(f, names=headings, header=None, usecols=cols,
+                               delim_whitespace=True)
 
         # Convert date info to datetime
         data['Time'] = pd.to_datetime(data['Time'], format='%Y-%m-%dT%H:%M:%S')
@@ -1009,6 +1000,8 @@ def mag_4hz(probe, starttime, endtime):
 
 
 class _NessDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, probe):
         self.probe = _check_probe(probe)
         self.units = OrderedDict([('probe', u.dimensionless_unscaled),
@@ -1034,13 +1027,10 @@ class _NessDownloader(util.Downloader):
                       'helios{}_6sec_ness'.format(self.probe) /
                       interval.start.strftime('%Y'))
         remote_url = f'{remote_base_url}{remote_dir}'
-
-        try:
-            util._download_remote(remote_url,
-                                  self.fname(interval),
-                                  self.local_path(interval).parent)
-        except URLError:
-            raise util.NoDataError
+        # Raises NoDataError if the server doesn't send the file
+        util._download_remote(remote_url,
+                              self.fname(interval),
+                              self.local_path(interval).parent)
 
     def load_local_file(self, interval):
         # Read in data
@@ -1051,8 +1041,9 @@ class _NessDownloader(util.Downloader):
         colspecs = [(1, 2), (2, 4), (4, 7), (7, 9), (9, 11), (11, 13),
                     (13, 15), (15, 22), (22, 29), (29, 36), (36, 42), (42, 48),
                     (48, 54), (54, 60)]
-        data = pd.read_fwf(self.local_path(interval), names=headings,
-                           header=None, colspecs=colspecs)
+        with self.open_local_file(interval) as f:
+            data = pd.read_fwf(f, names=headings, header=None,
+                               colspecs=colspecs)
 
         # Process data
         data['year'] += 1900
@@ -6,6 +6,7 @@ import astropy.units as u
 from collections import OrderedDict
 
 from heliopy import config
+from heliopy.data import manifest
 
 
 def _bytes2str(num):
@@ -38,18 +39,23 @@ def cdfpeek(cdf_loc):
         print(info[key])
 
 
-def listdata(probes=None):
+def listdata(probes=None, rescan=False):
     """
     Print amount of data stored locally in the heliopy data directory.
 
     Prints a table to the terminal with a column for raw data and a column
-    for converted hdf data files.
+    for converted data files (in any of the formats in
+    :mod:`heliopy.data.cache`).
+
+    The sizes are taken from the manifest of local files (see
+    :mod:`heliopy.data.manifest`). Each probe directory is scanned the first
+    time it is listed, or if *rescan* is ``True``.
 
     Example output ::
 
         Scanning files in /Users/dstansby/Data/
         ----------------------------------------
-        |      Probe |        Raw |        HDF |
+        |      Probe |        Raw |  Converted |
         |--------------------------------------|
         |        ace |    1.44 MB |  800.00  B |
         |    cluster |  200.39 MB |    0.00  B |
@@ -69,6 +75,9 @@ def listdata(probes=None):
     ----------
     probes : List of strings, optional
         Probe names
+    rescan : bool, optional
+        If ``True``, look for files that have been changed by other programs
+        since the directories were last scanned.
 
     """
     data_dir = config['download_dir']
@@ -82,23 +91,20 @@ def listdata(probes=None):
     sizes = np.zeros((len(probes), 2))
     for i, probe in enumerate(probes):
         probe_dir = os.path.join(data_dir, probe)
-        for dirname, dirnames, filenames in os.walk(probe_dir):
-            for f in filenames:
-                fsize = os.stat(os.path.join(dirname, f)).st_size
-                if f.endswith('.hdf'):
-                    sizes[i, 1] += fsize
-                else:
-                    sizes[i, 0] += fsize
+        if rescan:
+            manifest.scan(probe_dir)
+        probe_sizes = manifest.sizes(probe_dir)
+        sizes[i] = probe_sizes['raw'], probe_sizes['converted']
 
     probes.append('Total')
-    sizes = np.row_stack((sizes, np.sum(sizes, axis=0)))
+    sizes = np.vstack((sizes, np.sum(sizes, axis=0)))
 
     original_sizes = [_bytes2str(size) for size in sizes[:, 0]]
     hdf_sizes = [_bytes2str(size) for size in sizes[:, 1]]
 
     probes = ['Probe'] + probes
     original_sizes = ['Raw'] + original_sizes
-    hdf_sizes = ['HDF'] + hdf_sizes
+    hdf_sizes = ['Converted'] + hdf_sizes
 
     def pad(lst):
         maxlen = max([len(item) for item in lst])
@@ -25,6 +25,8 @@ def _check_probe(probe, valid_probes):
 
 
 class _MergedDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, probe):
         _check_probe(probe, ['8'])
         self.probe = probe
@@ -106,7 +108,8 @@ class _MergedDownloader(util.Downloader):
                                   '9999.9', '9999999.'],
                     'delim_whitespace': True}
         # Read in data
-        data = pd.read_csv(self.local_path(interval), **readargs)
+        with self.open_local_file(interval) as f:
+            data = pd.read_csv(f, **readargs)
         data['Time'] = (pd.to_datetime(data['Year'], format='%Y') +
                         pd.to_timedelta(data['doy'] - 1, unit='d') +
                         pd.to_timedelta(data['Hour'], unit='h') +
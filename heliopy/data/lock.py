@@ -0,0 +1,172 @@
+"""
+Locks that let several processes share one data directory.
+
+Downloading a file, or converting it and saving the converted copy, is done
+while holding a lock on the file (see :func:`locked`). Any other process
+(or thread) that wants the same file waits for the lock, and then uses the
+file that has been made instead of fetching or converting it again.
+
+Files are written to a temporary file in the same directory, which is then
+renamed over the final path (see :func:`temporary_path`). As renaming is
+atomic, other processes either see the complete file or no file at all,
+never a partly written one.
+
+The lock files are kept in the ``.locks`` directory inside the data
+directory, and are removed again once they are released.
+"""
+import collections
+import contextlib
+import hashlib
+import os
+import pathlib
+import shutil
+import sys
+import threading
+
+if sys.platform == 'win32':
+    import msvcrt
+else:
+    import fcntl
+
+
+def _lock_path(path):
+    # Imported here, as util needs this module
+    from heliopy.data import util
+    path = os.path.abspath(str(path))
+    name = hashlib.sha1(path.encode()).hexdigest() + '.lock'
+    return pathlib.Path(str(util.data_dir)) / '.locks' / name
+
+
+# Locks held by each thread, mapping lock paths to how many times they have
+# been taken
+_held = threading.local()
+
+
+@contextlib.contextmanager
+def locked(path, blocking=True):
+    """
+    Hold an exclusive lock on *path* while in this context.
+
+    The lock is shared between all the processes using the same data
+    directory. A thread already holding the lock can take it again.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        File to lock. This doesn't need to exist.
+    blocking : bool, optional
+        If ``False``, raise :class:`BlockingIOError` instead of waiting if
+        another process or thread holds the lock.
+    """
+    lock_path = _lock_path(path)
+    if not hasattr(_held, 'counts'):
+        _held.counts = collections.Counter()
+    if _held.counts[lock_path]:
+        _held.counts[lock_path] += 1
+        try:
+            yield
+        finally:
+            _held.counts[lock_path] -= 1
+        return
+
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    f = _acquire(lock_path, blocking)
+    _held.counts[lock_path] += 1
+    try:
+        yield
+    finally:
+        _held.counts[lock_path] -= 1
+        # Remove the lock file while still holding the lock. Anyone waiting
+        # on the removed file notices it has gone in _acquire and tries again.
+        with contextlib.suppress(OSError):
+            os.remove(lock_path)
+        _unlock(f)
+        f.close()
+
+
+def _acquire(lock_path, blocking=True):
+    """
+    Open and lock *lock_path*, returning the open file.
+    """
+    while True:
+        f = open(lock_path, 'a+b')
+        try:
+            _lock(f, blocking)
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+            if current is not None and \
+                    os.path.samestat(os.fstat(f.fileno()), current):
+                return f
+        except BaseException:
+            f.close()
+            raise
+        # The file was removed by its previous holder
+        _unlock(f)
+        f.close()
+
+
+def _lock(f, blocking=True):
+    if sys.platform != 'win32':
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        # Raises BlockingIOError if not blocking and the file is locked
+        fcntl.flock(f.fileno(), flags)
+        return
+    f.seek(0)
+    if not blocking:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError as e:
+            raise BlockingIOError(*e.args) from e
+        return
+    while True:
+        try:
+            # Gives up with an OSError after trying for 10 seconds
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            pass
+
+
+def _unlock(f):
+    if sys.platform != 'win32':
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def temporary_path(path):
+    """
+    Path of a new temporary file to write the contents of *path* to.
+
+    When the context exits the temporary file replaces *path*, or is removed
+    if an exception was raised. The temporary file is hidden, so isn't
+    recorded in the manifest of local files.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+    """
+    path = pathlib.Path(path)
+    # Unique to this thread, which only writes one copy of a file at a time
+    temp_path = path.with_name(
+        f'.{path.name}.{os.getpid()}-{threading.get_ident()}.tmp')
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
+
+
+def move(src, dst):
+    """
+    Move the file *src* to *dst*, which only ever appears complete even if
+    *src* is on a different file system.
+    """
+    with temporary_path(dst) as temp_path:
+        shutil.move(str(src), str(temp_path))
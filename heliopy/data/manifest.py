@@ -0,0 +1,390 @@
+"""
+Index of the files in the local data directory.
+
+Each file that heliopy downloads or converts is recorded in a SQLite
+database (``.manifest.sqlite`` in the data directory), along with the
+dataset it belongs to, its version, size and the time range of data it
+contains. This is used to look up local files without listing the contents
+of directories with many files in them.
+
+Files added or removed by other programs are picked up automatically when
+looking up files in a directory that has changed. Directories that haven't
+been looked in yet, e.g. after copying in data from elsewhere, are recorded
+by :func:`scan`.
+"""
+import datetime as dt
+import os
+import pathlib
+import re
+import sqlite3
+import threading
+import time
+
+from heliopy.data import cache
+
+# Increase when the tables change. As the manifest only records what is on
+# disk, an out of date manifest is simply rebuilt.
+_SCHEMA_VERSION = 2
+
+
+def _data_dir():
+    # Imported here, as util needs this module
+    from heliopy.data import util
+    return pathlib.Path(os.path.abspath(str(util.data_dir)))
+
+
+# Open connections to the manifest of each data directory, for each thread
+_connections = threading.local()
+
+
+def _connect():
+    """
+    Connection to the manifest database.
+
+    Each thread keeps its connection open, so the database is only opened
+    and its tables created once. The ``files`` table contains a row for each
+    file, and the ``directories`` table the modification time of each
+    directory when its contents were last recorded.
+    """
+    data_dir = _data_dir()
+    path = data_dir / '.manifest.sqlite'
+    if not hasattr(_connections, 'conns'):
+        _connections.conns = {}
+    conn = _connections.conns.get(path)
+    if conn is not None and path.exists():
+        return conn
+
+    data_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=60)
+    with conn:
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != _SCHEMA_VERSION:
+            conn.execute('DROP TABLE IF EXISTS files')
+            conn.execute('DROP TABLE IF EXISTS directories')
+            conn.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, directory TEXT, name TEXT, '
+            'dataset TEXT, kind TEXT, version TEXT, size INTEGER, '
+            'mtime REAL, start TEXT, end TEXT, accessed REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS files_name ON files '
+                     '(directory, name)')
+        conn.execute('CREATE INDEX IF NOT EXISTS files_dataset ON files '
+                     '(dataset, kind)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS directories ('
+            'directory TEXT PRIMARY KEY, mtime_ns INTEGER)')
+    _connections.conns[path] = conn
+    return conn
+
+
+def _in_data_dir(path):
+    """
+    Return *path* as an absolute path if it is in the data directory,
+    otherwise ``None``.
+    """
+    path = pathlib.Path(os.path.abspath(str(path)))
+    data_dir = _data_dir()
+    if path == data_dir or data_dir in path.parents:
+        return path
+
+
+def dataset(path):
+    """
+    Name of the dataset the file *path* belongs to.
+
+    This is the directory the file is in, relative to the data directory,
+    without any sub-directories for different dates (i.e. whose names start
+    with a number).
+    """
+    parts = list(path.parent.relative_to(_data_dir()).parts)
+    while parts and parts[-1][0].isdigit():
+        parts.pop()
+    return '/'.join(parts)
+
+
+def _version(name):
+    match = re.search(r'[_-][vV](\d+(?:[._]\d+)*)', name)
+    if match:
+        return match.group(1)
+
+
+def _ignored(name):
+    """
+    ``True`` for files that aren't data, e.g. partial downloads and
+    download metadata.
+    """
+    return (name.startswith('.') or name.endswith('.json') or
+            '.part' in pathlib.PurePath(name).suffixes)
+
+
+def _kind(name):
+    if os.path.splitext(name)[1] in cache.suffixes():
+        return 'converted'
+    return 'raw'
+
+
+def record(path, starttime=None, endtime=None):
+    """
+    Record the file *path* in the manifest, or remove it from the manifest if
+    it doesn't exist.
+
+    Files outside the data directory aren't recorded.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+    starttime : datetime.datetime, optional
+        Start of the data in the file.
+    endtime : datetime.datetime, optional
+        End of the data in the file.
+    """
+    path = _in_data_dir(path)
+    if path is None or _ignored(path.name):
+        return
+    with _connect() as conn:
+        _record(conn, path, starttime, endtime)
+
+
+def _record(conn, path, starttime=None, endtime=None):
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        conn.execute('DELETE FROM files WHERE path=?', (str(path),))
+        return
+    if starttime is None or endtime is None:
+        # Keep any times recorded previously
+        row = conn.execute('SELECT start, end FROM files WHERE path=?',
+                           (str(path),)).fetchone()
+        if row is not None:
+            starttime = starttime or row[0]
+            endtime = endtime or row[1]
+    conn.execute(
+        'INSERT OR REPLACE INTO files VALUES '
+        '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (str(path), str(path.parent), path.name, dataset(path),
+         _kind(path.name), _version(path.name), stat.st_size, stat.st_mtime,
+         _isoformat(starttime), _isoformat(endtime), time.time()))
+
+
+def _isoformat(time):
+    if isinstance(time, dt.datetime):
+        return time.isoformat()
+    return time
+
+
+def touch(paths):
+    """
+    Record that the files *paths* have just been read.
+
+    The time each file was last written or read is used to remove the least
+    recently used files first (see :mod:`heliopy.data.quota`).
+
+    Parameters
+    ----------
+    paths : list of pathlib.Path
+    """
+    paths = [_in_data_dir(path) for path in paths if path is not None]
+    paths = [str(path) for path in paths if path is not None]
+    if not paths:
+        return
+    with _connect() as conn:
+        conn.executemany('UPDATE files SET accessed=? WHERE path=?',
+                         [(time.time(), path) for path in paths])
+
+
+def match(directory, fname_regex):
+    """
+    Find a file in *directory* whose name matches the regular expression
+    *fname_regex*.
+
+    Returns
+    -------
+    name : str or None
+        Name of the file, or ``None`` if there aren't any matching files.
+    """
+    directory = pathlib.Path(directory)
+    if not directory.exists():
+        return
+    if _in_data_dir(directory) is None:
+        # Not in the manifest, so look through the directory
+        for f in directory.iterdir():
+            if f.is_file() and re.match(fname_regex, f.name):
+                return f.name
+        return
+
+    directory = _in_data_dir(directory)
+    prefix = _literal_prefix(fname_regex)
+    with _connect() as conn:
+        _update_directory(conn, directory)
+        names = conn.execute(
+            'SELECT name FROM files WHERE directory=? AND name >= ? AND '
+            'name < ? ORDER BY name',
+            (str(directory), prefix, prefix + '\U0010ffff')).fetchall()
+    for name, in names:
+        if re.match(fname_regex, name) and (directory / name).exists():
+            return name
+
+
+def _literal_prefix(regex):
+    """
+    The start of *regex* that only matches itself.
+    """
+    match = re.match(r'[^.^$*+?{}\[\]\\|()]*', regex)
+    prefix = match.group(0)
+    if regex[len(prefix):len(prefix) + 1] in ('*', '?', '{'):
+        # The last character is optional
+        prefix = prefix[:-1]
+    return prefix
+
+
+def _update_directory(conn, directory):
+    """
+    Record the contents of *directory*, if it has changed since they were
+    last recorded.
+    """
+    mtime_ns = directory.stat().st_mtime_ns
+    row = conn.execute('SELECT mtime_ns FROM directories WHERE directory=?',
+                       (str(directory),)).fetchone()
+    if row is not None and row[0] == mtime_ns:
+        return
+    recorded = {row[0] for row in conn.execute(
+        'SELECT name FROM files WHERE directory=?', (str(directory),))}
+    present = {entry.name for entry in os.scandir(str(directory))
+               if entry.is_file() and not _ignored(entry.name)}
+    for name in recorded - present:
+        conn.execute('DELETE FROM files WHERE path=?',
+                     (str(directory / name),))
+    for name in present - recorded:
+        _record(conn, directory / name)
+    # Only looked at again once the directory changes. Files that heliopy
+    # writes are recorded directly, so don't rely on the modification time.
+    conn.execute('INSERT OR REPLACE INTO directories VALUES (?, ?)',
+                 (str(directory), mtime_ns))
+
+
+def scan(directory=None, new=False):
+    """
+    Record all the files in *directory* and its sub-directories.
+
+    Parameters
+    ----------
+    directory : pathlib.Path, optional
+        Directory to scan. Defaults to the whole data directory.
+    new : bool, optional
+        If ``True``, only scan *directory* if it hasn't been recorded before.
+    """
+    directory = _in_data_dir(directory or _data_dir())
+    if directory is None or not directory.exists():
+        return
+    with _connect() as conn:
+        if new and _scanned(conn, directory):
+            return
+        for dirpath, dirnames, filenames in os.walk(str(directory)):
+            # Skip hidden directories, e.g. with cached metadata
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            _update_directory(conn, pathlib.Path(dirpath))
+
+
+def _scanned(conn, directory):
+    return conn.execute('SELECT 1 FROM directories WHERE directory=?',
+                        (str(directory),)).fetchone() is not None
+
+
+def sizes(directory):
+    """
+    Total size of the raw and converted files in *directory* and its
+    sub-directories.
+
+    If *directory* hasn't been recorded yet, it is scanned first. Files
+    outside the data directory aren't recorded, so are always scanned.
+
+    Returns
+    -------
+    dict
+        Maps ``'raw'`` and ``'converted'`` to the total size in bytes.
+    """
+    out = {'raw': 0, 'converted': 0}
+    if _in_data_dir(directory) is None:
+        for dirpath, dirnames, filenames in os.walk(str(directory)):
+            for name in filenames:
+                size = os.stat(os.path.join(dirpath, name)).st_size
+                out[_kind(name)] += size
+        return out
+
+    directory = _in_data_dir(directory)
+    scan(directory, new=True)
+    rows = _connect().execute(
+        'SELECT kind, SUM(size) FROM files WHERE path > ? AND path < ? '
+        'GROUP BY kind',
+        (str(directory) + os.sep, str(directory) + chr(ord(os.sep) + 1))
+    ).fetchall()
+    out.update(dict(rows))
+    return out
+
+
+# Matches files in a dataset and the datasets within it
+_DATASET_CONDITION = '(dataset=? OR substr(dataset, 1, ?)=?)'
+
+
+def _dataset_params(dataset):
+    return [dataset, len(dataset) + 1, dataset + '/']
+
+
+def total_size(dataset=None):
+    """
+    Total size in bytes of the recorded files.
+
+    Parameters
+    ----------
+    dataset : str, optional
+        Only count files in this dataset, as for :func:`files`.
+    """
+    query = 'SELECT SUM(size) FROM files'
+    params = []
+    if dataset is not None:
+        query += ' WHERE ' + _DATASET_CONDITION
+        params += _dataset_params(dataset)
+    return _connect().execute(query, params).fetchone()[0] or 0
+
+
+def files(dataset=None, kind=None):
+    """
+    List the recorded files.
+
+    Parameters
+    ----------
+    dataset : str, optional
+        Only list files in this dataset (see :func:`dataset`), or in datasets
+        within it (e.g. ``'mms'`` for all MMS data).
+    kind : str, optional
+        Only list ``'raw'`` or ``'converted'`` files.
+
+    Returns
+    -------
+    list of dict
+        The path, dataset, kind, version, size (in bytes), modification time,
+        start and end times of the data, and the time the file was last
+        written or read of each file.
+    """
+    query = 'SELECT * FROM files'
+    conditions = []
+    params = []
+    if dataset is not None:
+        conditions.append(_DATASET_CONDITION)
+        params += _dataset_params(dataset)
+    if kind is not None:
+        conditions.append('kind=?')
+        params.append(kind)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+    cursor = _connect().execute(query + ' ORDER BY path', params)
+    names = [column[0] for column in cursor.description]
+    rows = cursor.fetchall()
+    out = []
+    for row in rows:
+        row = dict(zip(names, row))
+        del row['directory'], row['name']
+        row['path'] = pathlib.Path(row['path'])
+        out.append(row)
+    return out
@@ -5,10 +5,11 @@ All data is publically available at
 https://lasp.colorado.edu/mms/sdc/public/data/, and the MMS science data centre
 is at https://lasp.colorado.edu/mms/sdc/public/.
 """
+import contextlib
 import os
 import pathlib
-import requests
-from tqdm.auto import tqdm
+import sqlite3
+import time
 from datetime import datetime, timedelta
 
 from heliopy.data import util
@@ -58,6 +59,10 @@ def available_files(probe, instrument, starttime, endtime, data_rate='',
     https://lasp.colorado.edu/mms/sdc/public/about/how-to/ for more information
     on the query paramters.
 
+    The file names returned by the SDC are stored in a local database, and
+    the SDC is only queried again for days that have not been queried in the
+    last ``mms_inventory_ttl`` days (set in the heliopy configuration file).
+
     Parameters
     ----------
     probe : int or str
@@ -71,6 +76,8 @@ def available_files(probe, instrument, starttime, endtime, data_rate='',
         End time.
     data_rate : str, optional
         Data rate. Must be in ``['slow', 'fast', 'brst', 'srvy']``
+    product_string : str, optional
+        Data descriptor.
 
     Returns
     -------
@@ -81,26 +88,110 @@ def available_files(probe, instrument, starttime, endtime, data_rate='',
     probe = _validate_probe(probe)
     _validate_data_rate(data_rate)
 
-    start_date = starttime.strftime('%Y-%m-%d')
-    if starttime.date() == endtime.date():
-        end_date = (endtime.date() + timedelta(days=1)).strftime('%Y-%m-%d')
-    else:
-        end_date = endtime.strftime('%Y-%m-%d')
-
-    query = {}
-    query['sc_id'] = 'mms' + probe
-    query['instrument_id'] = instrument
-    if len(data_rate):
-        query['data_rate_mode'] = data_rate
-    if len(product_string):
-        query['descriptor'] = product_string
-    query['start_date'] = start_date
-    query['end_date'] = end_date
-
-    r = requests.get(query_url, params=query)
-    files = r.text.split(',')
-    files = filter_time(files, starttime, endtime)
-    return files
+    key = (probe, instrument, data_rate, product_string)
+    with contextlib.closing(_connect_inventory()) as conn:
+        _update_inventory(conn, key, starttime.date(), endtime.date())
+        rows = conn.execute(
+            'SELECT start, fname FROM files WHERE probe=? AND '
+            'instrument=? AND data_rate=? AND descriptor=? AND '
+            'start >= ? AND start <= ? ORDER BY start',
+            (*key, starttime.date().isoformat(),
+             endtime.isoformat())).fetchall()
+    fstart = [datetime.strptime(row[0], '%Y-%m-%dT%H:%M:%S') for row in rows]
+    files = [row[1] for row in rows]
+    return _filter_time_sorted(fstart, files, starttime, endtime)
+
+
+def _inventory_path():
+    # Kept in a hidden directory, so it isn't recorded as data in the
+    # manifest of local files
+    return util.data_dir / '.mms' / 'sdc_inventory.sqlite'
+
+
+def _connect_inventory():
+    """
+    Open the local database of files available from the SDC.
+
+    The ``files`` table contains the file names returned by each set of query
+    parameters, and the ``days`` table the days each set of query parameters
+    has been queried for, and when.
+    """
+    path = _inventory_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=60)
+    with conn:
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'probe TEXT, instrument TEXT, data_rate TEXT, descriptor TEXT, '
+            'fname TEXT, start TEXT, '
+            'PRIMARY KEY (probe, instrument, data_rate, descriptor, fname))')
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS files_start ON files '
+            '(probe, instrument, data_rate, descriptor, start)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS days ('
+            'probe TEXT, instrument TEXT, data_rate TEXT, descriptor TEXT, '
+            'day TEXT, updated REAL, '
+            'PRIMARY KEY (probe, instrument, data_rate, descriptor, day))')
+    return conn
+
+
+def _update_inventory(conn, key, start_date, end_date):
+    """
+    Query the SDC for all days between *start_date* and *end_date* (inclusive)
+    that are not in the inventory, or were last queried more than
+    ``mms_inventory_ttl`` days ago.
+
+    Each run of consecutive days that needs updating is fetched with a single
+    query.
+    """
+    probe, instrument, data_rate, product_string = key
+    expired = time.time() - config['mms_inventory_ttl'] * 24 * 60 * 60
+    ndays = (end_date - start_date).days + 1
+    days = [start_date + timedelta(days=i) for i in range(ndays)]
+    current = {row[0] for row in conn.execute(
+        'SELECT day FROM days WHERE probe=? AND instrument=? AND '
+        'data_rate=? AND descriptor=? AND day >= ? AND day <= ? AND '
+        'updated > ?',
+        (*key, start_date.isoformat(), end_date.isoformat(), expired))}
+
+    runs = []
+    for day in days:
+        if day.isoformat() in current:
+            continue
+        if runs and runs[-1][-1] == day - timedelta(days=1):
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+
+    for run in runs:
+        query = {}
+        query['sc_id'] = 'mms' + probe
+        query['instrument_id'] = instrument
+        if len(data_rate):
+            query['data_rate_mode'] = data_rate
+        if len(product_string):
+            query['descriptor'] = product_string
+        query['start_date'] = run[0].strftime('%Y-%m-%d')
+        query['end_date'] = (run[-1] + timedelta(days=1)).strftime('%Y-%m-%d')
+
+        r = util._request(query_url, params=query)
+        r.raise_for_status()
+        files = [f for f in r.text.split(',') if len(f)]
+        fstart = [_parse_start(parts[-2]) for parts in parse_filename(files)]
+
+        with conn:
+            conn.execute(
+                'DELETE FROM files WHERE probe=? AND instrument=? AND '
+                'data_rate=? AND descriptor=? AND start >= ? AND start < ?',
+                (*key, run[0].isoformat(),
+                 (run[-1] + timedelta(days=1)).isoformat()))
+            conn.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)',
+                [(*key, f, t.isoformat()) for f, t in zip(files, fstart)])
+            conn.executemany(
+                'INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?, ?, ?)',
+                [(*key, day.isoformat(), time.time()) for day in run])
 
 
 def filter_time(fnames, starttime, endtime):
@@ -129,15 +220,28 @@ def filter_time(fnames, starttime, endtime):
 
     # Parse the time out of the file name
     parts = parse_filename(fnames)
-    fstart = [datetime.strptime(name[-2], '%Y%m%d') if len(name[-2]) == 8 else
-              datetime.strptime(name[-2], '%Y%m%d%H%M%S')
-              for name in parts]
+    fstart = [_parse_start(name[-2]) for name in parts]
 
     # Sort the files by start time
     isort = sorted(range(len(fstart)), key=lambda k: fstart[k])
     fstart = [fstart[i] for i in isort]
     files = [files[i] for i in isort]
+    return _filter_time_sorted(fstart, files, starttime, endtime)
 
+
+def _parse_start(tstart):
+    """
+    Parse the start time field of a file name.
+    """
+    if len(tstart) == 8:
+        return datetime.strptime(tstart, '%Y%m%d')
+    return datetime.strptime(tstart, '%Y%m%d%H%M%S')
+
+
+def _filter_time_sorted(fstart, files, starttime, endtime):
+    """
+    Filter files sorted by their start times *fstart*.
+    """
     # End time
     #   - Any files that start on or before END_DATE can be kept
     idx = [i for i, t in enumerate(fstart) if t <= endtime]
@@ -157,7 +261,8 @@ def filter_time(fnames, starttime, endtime):
     #     START_DATE and throw away any files that start before it.
     idx = [i for i, t in enumerate(fstart) if t >= starttime]
 
-    if (len(idx) == 0) & (fstart[-1].date() == starttime.date()):
+    if len(idx) == 0 and len(fstart) > 0 and \
+            fstart[-1].date() == starttime.date():
         idx = [len(fstart) - 1]
     elif (len(idx) != 0) & ((idx[0] != 0) & (fstart[idx[0]] != starttime)):
         idx.insert(0, idx[0] - 1)
@@ -254,15 +359,15 @@ def download_files(probe, instrument, data_rate, starttime, endtime,
 
     dirs = []
     fnames = []
-    daylist = util._daysplitinterval(starttime, endtime)
-    for date, stime, etime in daylist:
-        files = available_files(probe, instrument, starttime, endtime,
-                                data_rate, product_string)
-        for file in files:
-            fname = pathlib.Path(file).stem
-            if product_string in fname and len(fname):
-                fnames.append(fname)
-                dirs.append('')
+    seen = set()
+    files = available_files(probe, instrument, starttime, endtime,
+                            data_rate, product_string)
+    for file in files:
+        fname = pathlib.Path(file).stem
+        if product_string in fname and len(fname) and fname not in seen:
+            seen.add(fname)
+            fnames.append(fname)
+            dirs.append('')
 
     extension = '.cdf'
     local_base_dir = mms_dir / probe / instrument / data_rate
@@ -272,11 +377,7 @@ def download_files(probe, instrument, data_rate, starttime, endtime,
                       directory, fname, remote_fname, extension):
         url = remote_base_url + '?file=' + fname + extension
         local_fname = os.path.join(local_base_dir, fname + extension)
-        with requests.get(url, stream=True) as request:
-            with open(local_fname, 'wb') as fd:
-                for chunk in tqdm(
-                        request.iter_content(chunk_size=128)):
-                    fd.write(chunk)
+        util._download_url(url, local_fname)
 
     def processing_func(cdf):
         return util.cdf2df(cdf, index_key='Epoch')
@@ -18,6 +18,8 @@ omni_url = 'https://cdaweb.gsfc.nasa.gov/pub/data/omni/'
 
 
 class _omniDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, units):
         self.units = units
 
@@ -31,15 +33,20 @@ class _omniDownloader(util.Downloader):
     def local_dir(self, interval):
         return pathlib.Path('omni')
 
+    def revalidate(self, interval):
+        # The file for the current year is updated as new data comes in
+        return interval.end.to_datetime() > datetime.now()
+
     def download(self, interval):
         url = omni_url + '/low_res_omni'
 
         local_dir = self.local_path(interval).parent
         local_dir.mkdir(parents=True, exist_ok=True)
         fname = self.fname(interval)
-        util._download_remote(url, fname, local_dir)
+        util._download_remote(url, fname, local_dir,
+                              revalidate=self.revalidate(interval))
 
-    def load_local_file(self, interval):
+    def load_local_file(self, interval, columns=None):
         names = ['Year', 'Decimal Day', 'Hour', 'Bartels Rotation Number',
                  'ID IMF Spacecraft', 'ID SW Plasma Spacecraft',
                  'points(IMF Average)', 'points(Plasma Average)',
@@ -68,10 +75,16 @@ class _omniDownloader(util.Downloader):
                      999.99, 999.99, 999.9, 99, 999, 99999, 9999, 999999.99,
                      99999.99, 99999.99, 99999.99, 99999.99, 99999.99, np.nan,
                      999, 999.9, 999.9, 99999, 99999, 99.9]
-        thisdata = pd.read_csv(self.local_path(interval), names=names,
-                               delim_whitespace=True)
+        time_names = ['Year', 'Decimal Day', 'Hour']
+        usecols = None
+        if columns is not None:
+            usecols = time_names + [name for name in names
+                                    if name in columns]
+        with self.open_local_file(interval) as f:
+            thisdata = pd.read_csv(f, names=names, usecols=usecols,
+                                   delim_whitespace=True)
         for name, bad_value in zip(names, badvalues):
-            if name in ['Year', 'Decimal Day', 'Hour']:
+            if name in time_names or name not in thisdata:
                 continue
             thisdata[name] = thisdata[name].replace(bad_value, np.nan)
         year = thisdata['Year'][0]
@@ -93,7 +106,7 @@ class _omniDownloader(util.Downloader):
         return datetime_index
 
 
-def low(starttime, endtime):
+def low(starttime, endtime, columns=None):
     """
     Import data from OMNI Web Interface.
 
@@ -103,6 +116,9 @@ def low(starttime, endtime):
         Interval start time.
     endtime : datetime
         Interval end time.
+    columns : list of str, optional
+        Names of the columns to import, e.g. ``['Bz GSM', 'Plasma Flow
+        Speed']``. If not given, all columns are imported.
 
     Returns
     -------
@@ -162,4 +178,4 @@ def low(starttime, endtime):
                          ('Magnetosonic Mach No.', u.dimensionless_unscaled),
                          ('f10.7 index', sfu)])
     downloader = _omniDownloader(units)
-    return downloader.load(starttime, endtime)
+    return downloader.load(starttime, endtime, columns=columns)
@@ -0,0 +1,154 @@
+"""
+Methods for downloading data ahead of time, without loading it.
+
+This can be used to fill the local data directory before running an analysis,
+e.g. on a batch node::
+
+    from datetime import datetime
+
+    from heliopy.data import ace, omni, prefetch
+
+    prefetch.prefetch([ace.mfi_h0, omni.low],
+                      datetime(2010, 1, 1), datetime(2010, 4, 1))
+
+or equivalently from the command line::
+
+    heliopy-prefetch ace.mfi_h0 omni.low 2010-01-01 2010-04-01
+
+Only files that are not already available locally are downloaded. Unless
+conversion is turned off, the downloaded files are also converted and saved
+in the format set by ``cache_format`` (see :mod:`heliopy.data.cache`), so
+later calls to the data import methods read the already processed data.
+
+Downloads from the same remote server are limited by the
+``max_connections_per_host`` configuration option.
+"""
+import argparse
+import concurrent.futures as futures
+import functools
+import importlib
+import sys
+
+import dateutil.parser
+
+from heliopy import config
+from heliopy.data import util
+
+
+def prefetch(loaders, starttime, endtime, max_workers=None, convert=True):
+    """
+    Download data between *starttime* and *endtime* for each of *loaders*.
+
+    Parameters
+    ----------
+    loaders : list
+        Data import methods (e.g. :func:`heliopy.data.ace.mfi_h0`). Methods
+        that take other arguments before *starttime* and *endtime* can be
+        given with the arguments filled in using :func:`functools.partial`.
+        Can also be strings of the form accepted by the ``heliopy-prefetch``
+        command, e.g. ``'ace.mfi_h0'`` or ``'mms.fgm:1:srvy'``.
+    starttime : datetime.datetime
+        Start of interval.
+    endtime : datetime.datetime
+        End of interval.
+    max_workers : int, optional
+        Maximum number of datasets, and of files in each dataset, to download
+        at the same time. If not given, the ``max_workers`` value from the
+        heliopyrc file is used.
+    convert : bool, optional
+        If ``True``, save the converted data to the cache.
+
+    Returns
+    -------
+    errors : dict
+        Maps each loader that failed to the error it raised.
+    """
+    if max_workers is None:
+        max_workers = config['max_workers']
+    loaders = [_parse_loader(loader) if isinstance(loader, str) else loader
+               for loader in loaders]
+    run = functools.partial(_prefetch_loader, starttime=starttime,
+                            endtime=endtime, max_workers=max_workers,
+                            convert=convert)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+        results = list(ex.map(run, loaders))
+    return {loader: error for loader, error in zip(loaders, results)
+            if error is not None}
+
+
+def _prefetch_loader(loader, starttime, endtime, max_workers, convert):
+    """
+    Download data for a single loader, returning any error raised.
+    """
+    try:
+        with util._prefetch_mode(convert=convert, max_workers=max_workers):
+            loader(starttime, endtime)
+    except Exception as e:
+        util.logger.warning(f'Failed to prefetch {_loader_name(loader)}: {e}')
+        return e
+
+
+def _parse_loader(spec):
+    """
+    Get a data import method from a string of the form
+    ``'module.function[:arg1[:arg2...]]'``, where ``module`` is a sub-module
+    of :mod:`heliopy.data`, and any arguments are passed before the start and
+    end times.
+    """
+    name, *args = spec.split(':')
+    module_name, _, func_name = name.rpartition('.')
+    if not module_name:
+        raise ValueError(f'Data import method {spec} must be given as '
+                         'module.function')
+    module = importlib.import_module(f'heliopy.data.{module_name}')
+    loader = getattr(module, func_name)
+    if args:
+        loader = functools.partial(loader, *args)
+    return loader
+
+
+def _loader_name(loader):
+    if isinstance(loader, functools.partial):
+        args = ', '.join(str(arg) for arg in loader.args)
+        return f'{_loader_name(loader.func)}({args})'
+    return f'{loader.__module__}.{loader.__qualname__}'
+
+
+def main(argv=None):
+    """
+    Entry point for the ``heliopy-prefetch`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog='heliopy-prefetch',
+        description='Download data to the local heliopy data directory.')
+    parser.add_argument(
+        'loaders', nargs='+', metavar='loader',
+        help='Data import methods, given as module.function (e.g. '
+             'ace.mfi_h0). Any arguments needed before the start and end '
+             'times can be given separated by colons (e.g. mms.fgm:1:srvy).')
+    parser.add_argument('starttime', type=dateutil.parser.isoparse,
+                        help='Start time, in ISO format.')
+    parser.add_argument('endtime', type=dateutil.parser.isoparse,
+                        help='End time, in ISO format.')
+    parser.add_argument(
+        '-j', '--max-workers', type=int, default=None,
+        help='Maximum number of datasets, and of files in each dataset, to '
+             'download at the same time.')
+    parser.add_argument(
+        '--no-convert', dest='convert', action='store_false',
+        help="Don't save converted copies of the downloaded data.")
+    args = parser.parse_args(argv)
+
+    try:
+        loaders = [_parse_loader(loader) for loader in args.loaders]
+    except (ImportError, AttributeError, ValueError) as e:
+        parser.error(str(e))
+    errors = prefetch(loaders, args.starttime, args.endtime,
+                      max_workers=args.max_workers, convert=args.convert)
+    for loader, error in errors.items():
+        print(f'{_loader_name(loader)}: {error}', file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,7 +3,6 @@ Methods for importing data from Parker Solar Probe.
 """
 import astropy.units as u
 import pathlib
-import urllib.error
 
 from heliopy.data import util
 
@@ -17,12 +16,10 @@ class _PSPDownloader(util.Downloader):
 
     def download(self, interval):
         url = self.base_url + str(self.local_dir(interval))
-        try:
-            util._download_remote(url,
-                                  self.fname(interval),
-                                  self.local_path(interval).parent)
-        except urllib.error.HTTPError:
-            raise util.NoDataError
+        # Raises NoDataError if the server doesn't send the file
+        util._download_remote(url,
+                              self.fname(interval),
+                              self.local_path(interval).parent)
 
     def load_local_file(self, interval):
         local_path = self.local_path(interval)
@@ -0,0 +1,300 @@
+"""
+Limits on the amount of data kept in the local data directory.
+
+The ``disk_quota`` option in the heliopyrc file sets the maximum size of all
+the files in the data directory, and ``dataset_quotas`` the maximum size of
+individual datasets. After data is downloaded or converted, files are removed
+until each quota is met again, starting with the data that was least
+recently written or read. Files of data that is being downloaded or converted
+at the time are skipped. Removed data is downloaded again if it is needed
+later.
+
+The raw and converted copies of each interval of data can be removed
+together, or one kind of copy can be removed first, as set by the
+``quota_policy`` option:
+
+- ``both``: remove the raw and converted files of each interval together.
+  This is the default.
+- ``raw``: first remove raw files that have a converted copy, which is
+  enough to load the data. Raw CDF files are kept if their converted copy was
+  saved without the units of the data.
+- ``converted``: first remove converted files, which can be made again from
+  the raw files.
+
+If there still isn't enough space, whole intervals are then removed.
+
+The quotas can also be applied by hand with :func:`enforce`, or from the
+command line::
+
+    heliopy-cache clean --max-size 10000 --dataset-size mms:2000
+
+which first looks through the data directory for any files that have been
+changed by other programs. ``heliopy-cache usage`` lists the size of each
+dataset.
+
+The sizes and times used to choose what to remove are stored in the manifest
+of local files (see :mod:`heliopy.data.manifest`). The first time the quotas
+are enforced, the whole data directory is scanned to record any files that
+were downloaded before the manifest was kept.
+"""
+import argparse
+import collections
+import contextlib
+import os
+import sys
+
+from heliopy import config
+from heliopy.data import cache
+from heliopy.data import helper
+from heliopy.data import lock
+from heliopy.data import manifest
+
+#: Valid values for ``quota_policy``.
+policies = ('both', 'raw', 'converted')
+
+
+def usage(dataset=None):
+    """
+    Size of the local files in each dataset.
+
+    Parameters
+    ----------
+    dataset : str, optional
+        Only include this dataset and the datasets within it.
+
+    Returns
+    -------
+    dict
+        Maps each dataset name to a dict with the total size in bytes of its
+        ``'raw'`` and ``'converted'`` files.
+    """
+    out = collections.defaultdict(lambda: {'raw': 0, 'converted': 0})
+    for f in manifest.files(dataset=dataset):
+        out[f['dataset']][f['kind']] += f['size']
+    return dict(sorted(out.items()))
+
+
+def enforce(max_size=None, dataset_sizes=None, policy=None, dry_run=False):
+    """
+    Remove the least recently used data until the local files fit within
+    the quotas.
+
+    Parameters
+    ----------
+    max_size : float, optional
+        Maximum size of all the files, in megabytes. If not given, the
+        ``disk_quota`` value from the heliopyrc file is used. If zero, there
+        is no limit.
+    dataset_sizes : dict, optional
+        Maps dataset names to their maximum size, in megabytes. If not given,
+        the ``dataset_quotas`` value from the heliopyrc file is used.
+    policy : str, optional
+        Which copies of the data to remove first, out of :data:`policies`.
+        If not given, the ``quota_policy`` value from the heliopyrc file is
+        used.
+    dry_run : bool, optional
+        If ``True``, only return the files that would be removed.
+
+    Returns
+    -------
+    removed : list of pathlib.Path
+        The files that were removed.
+    """
+    if max_size is None:
+        max_size = config['disk_quota']
+    if dataset_sizes is None:
+        dataset_sizes = config['dataset_quotas']
+    if policy is None:
+        policy = config['quota_policy']
+    if policy not in policies:
+        raise ValueError(f'quota_policy must be one of {", ".join(policies)} '
+                         f'(got {policy})')
+
+    limits = list(dataset_sizes.items())
+    if max_size:
+        limits.append((None, max_size))
+    if limits:
+        # Record files from before the manifest was kept
+        manifest.scan(new=True)
+    removed = []
+    for dataset, size in limits:
+        max_bytes = size * 2**20
+        if manifest.total_size(dataset) <= max_bytes:
+            continue
+        # Files picked for earlier limits no longer count towards this one,
+        # even if they are still on disk because this is a dry run
+        picked = set(removed)
+        files = [f for f in manifest.files(dataset=dataset)
+                 if f['path'] not in picked]
+        removed += _evict(files, max_bytes, policy, dry_run)
+    return removed
+
+
+def _evict(files, max_bytes, policy, dry_run):
+    """
+    Remove *files* until their total size is at most *max_bytes*.
+    """
+    total = sum(f['size'] for f in files)
+    # Group the copies of each interval, least recently used first
+    intervals = collections.defaultdict(list)
+    for f in files:
+        intervals[_interval_key(f['path'])].append(f)
+    lock_paths = {key: _lock_paths(key, copies)
+                  for key, copies in intervals.items()}
+    intervals = sorted(intervals.values(),
+                       key=lambda copies: max(f['accessed'] or 0
+                                              for f in copies))
+
+    candidates = []
+    if policy != 'both':
+        for copies in intervals:
+            converted = [f['path'] for f in copies
+                         if f['kind'] == 'converted']
+            if not converted or len(converted) == len(copies):
+                continue
+            if policy == 'raw' and not _units_saved(copies, converted[0]):
+                continue
+            candidates += [f for f in copies if f['kind'] == policy]
+    for copies in intervals:
+        candidates += copies
+
+    removed = []
+    for f in candidates:
+        if total <= max_bytes:
+            break
+        if f['path'] in removed:
+            continue
+        if not _remove(f['path'], lock_paths[_interval_key(f['path'])],
+                       dry_run):
+            continue
+        removed.append(f['path'])
+        total -= f['size']
+    return removed
+
+
+def _interval_key(path):
+    """
+    Files with the same key are copies of the same interval of data.
+    """
+    # Imported here, as util needs this module
+    from heliopy.data import util
+    if manifest._kind(path.name) == 'converted':
+        # Strip the tag of the parameters the data was converted with
+        return path.with_name(cache.raw_stem(path))
+    return util._uncompressed_path(path).with_suffix('')
+
+
+def _lock_paths(key, copies):
+    """
+    The paths that are locked while the interval of data with files *copies*
+    is being downloaded or converted.
+    """
+    # Imported here, as util needs this module
+    from heliopy.data import util
+    paths = {key}
+    for f in copies:
+        if f['kind'] == 'raw':
+            paths.add(util._uncompressed_path(f['path']))
+    return sorted(paths)
+
+
+def _units_saved(copies, converted_path):
+    """
+    Return ``False`` if the units of the data in *copies* can only be read
+    from its raw CDF file.
+    """
+    if not any(f['path'].suffix == '.cdf' for f in copies):
+        return True
+    return cache.read_units(converted_path) is not None
+
+
+def _remove(path, lock_paths, dry_run=False):
+    """
+    Remove *path*, unless another process or thread holds the lock on any of
+    *lock_paths*. If *dry_run* is ``True``, only check the locks.
+
+    Returns ``False`` if the file is in use, so wasn't removed.
+    """
+    with contextlib.ExitStack() as locks:
+        try:
+            for lock_path in lock_paths:
+                locks.enter_context(lock.locked(lock_path, blocking=False))
+        except BlockingIOError:
+            return False
+        if dry_run:
+            return True
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        manifest.record(path)
+    return True
+
+
+def main(argv=None):
+    """
+    Entry point for the ``heliopy-cache`` command.
+    """
+    parser = argparse.ArgumentParser(
+        prog='heliopy-cache',
+        description='Manage the files in the local heliopy data directory.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    usage_parser = subparsers.add_parser(
+        'usage', help='List the size of each dataset.')
+    usage_parser.add_argument(
+        'dataset', nargs='?', default=None,
+        help='Only list this dataset, and the datasets within it.')
+
+    clean_parser = subparsers.add_parser(
+        'clean', help='Remove the least recently used data until the files '
+                      'fit within the quotas.')
+    clean_parser.add_argument(
+        '--max-size', type=float, default=None,
+        help='Maximum size of all the files, in megabytes. Defaults to the '
+             'disk_quota configuration option.')
+    clean_parser.add_argument(
+        '--dataset-size', action='append', default=None,
+        metavar='DATASET:SIZE',
+        help='Maximum size of a dataset, in megabytes. Can be given more '
+             'than once. Defaults to the dataset_quotas configuration '
+             'option.')
+    clean_parser.add_argument(
+        '--policy', choices=policies, default=None,
+        help='Which copies of the data to remove first. Defaults to the '
+             'quota_policy configuration option.')
+    clean_parser.add_argument(
+        '-n', '--dry-run', action='store_true',
+        help='List the files that would be removed, without removing them.')
+    args = parser.parse_args(argv)
+
+    # Pick up any changes made by other programs
+    manifest.scan()
+    if args.command == 'usage':
+        for dataset, sizes in usage(args.dataset).items():
+            print(f'{dataset}: {helper._bytes2str(sizes["raw"])} raw, '
+                  f'{helper._bytes2str(sizes["converted"])} converted')
+        return 0
+
+    dataset_sizes = None
+    if args.dataset_size is not None:
+        dataset_sizes = {}
+        for item in args.dataset_size:
+            dataset, _, size = item.rpartition(':')
+            try:
+                dataset_sizes[dataset] = float(size)
+            except ValueError:
+                dataset = None
+            if not dataset:
+                parser.error(f'Dataset size {item} must be given as '
+                             'DATASET:SIZE')
+    removed = enforce(args.max_size, dataset_sizes, args.policy,
+                      dry_run=args.dry_run)
+    for path in removed:
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,15 +8,21 @@ and HelioPy should be using a newer kernel please let us know at
 https://github.com/heliopython/heliopy/issues.
 
 """
+import concurrent.futures as futures
+import functools
+import hashlib
+import json
 import os
+import threading
 import warnings
 
-from urllib.request import urlretrieve
 import urllib.error
 import requests
+import requests.exceptions
 
 from heliopy import config
 import heliopy.data.util as util
+from heliopy.data import lock
 
 data_dir = config['download_dir']
 spice_dir = os.path.join(data_dir, 'spice')
@@ -53,9 +59,10 @@ def _stereo_kernels(probe, type):
         raise TypeError('argument not of type \'str\'')
     if probe == 'ahead' or probe == 'behind':
         try:
-            request = requests.get(
+            # This is run on import, so don't retry failed requests
+            request = util._request(
                 'https://sohowww.nascom.nasa.gov/solarsoft/stereo/gen/data/spice/{}/{}/'.format(
-                    type, probe), timeout=5)
+                    type, probe), timeout=5, max_retries=0)
             return ['https://sohowww.nascom.nasa.gov/solarsoft/stereo/gen/data/spice/{}/{}/{}'.format(
                     type, probe, S.split('"')[1])
                     for S in request.text.split('href') if '.bsp' in S]
@@ -161,7 +168,7 @@ for kernel in generic_kernels + spacecraft_kernels + predicted_kernels:
     kernel_dict[kernel.short_name] = kernel
 
 
-def get_kernel(name):
+def get_kernel(name, verify=False):
     """
     Get the local location of a kernel.
 
@@ -174,31 +181,183 @@ def get_kernel(name):
         :ref:`data_spice_spacecraft_kernels` for lists of
         available names. The name should be a string from the "Identifier"
         column of one of the tables.
+    verify : bool, optional
+        If ``True``, check the SHA-256 hash of kernels that are already
+        available locally, as well as their size. See :func:`get_kernels`.
 
     Returns
     -------
     list
         List of the locations of kernels that have been downloaded.
     """
-    if name not in kernel_dict:
-        raise ValueError(
-            'Provided name {} not in list of available names: {}'.format(
-                name, kernel_dict.keys()))
-    kernel = kernel_dict[name]
-    locs = []
-    for url in kernel.urls:
-        fname = url[url.rfind("/") + 1:]
-        local_loc = os.path.join(spice_dir, fname)
-        locs.append(local_loc)
-        if not os.path.exists(spice_dir):
-            os.makedirs(spice_dir)
-        if not os.path.exists(local_loc):
-            print('Downloading {}'.format(url))
-            try:
-                urlretrieve(url, local_loc, reporthook=util._reporthook)
-            except urllib.error.HTTPError as err:
-                warnings.warn('Failed to download {}'.format(url))
-    return locs
+    return get_kernels([name], verify=verify)[0]
+
+
+def get_kernels(names, verify=False, max_workers=None):
+    """
+    Get the local locations of several kernels, downloading any that aren't
+    available locally at the same time.
+
+    The size and SHA-256 hash of each downloaded file are stored in a
+    ``manifest.json`` file in the spice download directory. Local files that
+    don't match the manifest are downloaded again. Local files from before
+    the manifest was kept are checked against the size of the remote file.
+    Files are only moved to their final location once they have been
+    completely downloaded, so a partially downloaded kernel is never returned.
+
+    Parameters
+    ----------
+    names : list of str
+        Kernel names. See :func:`get_kernel`.
+    verify : bool, optional
+        If ``True``, check the SHA-256 hash of kernels that are already
+        available locally, as well as their size.
+    max_workers : int, optional
+        Maximum number of files to download at the same time. Defaults to
+        downloading all the files at the same time, limited by the
+        ``max_connections_per_host`` configuration option.
+
+    Returns
+    -------
+    list
+        For each name, a list of the locations of kernels that have been
+        downloaded. Files that failed to download are left out, with a
+        warning.
+    """
+    for name in names:
+        if name not in kernel_dict:
+            raise ValueError(
+                'Provided name {} not in list of available names: {}'.format(
+                    name, kernel_dict.keys()))
+    if not os.path.exists(spice_dir):
+        os.makedirs(spice_dir)
+
+    urls = [url for name in names for url in kernel_dict[name].urls]
+    if max_workers is None:
+        max_workers = len(urls)
+    manifest = _read_manifest()
+    get_file = functools.partial(_get_kernel_file, manifest=manifest,
+                                 verify=verify)
+    if max_workers > 1 and len(urls) > 1:
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+            locs = dict(zip(urls, ex.map(get_file, urls)))
+    else:
+        locs = {url: get_file(url) for url in urls}
+    return [[locs[url] for url in kernel_dict[name].urls
+             if locs[url] is not None] for name in names]
+
+
+def _get_kernel_file(url, manifest, verify):
+    """
+    Get a single kernel file, downloading it if it isn't available locally
+    or doesn't match *manifest*.
+
+    Returns ``None`` if the file couldn't be downloaded.
+    """
+    fname = url[url.rfind("/") + 1:]
+    local_loc = os.path.join(spice_dir, fname)
+    if os.path.exists(local_loc):
+        entry = manifest.get(fname)
+        if entry is None:
+            ok = _check_unrecorded(url, local_loc)
+        else:
+            ok = _check_file(local_loc, entry, verify)
+        if ok:
+            return local_loc
+        warnings.warn('{} does not match the kernel manifest, downloading '
+                      'it again'.format(local_loc))
+        os.remove(local_loc)
+
+    try:
+        # Checks the size of the download against the size sent by the server
+        util._download_remote(url[:url.rfind('/')], fname, spice_dir)
+    except (util.NoDataError, util.IncompleteDownloadError,
+            requests.exceptions.RequestException, urllib.error.URLError):
+        warnings.warn('Failed to download {}'.format(url))
+        return None
+    _update_manifest(fname, _manifest_entry(url, local_loc))
+    return local_loc
+
+
+def _manifest_entry(url, local_loc):
+    return {'url': url,
+            'size': os.path.getsize(local_loc),
+            'sha256': _sha256(local_loc)}
+
+
+def _check_file(local_loc, entry, verify):
+    """
+    Check a local file against its manifest *entry*.
+    """
+    if os.path.getsize(local_loc) != entry['size']:
+        return False
+    return not verify or _sha256(local_loc) == entry['sha256']
+
+
+def _check_unrecorded(url, local_loc):
+    """
+    Check a local file that isn't in the manifest, e.g. because it was
+    downloaded before the manifest was kept, against the size of the remote
+    file. If they match, the file is added to the manifest.
+    """
+    size = _remote_size(url)
+    if size is None:
+        # Can't be checked, e.g. when offline, so keep using the file
+        return True
+    if os.path.getsize(local_loc) != size:
+        return False
+    _update_manifest(os.path.basename(local_loc),
+                     _manifest_entry(url, local_loc))
+    return True
+
+
+def _remote_size(url):
+    """
+    Size in bytes of the remote file *url*, or ``None`` if it isn't known.
+    """
+    try:
+        r = util._request(url, method='HEAD', allow_redirects=True,
+                          headers={'Accept-Encoding': 'identity'})
+    except requests.exceptions.RequestException:
+        return None
+    with r:
+        size = r.headers.get('Content-Length')
+        if r.status_code != requests.codes.ok or size is None:
+            return None
+    return int(size)
+
+
+def _sha256(local_loc):
+    sha256 = hashlib.sha256()
+    with open(local_loc, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+_manifest_lock = threading.Lock()
+
+
+def _manifest_path():
+    return os.path.join(spice_dir, 'manifest.json')
+
+
+def _read_manifest():
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _update_manifest(fname, entry):
+    # Other processes might be updating the manifest at the same time
+    with _manifest_lock, lock.locked(_manifest_path()):
+        manifest = _read_manifest()
+        manifest[fname] = entry
+        with lock.temporary_path(_manifest_path()) as tmp_path:
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=1)
 
 
 # End of main code, now create tables for spice kernels
@@ -8,12 +8,13 @@ For more info about the sunspot number data, visit
 http://www.sidc.be/silso/datafiles.
 """
 
-import requests
 import datetime
 import pandas
 import os
 
 from heliopy import config
+from heliopy.data import lock
+from heliopy.data import util
 data_dir = config['download_dir']
 download_dir = os.path.join(data_dir, 'sunspot')
 
@@ -33,12 +34,14 @@ class _SunspotDownloader:
     def download(self):
         # If not already downloaded
         if not os.path.exists(self.download_location):
-            source_csv = requests.get(self.data_source)  # Downloading
+            # Downloading
+            source_csv = util._request(self.data_source)
             if(source_csv.status_code != 200):  # File not found
                 raise ValueError('Could not find source %s' %
                                  (self.data_source))
             # Write content into csv
-            with open(self.download_location, 'wb') as f:
+            with lock.temporary_path(self.download_location) as temp_path, \
+                    open(temp_path, 'wb') as f:
                 f.write(source_csv.content)
 
         return pandas.read_csv(self.download_location,
@@ -0,0 +1,18 @@
+import pytest
+
+from heliopy.data import util
+
+
+@pytest.fixture(autouse=True)
+def data_dir(request, tmp_path_factory, monkeypatch):
+    """
+    Use a new data directory for each test, so the locks and manifest of
+    local files made by tests aren't written to the real data directory.
+    Tests that download real data keep using the real data directory.
+    """
+    if request.node.get_closest_marker('data') or \
+            request.node.get_closest_marker('remote_data'):
+        return util.data_dir
+    path = tmp_path_factory.mktemp('data')
+    monkeypatch.setattr(util, 'data_dir', path)
+    return path
@@ -0,0 +1,70 @@
+import asyncio
+from datetime import datetime
+
+import pandas as pd
+
+from heliopy.data import aio, manifest, util
+from .util import DummyDownloader
+
+starttime = datetime(2010, 1, 1)
+endtime = datetime(2010, 1, 5)
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_load_downloader(tmp_path):
+    expected = DummyDownloader(tmp_path / 'sync').load(starttime, endtime)
+    dls = [DummyDownloader(tmp_path / str(i), no_data=(2,))
+           for i in range(2)]
+
+    async def main():
+        return await asyncio.gather(
+            *[aio.load(dl, starttime, endtime) for dl in dls])
+
+    for ts in run(main()):
+        df = ts.to_dataframe()
+        expected_df = expected.to_dataframe()
+        pd.testing.assert_frame_equal(
+            df, expected_df[expected_df.index.day != 2])
+
+
+def test_load_function(tmp_path):
+    def loader(starttime, endtime):
+        return DummyDownloader(tmp_path).load(starttime, endtime)
+
+    ts = run(aio.load(loader, starttime, endtime))
+    assert ts.to_dataframe().shape == (4 * 24 - 1, 1)
+
+
+def test_load_downloader_kwargs(tmp_path):
+    dl = DummyDownloader(tmp_path)
+    ts = run(aio.load(dl, starttime, endtime, max_workers=1, columns=['x']))
+    assert list(ts.to_dataframe().columns) == ['x']
+
+
+def test_load_downloader_missing(tmp_path):
+    # Missing intervals are downloaded together, so downloaders can combine
+    # them into fewer requests
+    calls = []
+
+    class Downloader(DummyDownloader):
+        def _download_missing(self, intervals, max_workers=None):
+            calls.append((len(intervals), max_workers))
+            return super()._download_missing(intervals, max_workers)
+
+    dl = Downloader(tmp_path)
+    run(aio.load(dl, starttime, endtime, max_workers=2))
+    assert calls == [(len(dl.intervals(starttime, endtime)), 2)]
+
+
+def test_load_downloader_quota(data_dir, monkeypatch):
+    monkeypatch.setitem(util.config, 'disk_quota', 1e-3)
+    dl = DummyDownloader(data_dir / 'dummy')
+    run(aio.load(dl, starttime, endtime))
+    assert manifest.total_size() <= 1e-3 * 2**20
@@ -0,0 +1,365 @@
+from datetime import datetime, timedelta
+import os
+
+import astropy.units as u
+import numpy as np
+import pandas as pd
+import pytest
+
+from heliopy.data import cache, helper, util
+
+from .util import DummyDownloader, download_csv, process_csv
+
+starttime = datetime(2010, 1, 1)
+endtime = datetime(2010, 1, 4)
+
+# Package needed by each format
+_REQUIRES = {'hdf': 'tables', 'parquet': 'pyarrow', 'numpy': 'numpy'}
+
+
+@pytest.fixture
+def df():
+    index = pd.date_range(starttime, periods=100, freq='min', name='Time')
+    return pd.DataFrame({'Bx': np.arange(100.), 'By': np.ones(100)},
+                        index=index)
+
+
+@pytest.mark.parametrize('name, compression', [('hdf', None),
+                                               ('hdf', 'zlib'),
+                                               ('parquet', None),
+                                               ('parquet', 'zstd'),
+                                               ('numpy', None)])
+def test_roundtrip(tmp_path, monkeypatch, df, name, compression):
+    pytest.importorskip(_REQUIRES[name])
+    monkeypatch.setitem(util.config, 'cache_compression', compression)
+    backend = cache.get_backend(name)
+    path = backend.path(tmp_path / 'data.csv')
+    assert path.suffix == backend.suffix
+    backend.write(df, path)
+    pd.testing.assert_frame_equal(cache.backend_for(path).read(path), df,
+                                  check_freq=False)
+    pd.testing.assert_frame_equal(backend.read(path, columns=['By']),
+                                  df[['By']], check_freq=False)
+
+
+@pytest.mark.parametrize('name', ['hdf', 'parquet', 'numpy'])
+def test_units(tmp_path, df, name):
+    pytest.importorskip(_REQUIRES[name])
+    backend = cache.get_backend(name)
+    path = backend.path(tmp_path / 'none.csv')
+    backend.write(df, path)
+    assert backend.read_metadata(path) == {}
+    assert cache.read_units(path) is None
+    units = {'Bx': u.nT, 'By': u.km / u.s}
+    path = backend.path(tmp_path / 'units.csv')
+    backend.write(df, path, metadata={'units': cache.encode_units(units)})
+    assert cache.read_units(path) == units
+
+
+def test_tag(tmp_path):
+    assert cache.tag({}) is None
+    tag = cache.tag({'rate': 'hi', 'coords': 'gse'})
+    assert tag == cache.tag({'coords': 'gse', 'rate': 'hi'})
+    assert tag != cache.tag({'rate': 'lo', 'coords': 'gse'})
+    path = cache.HDFBackend().path(tmp_path / 'data.cdf', tag=tag)
+    assert path.name == f'data-{tag}.hdf'
+    assert cache.raw_stem(path) == 'data'
+
+
+@pytest.mark.parametrize('name', ['hdf', 'parquet', 'numpy'])
+def test_read_time_range(tmp_path, monkeypatch, name):
+    pytest.importorskip(_REQUIRES[name])
+    index = pd.date_range(starttime, periods=10**5, freq='s', name='Time')
+    df = pd.DataFrame({'|B|': np.arange(10.**5), 'Na/Np': np.ones(10**5)},
+                      index=index)
+    backend = cache.get_backend(name)
+    path = backend.path(tmp_path / 'data.csv')
+    backend.write(df, path)
+
+    start = datetime(2010, 1, 1, 1)
+    end = datetime(2010, 1, 1, 2)
+    read = backend.read(path, starttime=start, endtime=end)
+    pd.testing.assert_frame_equal(read, df.loc[start:end], check_freq=False)
+    read = backend.read(path, columns=['|B|'], starttime=start)
+    pd.testing.assert_frame_equal(read, df.loc[start:, ['|B|']],
+                                  check_freq=False)
+
+
+def test_numpy_memory_mapped(tmp_path, df):
+    backend = cache.NumpyBackend()
+    path = backend.path(tmp_path / 'data.csv')
+    backend.write(df, path)
+    read = backend.read(path, columns=['Bx'], starttime=df.index[10])
+    values = read['Bx'].to_numpy()
+    # The data refers to the file instead of being copied
+    assert not values.flags.owndata
+    pd.testing.assert_frame_equal(read, df.iloc[10:][['Bx']],
+                                  check_freq=False)
+
+
+def test_numpy_other_types(tmp_path):
+    index = pd.MultiIndex.from_product([[1, 2], [0.5, 1.5]],
+                                       names=['a', 'b'])
+    df = pd.DataFrame({'n': [1, 2, 3, 4],
+                       'ok': [True, False, True, True]}, index=index)
+    backend = cache.NumpyBackend()
+    backend.write(df, tmp_path / 'data.npcols')
+    pd.testing.assert_frame_equal(backend.read(tmp_path / 'data.npcols'), df)
+    # Empty data is saved as well
+    backend.write(df.iloc[:0], tmp_path / 'empty.npcols')
+    assert len(backend.read(tmp_path / 'empty.npcols')) == 0
+
+    # Data that can't be read back unchanged isn't saved
+    strings = df.assign(flag=['x', 'yy', 'x', 'zzz'])
+    times = df.assign(t=pd.date_range('2010-01-01', periods=4, tz='UTC'))
+    for unsupported in [strings, times]:
+        with pytest.raises(cache.UnsupportedDataError):
+            backend.write(unsupported, tmp_path / 'unsupported.npcols')
+
+
+def test_numpy_fallback(tmp_path):
+    pytest.importorskip('tables')
+    # Data the numpy format can't store is saved as hdf instead
+    df = pd.DataFrame({'flag': ['x', 'yy']},
+                      index=pd.date_range(starttime, periods=2, name='Time'))
+    path = util._write_cache(df, tmp_path / 'data.npcols')
+    assert path == tmp_path / 'data.hdf'
+    pd.testing.assert_frame_equal(cache.HDFBackend().read(path), df,
+                                  check_freq=False)
+
+
+def test_read_hdf_untimed(tmp_path):
+    pytest.importorskip('tables')
+    # Files saved in the fixed format, and tables without a time index,
+    # are read whole
+    df = pd.DataFrame({'x': np.arange(10.)})
+    df.to_hdf(tmp_path / 'fixed.hdf', key='data', format='fixed')
+    cache.HDFBackend().write(df, tmp_path / 'table.hdf')
+    for fname in ['fixed.hdf', 'table.hdf']:
+        read = cache.HDFBackend().read(tmp_path / fname, starttime=starttime,
+                                       endtime=endtime)
+        pd.testing.assert_frame_equal(read, df)
+
+
+@pytest.mark.filterwarnings('ignore::pandas.errors.PerformanceWarning')
+def test_hdf_mixed_objects(tmp_path, df):
+    pytest.importorskip('tables')
+    # Data the table format can't store is saved in the fixed format
+    df['flag'] = ['a', np.nan, 1, 2.5] * 25
+    path = tmp_path / 'data.hdf'
+    cache.HDFBackend().write(df, path, metadata={'key': 1})
+    pd.testing.assert_frame_equal(cache.HDFBackend().read(path), df)
+    assert cache.HDFBackend().read_metadata(path) == {'key': 1}
+
+
+def test_select_columns():
+    df = pd.DataFrame(columns=['B_0', 'B_1', 'B_10', 'B_x', '|B|'])
+    assert list(cache.select_columns(df, None).columns) == list(df.columns)
+    assert list(cache.select_columns(df, ['B']).columns) == [
+        'B_0', 'B_1', 'B_10']
+    assert list(cache.select_columns(df, ['|B|', 'B_1', 'V']).columns) == [
+        'B_1', '|B|']
+
+
+def test_get_backend(monkeypatch):
+    monkeypatch.setitem(util.config, 'cache_format', 'parquet')
+    assert isinstance(cache.get_backend(), cache.ParquetBackend)
+    assert cache.suffixes() == ['.parquet', '.hdf', '.npcols']
+    with pytest.raises(ValueError):
+        cache.get_backend('csv')
+
+
+@pytest.mark.parametrize('name', ['hdf', 'parquet', 'numpy'])
+def test_load_cached(tmp_path, monkeypatch, name):
+    pytest.importorskip(_REQUIRES[name])
+    monkeypatch.setattr(util, 'use_hdf', True)
+    monkeypatch.setitem(util.config, 'cache_format', name)
+    dl = DummyDownloader(tmp_path)
+    expected = dl.load(starttime, endtime).to_dataframe()
+    intervals = dl.intervals(starttime, endtime)
+    for interval in intervals:
+        assert dl.local_cache_path(interval).suffix == \
+            cache.get_backend(name).suffix
+        assert dl.local_cache_path(interval).exists()
+        # Remove the raw files, to check the converted files are read
+        dl.local_path(interval).unlink()
+
+    # Converted files are read in whichever format is set
+    monkeypatch.setitem(util.config, 'cache_format',
+                        {'hdf': 'parquet', 'parquet': 'hdf',
+                         'numpy': 'hdf'}[name])
+    dl.download_threads.clear()
+    ts = dl.load(starttime, endtime)
+    assert len(dl.download_threads) == 0
+    pd.testing.assert_frame_equal(ts.to_dataframe(), expected)
+
+
+def test_listdata(tmp_path, monkeypatch, df, capsys):
+    pytest.importorskip('pyarrow')
+    (tmp_path / 'probe').mkdir()
+    (tmp_path / 'probe' / 'raw.csv').write_bytes(b'0' * 1024)
+    cache.ParquetBackend().write(df, tmp_path / 'probe' / 'raw.parquet')
+    monkeypatch.setitem(helper.config, 'download_dir', str(tmp_path))
+    helper.listdata()
+    row = [line for line in capsys.readouterr().out.splitlines()
+           if 'probe' in line][0]
+    size = (tmp_path / 'probe' / 'raw.parquet').stat().st_size
+    assert row.split('|')[2].strip() == '1.00 KB'
+    assert row.split('|')[3].strip() == helper._bytes2str(size)
+
+
+def test_memory_cache(df):
+    nbytes = cache._nbytes(df)
+    memory_cache = cache.MemoryCache(2 * nbytes)
+    memory_cache.put('a', df)
+    memory_cache.put('b', df)
+    assert memory_cache.get('a') is df
+    # 'b' is now the least recently used
+    memory_cache.put('c', df)
+    assert memory_cache.get('b') is None
+    assert memory_cache.get('a') is df and memory_cache.get('c') is df
+    assert memory_cache.nbytes == 2 * nbytes
+
+    # Data larger than the cache isn't stored
+    memory_cache.put('d', pd.concat([df] * 3))
+    assert memory_cache.get('d') is None
+    assert len(memory_cache) == 2
+    memory_cache.discard('a')
+    assert memory_cache.nbytes == nbytes
+    memory_cache.clear()
+    assert len(memory_cache) == 0 and memory_cache.nbytes == 0
+    assert not cache.MemoryCache(0).enabled
+
+
+@pytest.fixture
+def memory_cache(monkeypatch):
+    memory_cache = cache.MemoryCache(2**20)
+    monkeypatch.setattr(cache, 'memory_cache', memory_cache)
+    return memory_cache
+
+
+def test_load_memory_cached(tmp_path, memory_cache):
+    dl = DummyDownloader(tmp_path)
+    expected = dl.load(starttime, endtime).to_dataframe()
+    intervals = dl.intervals(starttime, endtime)
+    assert len(memory_cache) == len(intervals)
+    # Empty the files, to check they aren't read again
+    for interval in intervals:
+        dl.local_path(interval).write_text('')
+
+    # A different window and columns are read from memory
+    start = datetime(2010, 1, 2)
+    ts = dl.load(start, endtime, columns=['x'])
+    pd.testing.assert_frame_equal(ts.to_dataframe(),
+                                  expected[expected.index > start])
+
+
+def test_load_memory_cached_edited(tmp_path, memory_cache):
+    # Editing loaded data doesn't change the data kept in memory
+    dl = DummyDownloader(tmp_path)
+    end = starttime + timedelta(hours=12)
+    expected = dl.load(starttime, end).to_dataframe().copy()
+    ts = dl.load(starttime, end)
+    ts.to_dataframe()['x'].values[:] = -1
+    pd.testing.assert_frame_equal(dl.load(starttime, end).to_dataframe(),
+                                  expected)
+
+
+def test_process_memory_cached(tmp_path, memory_cache):
+    calls = []
+
+    def processing_func(f):
+        calls.append(f.name)
+        return pd.read_csv(f, parse_dates=['Time'], index_col='Time')
+
+    def load():
+        return process_csv(tmp_path, processing_func)
+
+    expected = load().to_dataframe()
+    assert load().to_dataframe().equals(expected)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('tier', ['raw', 'converted'])
+def test_cache_tier(tmp_path, monkeypatch, tier):
+    pytest.importorskip('tables')
+    monkeypatch.setattr(util, 'use_hdf', True)
+    monkeypatch.setitem(util.config, 'cache_tier', tier)
+    dl = DummyDownloader(tmp_path)
+    expected = dl.load(starttime, endtime).to_dataframe()
+    intervals = dl.intervals(starttime, endtime)
+    for interval in intervals:
+        assert dl.local_path(interval).exists() == (tier == 'raw')
+        assert dl.local_hdf_path(interval).exists() == (tier == 'converted')
+        assert dl.local_file_exists(interval)
+
+    dl.download_threads.clear()
+    ts = dl.load(starttime, endtime)
+    assert len(dl.download_threads) == 0
+    pd.testing.assert_frame_equal(ts.to_dataframe(), expected)
+
+
+def test_process_converted_only(tmp_path, monkeypatch):
+    pytest.importorskip('tables')
+    monkeypatch.setitem(util.config, 'cache_tier', 'converted')
+    downloads = []
+
+    def download_func(remote_base_url, local_base_dir, directory, fname,
+                      remote_fname, extension):
+        downloads.append(fname)
+        download_csv(remote_base_url, local_base_dir, directory, fname,
+                     remote_fname, extension)
+
+    def processing_func(f):
+        return pd.read_csv(f, parse_dates=['Time'], index_col='Time')
+
+    for _ in range(2):
+        ts = process_csv(tmp_path, processing_func, download_func)
+        assert len(ts.to_dataframe()) == 23
+    assert downloads == ['data']
+    assert sorted(os.listdir(tmp_path / 'dir')) == ['data.hdf']
+
+
+def test_process_cache_key(tmp_path, monkeypatch):
+    pytest.importorskip('tables')
+    monkeypatch.setattr(util, 'use_hdf', True)
+    calls = []
+
+    def processing_func(f, scale=1):
+        calls.append(scale)
+        df = pd.read_csv(f, parse_dates=['Time'], index_col='Time')
+        return df * scale
+
+    def load(version=1, **kwargs):
+        return process_csv(tmp_path, processing_func,
+                           processing_kwargs=kwargs,
+                           cache_version=version).to_dataframe()
+
+    # Data converted with different parameters is kept separately
+    expected = load()
+    pd.testing.assert_frame_equal(load(scale=2), expected * 2)
+    pd.testing.assert_frame_equal(load(), expected)
+    pd.testing.assert_frame_equal(load(scale=2), expected * 2)
+    assert calls == [1, 2]
+    tag = cache.tag({'scale': 2})
+    assert sorted(os.listdir(tmp_path / 'dir')) == sorted([
+        'data.csv', 'data.hdf', f'data-{tag}.hdf'])
+
+    # Only the data converted by an older version is converted again
+    load(version=2)
+    load(version=2)
+    load(scale=2)
+    assert calls == [1, 2, 1]
+
+
+def test_cache_raw_changed(tmp_path, monkeypatch):
+    pytest.importorskip('tables')
+    monkeypatch.setattr(util, 'use_hdf', True)
+    dl = DummyDownloader(tmp_path)
+    dl.load(starttime, endtime)
+    interval = dl.intervals(starttime, endtime)[0]
+    # Replace the raw data with a different version
+    with open(dl.local_path(interval), 'a') as f:
+        f.write('\n')
+    assert dl._find_cache(interval) is None
+    assert not dl.local_hdf_path(interval).exists()
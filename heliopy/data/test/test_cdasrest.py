@@ -0,0 +1,209 @@
+from datetime import datetime, timedelta
+import os
+import shutil
+
+import astropy.units as u
+import cdflib
+import numpy as np
+import pandas as pd
+import pytest
+import requests.exceptions
+
+from heliopy.data import cdasrest, util
+
+starttime = datetime(2010, 1, 1)
+ndays = 4
+
+
+def write_cdf(path, starttime, ndays):
+    """
+    Write a CDF file with 4 records per day from *starttime* for *ndays*.
+    """
+    times = [starttime + timedelta(hours=6 * i) for i in range(4 * ndays)]
+    epochs = cdflib.cdfepoch.compute_epoch(
+        [[t.year, t.month, t.day, t.hour, 0, 0, 0] for t in times])
+    cdf = cdflib.cdfwrite.CDF(str(path), delete=True)
+    cdf.write_globalattrs({'Project': {0: 'Test'}})
+    var_spec = {'Variable': 'Epoch', 'Data_Type': 31, 'Num_Elements': 1,
+                'Rec_Vary': True, 'Dim_Sizes': []}
+    cdf.write_var(var_spec, var_attrs={'UNITS': 'ms'},
+                  var_data=np.array(epochs))
+    var_spec = {'Variable': 'label_B', 'Data_Type': 51, 'Num_Elements': 2,
+                'Rec_Vary': False, 'Dim_Sizes': [3]}
+    cdf.write_var(var_spec, var_attrs={}, var_data=['Bx', 'By', 'Bz'])
+    var_spec = {'Variable': 'B', 'Data_Type': 21, 'Num_Elements': 1,
+                'Rec_Vary': True, 'Dim_Sizes': [3]}
+    cdf.write_var(var_spec,
+                  var_attrs={'UNITS': 'nT', 'DEPEND_0': 'Epoch'},
+                  var_data=np.arange(3 * len(times),
+                                     dtype=np.float32).reshape(-1, 3))
+    cdf.close()
+
+
+@pytest.fixture
+def cdas_downloader(tmpdir, monkeypatch):
+    monkeypatch.setattr(util, 'data_dir', util.path.Path(str(tmpdir)))
+    return cdasrest.CDASDwonloader('test', 'TEST_DATA', 'test',
+                                   coalesce=True)
+
+
+def test_split_cdf(tmpdir):
+    src = tmpdir / 'src.cdf'
+    # Data is only available for the first three days
+    write_cdf(src, starttime, ndays - 1)
+    bounds = [(starttime + timedelta(days=i),
+               starttime + timedelta(days=i + 1)) for i in range(ndays)]
+    paths = [tmpdir / f'{i}.cdf' for i in range(ndays)]
+    assert cdasrest._split_cdf(src, bounds, paths) == [True] * 3 + [False]
+
+    full = util.cdf2df(cdflib.CDF(str(src)), 'Epoch')
+    for i in range(ndays - 1):
+        cdf = cdflib.CDF(str(paths[i]))
+        df = util.cdf2df(cdf, 'Epoch')
+        assert (df.index >= bounds[i][0]).all()
+        assert (df.index < bounds[i][1]).all()
+        assert (df == full.iloc[4 * i:4 * (i + 1)]).all().all()
+        assert list(cdf.varget('label_B').ravel()) == ['Bx', 'By', 'Bz']
+        assert str(util.cdf_units(cdf)['B']) == 'nT'
+    assert not paths[-1].exists()
+
+    # Files that have already been written aren't written again
+    paths[0].write_binary(b'written elsewhere')
+    assert cdasrest._split_cdf(src, bounds, paths) == [True] * 3 + [False]
+    assert paths[0].read_binary() == b'written elsewhere'
+
+
+def test_load_coalesced(cdas_downloader, tmpdir, monkeypatch):
+    # Fake CDAS server, which rejects requests for more than two days
+    requests = []
+
+    def get_data(dataset, stime, etime, dl_path=None, max_retries=None):
+        # Requests that can be split aren't retried
+        assert (max_retries == 0) == (etime - stime > timedelta(days=1))
+        requests.append((stime, etime))
+        if etime - stime > timedelta(days=2):
+            raise cdasrest.CDASRequestError('Request too large')
+        dl_path = dl_path or str(tmpdir / 'download.cdf')
+        write_cdf(dl_path, stime, (etime - stime).days)
+        return dl_path
+
+    monkeypatch.setattr(cdasrest, 'get_data', get_data)
+
+    # Make the second day available locally already
+    interval = cdas_downloader.intervals(
+        starttime + timedelta(days=1), starttime + timedelta(days=2))[0]
+    local_path = cdas_downloader.local_path(interval)
+    local_path.parent.mkdir(parents=True)
+    write_cdf(tmpdir / 'day.cdf', starttime + timedelta(days=1), 1)
+    shutil.copy(tmpdir / 'day.cdf', local_path)
+
+    endtime = starttime + timedelta(days=7)
+    df = cdas_downloader.load(
+        starttime, endtime - timedelta(hours=1)).to_dataframe()
+    # The first record is exactly at starttime, so is filtered out
+    assert len(df) == 4 * 7 - 1
+    assert df.index.is_monotonic_increasing and df.index.is_unique
+    # One request for the first day, and a rejected request for days 3 - 7
+    # that is split in half
+    day = timedelta(days=1)
+    assert requests == [
+        (starttime, starttime + day),
+        (starttime + 2 * day, endtime),
+        (starttime + 2 * day, starttime + 4 * day),
+        (starttime + 4 * day, endtime),
+        (starttime + 4 * day, starttime + 5 * day),
+        (starttime + 5 * day, endtime)]
+    for interval in cdas_downloader.intervals(starttime, endtime - day):
+        assert cdas_downloader.local_path(interval).exists()
+
+
+def test_variables_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(util, 'data_dir', util.path.Path(str(tmpdir)))
+    calls = []
+
+    def get_variables(dataset, timeout=10):
+        calls.append(dataset)
+        return {'VariableDescription': [{'Name': 'B'}, {'Name': 'V'}]}
+
+    monkeypatch.setattr(cdasrest, 'get_variables', get_variables)
+    stime = starttime
+    etime = starttime + timedelta(days=1)
+    url = cdasrest.get_cdas_url(stime, etime, None, 'TEST_DATA')
+    assert url.endswith('/B,V')
+    assert cdasrest.get_cdas_url(stime, etime, None, 'TEST_DATA') == url
+    assert calls == ['TEST_DATA']
+
+    # Expire the cache, and check the cached copy is used if the server
+    # can't be reached
+    cache_path = cdasrest._variables_cache_path('TEST_DATA')
+    os.utime(cache_path, (0, 0))
+
+    def get_variables_offline(dataset, timeout=10):
+        calls.append(dataset)
+        raise requests.exceptions.ConnectionError()
+
+    monkeypatch.setattr(cdasrest, 'get_variables', get_variables_offline)
+    assert cdasrest.get_cdas_url(stime, etime, None, 'TEST_DATA') == url
+    assert len(calls) == 2
+
+
+def test_cdf2df_columns(tmpdir):
+    write_cdf(tmpdir / 'data.cdf', starttime, 1)
+    cdf = cdflib.CDF(str(tmpdir / 'data.cdf'))
+    read = []
+    varget = cdf.varget
+
+    def logged_varget(variable, *args, **kwargs):
+        read.append(variable)
+        return varget(variable, *args, **kwargs)
+
+    cdf.varget = logged_varget
+    full = util.cdf2df(cdf, 'Epoch')
+    assert list(full.columns) == ['B_0', 'B_1', 'B_2']
+    assert 'label_B' in read
+
+    read.clear()
+    df = util.cdf2df(cdf, 'Epoch', columns=['B_1'])
+    pd.testing.assert_frame_equal(df, full[['B_1']])
+    assert set(read) == {'Epoch', 'B'}
+    df = util.cdf2df(cdf, 'Epoch', columns=['B'])
+    pd.testing.assert_frame_equal(df, full)
+
+
+@pytest.mark.parametrize('use_hdf', [False, True])
+def test_load_columns(cdas_downloader, tmpdir, monkeypatch, use_hdf):
+    pytest.importorskip('tables')
+    monkeypatch.setattr(util, 'use_hdf', use_hdf)
+    interval = cdas_downloader.intervals(starttime, starttime)[0]
+    local_path = cdas_downloader.local_path(interval)
+    local_path.parent.mkdir(parents=True)
+    write_cdf(local_path, starttime, 1)
+
+    endtime = starttime + timedelta(hours=23)
+    # Load twice, so the second load reads from the cache if it is used
+    for _ in range(2):
+        df = cdas_downloader.load(starttime, endtime,
+                                  columns=['B_0', 'B_2']).to_dataframe()
+        assert list(df.columns) == ['B_0', 'B_2']
+        assert len(df) == 3
+    assert cdas_downloader.local_hdf_path(interval).exists() == use_hdf
+    with pytest.raises(ValueError, match='B_3'):
+        cdas_downloader.load(starttime, endtime, columns=['B_3'])
+
+
+def test_load_converted_only(cdas_downloader, tmpdir, monkeypatch):
+    pytest.importorskip('tables')
+    monkeypatch.setitem(util.config, 'cache_tier', 'converted')
+    interval = cdas_downloader.intervals(starttime, starttime)[0]
+    local_path = cdas_downloader.local_path(interval)
+    local_path.parent.mkdir(parents=True)
+    write_cdf(local_path, starttime, 1)
+
+    endtime = starttime + timedelta(hours=23)
+    for _ in range(2):
+        ts = cdas_downloader.load(starttime, endtime)
+        # The raw file is removed once it has been converted, and the units
+        # are read from the converted copy
+        assert not local_path.exists()
+        assert cdas_downloader.local_file_exists(interval)
+        assert ts.units['B_0'] == u.nT
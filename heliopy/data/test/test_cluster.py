@@ -1,17 +1,22 @@
-from datetime import datetime
+from datetime import datetime, time
+import io
+import pathlib
+import tarfile
+
 import pytest
 
 from heliopy import config
-from .util import check_data_output
+from .util import check_data_output, FileServer
 
 cluster = pytest.importorskip('heliopy.data.cluster')
 pytest.mark.data()
-if config['cluster_cookie'] == 'none':
-    pytest.skip('Cluster download cookie not set', allow_module_level=True)
+requires_cookie = pytest.mark.skipif(config['cluster_cookie'] == 'none',
+                                     reason='Cluster download cookie not set')
 
 probe = '3'
 
 
+@requires_cookie
 def test_fgm():
     starttime = datetime(2004, 6, 18, 11, 35, 0)
     endtime = datetime(2004, 6, 19, 18, 35, 0)
@@ -19,6 +24,7 @@ def test_fgm():
     check_data_output(df)
 
 
+@requires_cookie
 def test_peace_moments():
     starttime = datetime(2009, 12, 22, 4, 0, 0)
     endtime = datetime(2009, 12, 22, 6)
@@ -26,6 +32,7 @@ def test_peace_moments():
     check_data_output(df)
 
 
+@requires_cookie
 def test_cis_hia_onboard_moms():
     starttime = datetime(2009, 1, 1, 0, 0, 0)
     endtime = datetime(2009, 1, 1, 2, 0, 0)
@@ -33,8 +40,49 @@ def test_cis_hia_onboard_moms():
     check_data_output(df)
 
 
+@requires_cookie
 def test_cis_codif_h1_moms():
     starttime = datetime(2009, 1, 1, 0, 0, 0)
     endtime = datetime(2009, 1, 1, 2, 0, 0)
     df = cluster.cis_codif_h1_moms(probe, starttime, endtime)
     check_data_output(df)
+
+
+def test_download_window(tmp_path, monkeypatch):
+    # Archive in the same layout as the CSA delivers
+    files = {}
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w:gz') as tar:
+        for day in [18, 19]:
+            fname = (f'C3_CP_FGM_FULL__200406{day}_000000_200406{day}_235959'
+                     '_V140305.cdf')
+            files[fname[:24] + '.cdf'] = data = bytes([day]) * 1000
+            info = tarfile.TarInfo(
+                'CSA_Download_20200101_0000/C3_CP_FGM_FULL/' + fname)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    starttime = datetime(2004, 6, 18)
+    endtime = datetime.combine(datetime(2004, 6, 19), time.max)
+    with FileServer({}) as server:
+        monkeypatch.setattr(cluster, 'csa_url', server.url + '/csa?')
+        monkeypatch.setattr(cluster, 'cda_cookie', 'cookie')
+        monkeypatch.setattr(cluster, 'cluster_dir', pathlib.Path(tmp_path))
+        url = cluster._request_url(probe, starttime, endtime,
+                                   'CP_FGM_FULL', DELIVERY_INTERVAL='daily')
+        server.files[url[len(server.url):]] = archive.getvalue()
+        cluster._download_window(probe, starttime, endtime, 'fgm',
+                                 'CP_FGM_FULL')
+        assert len(server.requests) == 1
+
+    local_dir = tmp_path / 'c3' / 'fgm' / '2004'
+    assert sorted(p.name for p in local_dir.iterdir()) == sorted(files)
+    for fname, data in files.items():
+        assert (local_dir / fname).read_bytes() == data
+
+
+def test_contiguous_days():
+    days = [(datetime(2004, 6, d), datetime.combine(datetime(2004, 6, d),
+                                                    time.max))
+            for d in [1, 2, 3, 5, 6]]
+    assert cluster._contiguous_days(days) == [days[:3], days[3:]]
@@ -0,0 +1,113 @@
+from datetime import datetime
+import os
+import threading
+import time
+
+import pytest
+
+from heliopy.data import lock
+
+from .util import DummyDownloader
+
+
+def test_locked(data_dir):
+    path = data_dir / 'data.csv'
+    events = []
+
+    def other():
+        with lock.locked(path):
+            events.append('other')
+
+    with lock.locked(path):
+        # The same thread can take the lock again
+        with lock.locked(path):
+            pass
+        thread = threading.Thread(target=other)
+        thread.start()
+        time.sleep(0.2)
+        events.append('main')
+    thread.join()
+    assert events == ['main', 'other']
+    # Lock files are removed once released
+    assert os.listdir(data_dir / '.locks') == []
+
+
+def test_locked_nonblocking(data_dir):
+    path = data_dir / 'data.csv'
+    errors = []
+
+    def other():
+        try:
+            with lock.locked(path, blocking=False):
+                pass
+        except BlockingIOError as e:
+            errors.append(e)
+
+    with lock.locked(path):
+        with lock.locked(path, blocking=False):
+            pass
+        thread = threading.Thread(target=other)
+        thread.start()
+        thread.join()
+    assert len(errors) == 1
+    # Free again once released
+    with lock.locked(path, blocking=False):
+        pass
+
+
+def test_locked_threads(data_dir):
+    path = data_dir / 'data.csv'
+    count = [0]
+
+    def increment():
+        for _ in range(100):
+            with lock.locked(path):
+                value = count[0]
+                time.sleep(0)
+                count[0] = value + 1
+
+    threads = [threading.Thread(target=increment) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert count[0] == 400
+
+
+def test_temporary_path(tmp_path):
+    path = tmp_path / 'data.csv'
+    with pytest.raises(ValueError):
+        with lock.temporary_path(path) as temp_path:
+            temp_path.write_text('partial')
+            raise ValueError
+    assert os.listdir(tmp_path) == []
+
+    with lock.temporary_path(path) as temp_path:
+        temp_path.write_text('data')
+        assert not path.exists()
+    assert path.read_text() == 'data'
+    assert os.listdir(tmp_path) == ['data.csv']
+
+
+def test_download_once(data_dir):
+    # Downloaders sharing a directory only download each interval once
+    downloads = []
+
+    class SlowDownloader(DummyDownloader):
+        def download(self, interval):
+            downloads.append(interval)
+            time.sleep(0.2)
+            return super().download(interval)
+
+    dls = [SlowDownloader(data_dir / 'dummy') for _ in range(4)]
+    starttime = datetime(2010, 1, 1)
+    endtime = datetime(2010, 1, 2)
+    threads = [threading.Thread(target=dl.load, args=(starttime, endtime))
+               for dl in dls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    intervals = dls[0].intervals(starttime, endtime)
+    assert sorted(str(interval.start) for interval in downloads) == \
+        [str(interval.start) for interval in intervals]
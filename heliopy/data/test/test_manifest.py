@@ -0,0 +1,118 @@
+from datetime import datetime
+import os
+import threading
+
+import pytest
+
+from heliopy.data import helper, manifest, util
+
+from .util import DummyDownloader
+
+
+def test_record(data_dir):
+    path = data_dir / 'probe' / 'inst' / '2010' / 'inst_20100101_v02.cdf'
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b'0' * 10)
+    manifest.record(path, datetime(2010, 1, 1), datetime(2010, 1, 2))
+    # Times already recorded are kept
+    manifest.record(path)
+    files = manifest.files(dataset='probe/inst')
+    assert isinstance(files[0].pop('accessed'), float)
+    assert files == [{'path': path, 'dataset': 'probe/inst', 'kind': 'raw',
+                      'version': '02', 'size': 10,
+                      'mtime': path.stat().st_mtime,
+                      'start': '2010-01-01T00:00:00',
+                      'end': '2010-01-02T00:00:00'}]
+
+    path.unlink()
+    manifest.record(path)
+    assert manifest.files() == []
+
+
+def test_match(data_dir):
+    directory = data_dir / 'probe'
+    directory.mkdir()
+    for name in ['a_20100101_v01.txt', 'a_20100102_v01.txt',
+                 'a_20100102_v01.txt.part']:
+        (directory / name).write_text('')
+    assert manifest.match(directory, r'a_20100102_v\d\d.txt') == \
+        'a_20100102_v01.txt'
+    assert manifest.match(directory, 'b.txt') is None
+
+    # Changes made outside heliopy are picked up
+    (directory / 'b.txt').write_text('')
+    assert manifest.match(directory, 'b.txt') == 'b.txt'
+    os.remove(directory / 'a_20100101_v01.txt')
+    assert manifest.match(directory, 'a_20100101') is None
+    assert [f['path'].name for f in manifest.files()] == [
+        'a_20100102_v01.txt', 'b.txt']
+
+
+def test_match_unchanged(data_dir, monkeypatch):
+    directory = data_dir / 'probe'
+    directory.mkdir()
+    (directory / 'a.txt').write_text('')
+    assert manifest.match(directory, 'a.txt') == 'a.txt'
+    # Unchanged directories aren't listed again, even just after a change
+    scandir = os.scandir
+    listed = []
+
+    def count_scandir(path):
+        listed.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', count_scandir)
+    assert manifest.match(directory, 'a.txt') == 'a.txt'
+    assert listed == []
+    (directory / 'b.txt').write_text('')
+    assert manifest.match(directory, 'b.txt') == 'b.txt'
+    assert len(listed) == 1
+
+
+def test_connect(data_dir):
+    # Each thread keeps one connection open
+    conn = manifest._connect()
+    assert manifest._connect() is conn
+    other = []
+    thread = threading.Thread(target=lambda: other.append(manifest._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+    # The database is opened again if it has been removed
+    os.remove(data_dir / '.manifest.sqlite')
+    assert manifest._connect() is not conn
+    assert manifest.files() == []
+
+
+def test_literal_prefix():
+    assert manifest._literal_prefix(r'a_2010\d.txt') == 'a_2010'
+    assert manifest._literal_prefix('ab?c') == 'a'
+    assert manifest._literal_prefix('.*') == ''
+
+
+def test_downloader_recorded(data_dir, monkeypatch):
+    monkeypatch.setattr(util, 'use_hdf', True)
+    pytest.importorskip('tables')
+    dl = DummyDownloader(data_dir / 'dummy')
+    dl.load(datetime(2010, 1, 1), datetime(2010, 1, 2, 23))
+    files = manifest.files()
+    assert [f['kind'] for f in files] == ['raw', 'converted'] * 2
+    assert files[0]['start'] == '2010-01-01T00:00:00'
+    assert files[1]['start'] is not None
+
+    sizes = manifest.sizes(data_dir / 'dummy')
+    assert sizes == {
+        'raw': sum(f['size'] for f in files if f['kind'] == 'raw'),
+        'converted': sum(f['size'] for f in files
+                         if f['kind'] == 'converted')}
+
+
+def test_listdata(data_dir, monkeypatch, capsys):
+    monkeypatch.setitem(helper.config, 'download_dir', str(data_dir))
+    (data_dir / 'probe').mkdir()
+    helper.listdata()
+    (data_dir / 'probe' / 'raw.csv').write_bytes(b'0' * 1024)
+    helper.listdata(rescan=True)
+    row = [line for line in capsys.readouterr().out.splitlines()
+           if 'probe' in line][-1]
+    assert row.split('|')[2].strip() == '1.00 KB'
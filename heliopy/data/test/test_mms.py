@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+
 import pytest
 
 from .util import check_data_output
@@ -50,3 +51,53 @@ def test_narrow_interval():
 
     data = mms.fpi_dis_moms(1, 'fast', starttime, endtime)
     check_data_output(data)
+
+
+class FakeSDC:
+    """
+    Fake SDC file name query, with one survey file per day.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def request(self, method, url, params):
+        self.queries.append((params['start_date'], params['end_date']))
+        start = datetime.strptime(params['start_date'], '%Y-%m-%d')
+        end = datetime.strptime(params['end_date'], '%Y-%m-%d')
+        files = []
+        while start <= end:
+            files.append(f'mms1_fgm_srvy_l2_{start:%Y%m%d}_v4.18.0.cdf')
+            start += timedelta(days=1)
+        return FakeResponse(','.join(files))
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, text):
+        self.text = text
+
+    def raise_for_status(self):
+        pass
+
+
+def test_inventory(data_dir, monkeypatch):
+    sdc = FakeSDC()
+    monkeypatch.setattr(mms.util, 'get_session', lambda: sdc)
+
+    files = mms.available_files(1, 'fgm', datetime(2016, 1, 2, 12),
+                                datetime(2016, 1, 5, 12), 'srvy')
+    assert files == [f'mms1_fgm_srvy_l2_2016010{i}_v4.18.0.cdf'
+                     for i in range(2, 6)]
+    assert sdc.queries == [('2016-01-02', '2016-01-06')]
+
+    # Already known days shouldn't be queried again
+    assert mms.available_files(1, 'fgm', datetime(2016, 1, 3),
+                               datetime(2016, 1, 4), 'srvy') == files[1:3]
+    mms.available_files(1, 'fgm', datetime(2016, 1, 4),
+                        datetime(2016, 1, 8), 'srvy')
+    assert sdc.queries == [('2016-01-02', '2016-01-06'),
+                           ('2016-01-06', '2016-01-09')]
+    # The inventory is kept out of the data directories
+    assert (data_dir / '.mms' / 'sdc_inventory.sqlite').exists()
+    assert not (data_dir / 'mms').exists()
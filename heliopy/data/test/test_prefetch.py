@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+
+from heliopy.data import mms, prefetch, util
+from .util import DummyDownloader, FileServer
+
+starttime = datetime(2010, 1, 1)
+endtime = datetime(2010, 1, 3, 12)
+
+
+def test_prefetch(tmp_path):
+    dl = DummyDownloader(tmp_path, no_data=(2,))
+
+    def loader(starttime, endtime):
+        return dl.load(starttime, endtime)
+
+    def failing_loader(starttime, endtime):
+        raise util.NoDataError('No data')
+
+    errors = prefetch.prefetch([loader, failing_loader], starttime, endtime)
+    assert list(errors) == [failing_loader]
+
+    intervals = dl.intervals(starttime, endtime)
+    assert [dl.local_hdf_path(i).exists() for i in intervals] == \
+        [True, False, True]
+
+    # Only missing files should be downloaded again
+    dl.download_threads.clear()
+    prefetch.prefetch([loader], starttime, endtime, convert=False)
+    assert len(dl.download_threads) == 1
+    assert len(loader(starttime, endtime).to_dataframe()) == 23 + 12
+
+
+def test_parse_loader():
+    loader = prefetch._parse_loader('mms.fgm:1:srvy')
+    assert loader.func is mms.fgm
+    assert loader.args == ('1', 'srvy')
+    assert prefetch._loader_name(loader) == 'heliopy.data.mms.fgm(1, srvy)'
+    with pytest.raises(ValueError):
+        prefetch._parse_loader('fgm')
+
+
+def test_host_slot(monkeypatch):
+    monkeypatch.setitem(util.config, 'max_connections_per_host', 1)
+    monkeypatch.setattr(util, '_host_semaphores', {})
+    files = {f'/{i}': bytes(100) for i in range(2)}
+    with FileServer(files) as server:
+        with util._host_slot(server.url):
+            semaphore = util._host_semaphores[server.url[7:]]
+            # Slots can be re-entered from the same thread
+            with util._host_slot(server.url + '/0'):
+                pass
+            assert not semaphore.acquire(blocking=False)
+        assert semaphore.acquire(blocking=False)
+        semaphore.release()
@@ -0,0 +1,122 @@
+from datetime import datetime
+import os
+import threading
+
+import pytest
+
+from heliopy.data import lock, manifest, quota, util
+
+from .util import DummyDownloader
+
+
+def make_files(data_dir, dataset, names, size=2**20):
+    """
+    Create files of *size* bytes, recorded as last used in the order given.
+    """
+    directory = data_dir / dataset
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name in names:
+        path = directory / name
+        path.write_bytes(b'0' * size)
+        manifest.record(path)
+        paths.append(path)
+    for path in paths:
+        manifest.touch([path])
+    return paths
+
+
+@pytest.mark.parametrize('policy, expected', [
+    ('both', ['a.hdf', 'a.txt']),
+    ('raw', ['a.txt', 'b.txt']),
+    ('converted', ['a.hdf', 'b.hdf'])])
+def test_enforce(data_dir, policy, expected):
+    make_files(data_dir, 'probe', ['a.txt', 'a.hdf', 'b.txt', 'b.hdf',
+                                   'c.txt'])
+    removed = quota.enforce(max_size=3, dataset_sizes={}, policy=policy)
+    assert [path.name for path in removed] == expected
+    assert sorted(os.listdir(data_dir / 'probe')) == sorted(
+        {'a.txt', 'a.hdf', 'b.txt', 'b.hdf', 'c.txt'} - set(expected))
+    assert manifest.total_size() == 3 * 2**20
+
+
+def test_enforce_dataset(data_dir):
+    make_files(data_dir, 'probe/inst1', ['a.cdf', 'b.cdf'])
+    make_files(data_dir, 'probe/inst2', ['c.cdf'])
+    make_files(data_dir, 'other', ['d.cdf'])
+    # Without converted copies, whole intervals are removed
+    removed = quota.enforce(max_size=0, dataset_sizes={'probe': 2},
+                            policy='raw', dry_run=True)
+    assert [path.name for path in removed] == ['a.cdf']
+    assert (data_dir / 'probe' / 'inst1' / 'a.cdf').exists()
+
+    removed = quota.enforce(max_size=2, dataset_sizes={'probe/inst2': 0.5})
+    assert [path.name for path in removed] == ['c.cdf', 'a.cdf']
+    assert quota.usage() == {'other': {'raw': 2**20, 'converted': 0},
+                             'probe/inst1': {'raw': 2**20, 'converted': 0}}
+
+
+@pytest.mark.parametrize('policy', quota.policies)
+def test_enforce_dry_run(data_dir, policy):
+    # A dry run lists the same files as are then removed
+    make_files(data_dir, 'probe/inst1', ['a.txt', 'a.hdf', 'b.txt'])
+    make_files(data_dir, 'probe/inst2', ['c.txt', 'c.hdf'])
+    make_files(data_dir, 'other', ['d.txt', 'e.txt'])
+    kwargs = dict(max_size=3, dataset_sizes={'probe': 2}, policy=policy)
+    expected = quota.enforce(dry_run=True, **kwargs)
+    assert len(manifest.files()) == 7
+    assert quota.enforce(**kwargs) == expected
+    assert manifest.total_size() <= 3 * 2**20
+
+
+def test_enforce_after_load(data_dir, monkeypatch):
+    monkeypatch.setitem(util.config, 'disk_quota', 1e-3)
+    dl = DummyDownloader(data_dir / 'dummy')
+    dl.load(datetime(2010, 1, 1), datetime(2010, 1, 2, 23))
+    assert manifest.total_size() <= 1e-3 * 2**20
+    assert len(manifest.files()) == 1
+
+
+def test_main(data_dir, capsys):
+    make_files(data_dir, 'probe', ['a.txt', 'b.txt'])
+    assert quota.main(['usage']) == 0
+    assert capsys.readouterr().out == 'probe: 2.00 MB raw, 0.00  B converted\n'
+    assert quota.main(['clean', '--dataset-size', 'probe:1', '-n']) == 0
+    assert capsys.readouterr().out == f'{data_dir / "probe" / "a.txt"}\n'
+    assert (data_dir / 'probe' / 'a.txt').exists()
+    with pytest.raises(SystemExit):
+        quota.main(['clean', '--dataset-size', '1'])
+
+
+def test_enforce_locked(data_dir):
+    # Files of data that is being downloaded or converted are kept
+    paths = make_files(data_dir, 'probe', ['a.txt', 'b.txt', 'c.txt'])
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold():
+        with lock.locked(paths[0].with_suffix('')):
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    held.wait()
+    try:
+        removed = quota.enforce(max_size=2, dataset_sizes={})
+    finally:
+        release.set()
+        thread.join()
+    assert removed == [paths[1]]
+    assert paths[0].exists()
+
+
+def test_enforce_unrecorded(data_dir):
+    # Files from before the manifest was kept are found on the first run
+    directory = data_dir / 'probe'
+    directory.mkdir()
+    for name in ['a.txt', 'b.txt']:
+        (directory / name).write_bytes(b'0' * 2**20)
+    removed = quota.enforce(max_size=1, dataset_sizes={})
+    assert len(removed) == 1
+    assert len(os.listdir(directory)) == 1
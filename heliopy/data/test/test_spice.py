@@ -1,5 +1,8 @@
 import os
 import pytest
+
+from .util import FileServer
+
 spice = pytest.importorskip("heliopy.data.spice")
 
 
@@ -15,3 +18,52 @@ def test_kernel_download(kernel):
     with pytest.warns(None) as record:
         spice.get_kernel(kernel)
     assert len(record) == 0
+
+
+def test_get_kernels(tmp_path, monkeypatch):
+    files = {f'/kernel{i}.bsp': bytes([i]) * 1000 for i in range(3)}
+    with FileServer(files) as server:
+        kernel_dict = {
+            'test1': spice._Kernel('Test 1', 'test1',
+                                   [server.url + '/kernel0.bsp',
+                                    server.url + '/kernel1.bsp']),
+            'test2': spice._Kernel('Test 2', 'test2',
+                                   server.url + '/kernel2.bsp')}
+        monkeypatch.setattr(spice, 'kernel_dict', kernel_dict)
+        monkeypatch.setattr(spice, 'spice_dir', str(tmp_path))
+
+        locs = spice.get_kernels(['test1', 'test2'])
+        assert locs == [[str(tmp_path / 'kernel0.bsp'),
+                         str(tmp_path / 'kernel1.bsp')],
+                        [str(tmp_path / 'kernel2.bsp')]]
+        for fname, data in files.items():
+            assert (tmp_path / fname[1:]).read_bytes() == data
+        manifest = spice._read_manifest()
+        assert manifest['kernel1.bsp']['size'] == 1000
+        assert len(server.requests) == 3
+
+        # Files that are already downloaded shouldn't be downloaded again,
+        # unless they don't match the manifest
+        with open(tmp_path / 'kernel2.bsp', 'ab') as f:
+            f.write(b'extra')
+        with pytest.warns(UserWarning, match='does not match'):
+            assert spice.get_kernel('test2') == locs[1]
+        assert (tmp_path / 'kernel2.bsp').read_bytes() == files['/kernel2.bsp']
+        spice.get_kernels(['test1', 'test2'], verify=True)
+        assert len(server.requests) == 4
+
+        # Files from before the manifest was kept are checked against the
+        # size of the remote file
+        (tmp_path / 'manifest.json').unlink()
+        with open(tmp_path / 'kernel0.bsp', 'ab') as f:
+            f.write(b'extra')
+        with pytest.warns(UserWarning, match='does not match'):
+            spice.get_kernels(['test1'])
+        assert (tmp_path / 'kernel0.bsp').read_bytes() == files['/kernel0.bsp']
+        assert set(spice._read_manifest()) == {'kernel0.bsp', 'kernel1.bsp'}
+
+        # Failed downloads are left out
+        (tmp_path / 'kernel2.bsp').unlink()
+        del files['/kernel2.bsp']
+        with pytest.warns(UserWarning, match='Failed to download'):
+            assert spice.get_kernel('test2') == []
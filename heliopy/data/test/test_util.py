@@ -1,5 +1,250 @@
 from heliopy.data import util
 from datetime import datetime
+import io
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+from .util import DummyDownloader, FileServer
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    return DummyDownloader(tmp_path)
+
+
+def test_load(downloader):
+    starttime = datetime(2010, 1, 1)
+    endtime = datetime(2010, 1, 4)
+    ts = downloader.load(starttime, endtime)
+    assert ts.to_dataframe().shape == (3 * 24 - 1, 1)
+    assert ts.to_dataframe().index.is_monotonic_increasing
+    # Loading again shouldn't download anything
+    downloader.download_threads.clear()
+    downloader.load(starttime, endtime)
+    assert len(downloader.download_threads) == 0
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+def test_load_concurrent(downloader, max_workers):
+    starttime = datetime(2010, 1, 1)
+    endtime = datetime(2010, 1, 10)
+    serial = DummyDownloader(downloader.local_base_dir / 'serial')
+    expected = serial.load(starttime, endtime, max_workers=1)
+
+    ts = downloader.load(starttime, endtime, max_workers=max_workers)
+    pd.testing.assert_frame_equal(ts.to_dataframe(),
+                                  expected.to_dataframe())
+    if max_workers == 1:
+        assert downloader.download_threads == {threading.get_ident()}
+
+
+def test_load_no_data(tmp_path):
+    dl = DummyDownloader(tmp_path, no_data=(2,))
+    ts = dl.load(datetime(2010, 1, 1), datetime(2010, 1, 4), max_workers=4)
+    assert not (ts.to_dataframe().index.day == 2).any()
+    assert not dl.local_path(dl.intervals(datetime(2010, 1, 2),
+                                          datetime(2010, 1, 2))[0]).exists()
+
+
+def test_session_pool_sizes():
+    session = util._new_session(4, {'example.com': 2})
+    assert session.get_adapter('https://example.com/a')._pool_maxsize == 2
+    assert session.get_adapter('http://example.org/a')._pool_maxsize == 4
+    assert util.get_session() is util.get_session()
+
+
+@pytest.fixture
+def file_server():
+    files = {'/data.cdf': bytes(range(256)) * 1000}
+    with FileServer(files) as server:
+        yield server
+
+
+def test_list_remote_dir(file_server):
+    file_server.files['/dir/'] = (
+        b'<html><body><a href="../">Parent</a>'
+        b'<a href="he1s76001_v2.asc">he1s76001_v2.asc</a>'
+        b'<a href="he1s76002_v1.asc">he1s76002_v1.asc</a></body></html>')
+    url = file_server.url + '/dir/'
+    assert util._get_remote_fname(url, r'he1s76002_v\d.asc') == \
+        'he1s76002_v1.asc'
+    assert util._list_remote_dir(url) == [
+        '../', 'he1s76001_v2.asc', 'he1s76002_v1.asc']
+    # The listing should only be fetched once
+    assert len(file_server.requests) == 1
+
+
+@pytest.fixture
+def fast_retries(monkeypatch):
+    monkeypatch.setitem(util.config, 'max_retries', 2)
+    monkeypatch.setitem(util.config, 'backoff_factor', 0.01)
+
+
+def test_request_retry(file_server, fast_retries):
+    url = file_server.url + '/data.cdf'
+    file_server.errors['/data.cdf'] = [(503, {'Retry-After': '0'}),
+                                       (429, {})]
+    r = util._request(url)
+    assert r.status_code == 200
+    assert len(file_server.requests) == 3
+
+    # Give up after max_retries
+    file_server.errors['/data.cdf'] = [(503, {})] * 3
+    assert util._request(url).status_code == 503
+    assert util._request(url).status_code == 200
+
+
+def test_retry_after():
+    class Response:
+        def __init__(self, headers):
+            self.headers = headers
+
+    assert util._retry_after(Response({})) is None
+    assert util._retry_after(Response({'Retry-After': '10'})) == 10
+    assert util._retry_after(
+        Response({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})) == 0
+
+
+def test_download_url_retry(file_server, fast_retries, tmp_path):
+    dl_path = tmp_path / 'data.cdf'
+    file_server.truncate['/data.cdf'] = [1000, 5000]
+    util._download_url(file_server.url + '/data.cdf', dl_path)
+    assert dl_path.read_bytes() == file_server.files['/data.cdf']
+    # The download should resume from where each attempt got to
+    ranges = [r[2].get('Range') for r in file_server.requests]
+    assert ranges == [None, 'bytes=1000-', 'bytes=6000-']
+
+
+def test_download_url(file_server, tmp_path):
+    dl_path = tmp_path / 'data.cdf'
+    util._download_url(file_server.url + '/data.cdf', dl_path)
+    assert dl_path.read_bytes() == file_server.files['/data.cdf']
+    assert [p.name for p in tmp_path.iterdir()] == ['data.cdf']
+
+    with pytest.raises(util.NoDataError):
+        util._download_url(file_server.url + '/missing.cdf',
+                           tmp_path / 'missing.cdf')
+    assert not (tmp_path / 'missing.cdf').exists()
+
+
+@pytest.mark.parametrize('same_file', [True, False])
+def test_download_url_resume(file_server, tmp_path, same_file):
+    url = file_server.url + '/data.cdf'
+    content = file_server.files['/data.cdf']
+    dl_path = tmp_path / 'data.cdf'
+    # Simulate an interrupted download
+    etag = util.get_session().head(url).headers['ETag']
+    if not same_file:
+        etag = '"old"'
+    (tmp_path / 'data.cdf.part').write_bytes(content[:1000])
+    with open(tmp_path / 'data.cdf.part.json', 'w') as f:
+        json.dump({'url': url, 'validator': etag}, f)
+
+    util._download_url(url, dl_path)
+    assert dl_path.read_bytes() == content
+    assert not (tmp_path / 'data.cdf.part').exists()
+    assert not (tmp_path / 'data.cdf.part.json').exists()
+    assert file_server.requests[-1][2]['Range'] == 'bytes=1000-'
+
+
+def test_write_response(tmp_path):
+    class Raw:
+        def __init__(self, content):
+            self.content = io.BytesIO(content)
+            self.read_sizes = []
+
+        def read(self, n, decode_content):
+            self.read_sizes.append(n)
+            return self.content.read(n)
+
+    class Response:
+        raw = Raw(bytes(range(256)) * 2**12)
+
+    dl_path = tmp_path / 'data.cdf'
+    dl_path.write_bytes(b'partial')
+    util._write_response(Response, dl_path, offset=4,
+                         min_block_size=2**10, max_block_size=2**14)
+    assert dl_path.read_bytes() == b'part' + bytes(range(256)) * 2**12
+    sizes = Response.raw.read_sizes
+    assert sizes[:6] == [2**10, 2**11, 2**12, 2**13, 2**14, 2**14]
+
+
+def test_download_remote_revalidate(file_server, tmp_path):
+    assert util._download_remote(file_server.url, 'data.cdf', tmp_path,
+                                 revalidate=True)
+    assert not util._download_remote(file_server.url, 'data.cdf', tmp_path,
+                                     revalidate=True)
+    assert file_server.requests[-1][2]['If-None-Match']
+    # Change the remote file
+    file_server.files['/data.cdf'] = b'new data'
+    assert util._download_remote(file_server.url, 'data.cdf', tmp_path,
+                                 revalidate=True)
+    assert (tmp_path / 'data.cdf').read_bytes() == b'new data'
+    # Only one request per download
+    assert len(file_server.requests) == 3
+
+
+def test_load_remote_missing(file_server, tmp_path):
+    assert util.load('missing.cdf', tmp_path, file_server.url) is None
+    with pytest.raises(util.RemoteFileNotPresentError):
+        util.load('missing.cdf', tmp_path, file_server.url,
+                  remote_error=True)
+
+
+def test_load_revalidate(tmp_path):
+    class RevalidatingDownloader(DummyDownloader):
+        def revalidate(self, interval):
+            return interval.start.to_datetime().day == 2
+
+    dl = RevalidatingDownloader(tmp_path)
+    dl.load(datetime(2010, 1, 1), datetime(2010, 1, 3))
+    dl.download_threads.clear()
+    dl.load(datetime(2010, 1, 1), datetime(2010, 1, 3))
+    assert len(dl.download_threads) == 1
+
+
+@pytest.mark.parametrize('method', ['gzip', 'zstd'])
+def test_load_compressed(tmp_path, monkeypatch, method):
+    if method == 'zstd':
+        pytest.importorskip('zstandard')
+    starttime = datetime(2010, 1, 1)
+    endtime = datetime(2010, 1, 4)
+    expected = DummyDownloader(tmp_path / 'plain').load(starttime, endtime)
+
+    monkeypatch.setitem(util.config, 'raw_compression', method)
+    dl = DummyDownloader(tmp_path / method)
+    dl.compress_raw = True
+    ts = dl.load(starttime, endtime)
+    pd.testing.assert_frame_equal(ts.to_dataframe(), expected.to_dataframe())
+    suffix = util._COMPRESSION_SUFFIXES[method]
+    assert sorted(f.name for f in (tmp_path / method).iterdir()) == [
+        f'2010010{day}.csv{suffix}' for day in range(1, 5)]
+
+    # Loading again should read the compressed files
+    dl.download_threads.clear()
+    ts = dl.load(starttime, endtime)
+    assert len(dl.download_threads) == 0
+    pd.testing.assert_frame_equal(ts.to_dataframe(), expected.to_dataframe())
+
+
+def test_compress_raw_file(tmp_path):
+    raw_path = tmp_path / 'data.TAB'
+    raw_path.write_text('1 2\n3 4\n')
+    with pytest.raises(ValueError):
+        util._compress_raw_file(raw_path, 'bzip2')
+    assert util._compress_raw_file(raw_path, 'none') == raw_path
+
+    gz_path = util._compress_raw_file(raw_path, 'gzip')
+    assert gz_path == tmp_path / 'data.TAB.gz'
+    assert not raw_path.exists()
+    assert util._local_raw_file(raw_path) == gz_path
+    assert util._uncompressed_path(gz_path) == raw_path
+    with util._load_local(gz_path) as f:
+        assert f.name == str(gz_path)
+        assert f.read() == '1 2\n3 4\n'
 
 
 def test_monthly_intervals():
@@ -16,3 +261,18 @@ def test_yearly_intervals():
     intervals = util.Downloader.intervals_yearly(
         datetime(1992, 11, 1), datetime(1993, 2, 1))
     assert len(intervals) == 2
+
+
+def test_timefilter():
+    index = pd.date_range('2010-01-01', periods=10, freq='h', name='Time')
+    df = pd.DataFrame({'x': range(10)}, index=index)
+    starttime = datetime(2010, 1, 1, 2)
+    endtime = datetime(2010, 1, 1, 5)
+    expected = df.iloc[3:5]
+    # Data with a sorted time index is sliced rather than copied
+    filtered = util.timefilter([df], starttime, endtime)
+    pd.testing.assert_frame_equal(filtered, expected)
+    assert not filtered['x'].to_numpy().flags.owndata
+    # Data with a time column is filtered too
+    filtered = util.timefilter([df.reset_index()], starttime, endtime)
+    pd.testing.assert_frame_equal(filtered, expected, check_freq=False)
@@ -1,7 +1,14 @@
+from datetime import datetime, timedelta
+import http.server
+import socketserver
+import threading
+
 import astropy.units as u
 import pandas as pd
 import sunpy
 
+from heliopy.data import util
+
 
 def check_data_output(df):
     '''
@@ -27,3 +34,146 @@ def check_units(df):
     else:
         for column in df.data.columns:
             assert type(df.quantity(column)) == u.quantity.Quantity
+
+
+class _FileRequestHandler(http.server.BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self.do_GET(send_body=False)
+
+    def do_GET(self, send_body=True):
+        self.server.requests.append((self.command, self.path,
+                                     dict(self.headers)))
+        if self.path not in self.server.files:
+            self.send_error(404)
+            return
+        errors = self.server.errors.get(self.path)
+        if errors:
+            status, headers = errors.pop(0)
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.server.files[self.path]
+        etag = '"{}"'.format(hash(body))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        status = 200
+        range_header = self.headers.get('Range')
+        if (range_header is not None and
+                self.headers.get('If-Range', etag) == etag):
+            start = int(range_header[6:].split('-')[0])
+            status = 206
+        self.send_response(status)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        if status == 206:
+            self.send_header('Content-Range',
+                             f'bytes {start}-{len(body) - 1}/{len(body)}')
+        self.end_headers()
+        if send_body:
+            truncate = self.server.truncate.get(self.path)
+            if truncate:
+                # Send part of the file, then drop the connection
+                self.wfile.write(body[start:start + truncate.pop(0)])
+                self.close_connection = True
+                return
+            self.wfile.write(body[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class FileServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """
+    A local HTTP server, serving the contents of the *files* dict, which
+    maps paths to bytes. Supports ``Range``, ``If-Range`` and
+    ``If-None-Match`` requests.
+
+    Failures can be simulated by adding lists to the *errors* dict, which
+    maps paths to (status, headers) responses to send before the file, or
+    to the *truncate* dict, which maps paths to numbers of bytes after which
+    to drop the connection.
+    """
+    daemon_threads = True
+
+    def __init__(self, files):
+        super().__init__(('127.0.0.1', 0), _FileRequestHandler)
+        self.files = files
+        self.errors = {}
+        self.truncate = {}
+        self.requests = []
+        self.url = 'http://127.0.0.1:{}'.format(self.server_address[1])
+        self._thread = threading.Thread(target=self.serve_forever,
+                                        daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class DummyDownloader(util.Downloader):
+    """
+    Downloader that 'downloads' a small daily csv file to a temporary
+    directory, for testing without a network connection.
+    """
+    def __init__(self, local_base_dir, no_data=()):
+        self.local_base_dir = local_base_dir
+        self.no_data = no_data
+        self.units = {'x': u.dimensionless_unscaled}
+        self.download_threads = set()
+
+    def intervals(self, starttime, endtime):
+        return self.intervals_daily(starttime, endtime)
+
+    def fname(self, interval):
+        return interval.start.strftime('%Y%m%d') + '.csv'
+
+    def local_dir(self, interval):
+        return self.local_base_dir
+
+    def download(self, interval):
+        self.download_threads.add(threading.get_ident())
+        if interval.start.to_datetime().day in self.no_data:
+            raise util.NoDataError
+        start = interval.start.to_datetime()
+        times = pd.date_range(start, periods=24, freq='h')
+        df = pd.DataFrame({'Time': times, 'x': range(24)})
+        df.to_csv(self.local_path(interval), index=False)
+
+    def load_local_file(self, interval):
+        with self.open_local_file(interval) as f:
+            return pd.read_csv(f, parse_dates=['Time'], index_col='Time')
+
+
+def download_csv(remote_base_url, local_base_dir, directory, fname,
+                 remote_fname, extension):
+    """
+    ``download_func`` for `heliopy.data.util.process` that 'downloads' a
+    csv file with a day of hourly data, starting on 2010-01-01.
+    """
+    times = pd.date_range(datetime(2010, 1, 1), periods=24, freq='h')
+    df = pd.DataFrame({'Time': times, 'x': range(24)})
+    df.to_csv(local_base_dir / directory / (fname + extension), index=False)
+
+
+def process_csv(local_base_dir, processing_func, download_func=download_csv,
+                **kwargs):
+    """
+    Load the day of data written by `download_csv` to
+    *local_base_dir*/dir/data.csv using `heliopy.data.util.process`.
+    *kwargs* are passed to `heliopy.data.util.process`.
+    """
+    starttime = datetime(2010, 1, 1)
+    return util.process(['dir'], ['data'], '.csv', local_base_dir, '',
+                        download_func, processing_func,
+                        starttime, starttime + timedelta(days=1),
+                        units={'x': u.dimensionless_unscaled}, **kwargs)
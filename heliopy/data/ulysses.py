@@ -6,7 +6,6 @@ All data is publically available at http://ufa.esac.esa.int/ufa/
 from collections import OrderedDict
 from datetime import datetime, timedelta
 import pathlib
-import urllib.error
 
 import astropy.units as u
 import pandas as pd
@@ -130,6 +129,8 @@ def swics_abundances(starttime, endtime):
 
 
 class _swicsDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, product, names, units):
         self.product = product
         self.names = names
@@ -150,7 +151,7 @@ class _swicsDownloader(util.Downloader):
         local_dir.mkdir(parents=True, exist_ok=True)
         fname = self.fname(interval)
 
-        swics_options = url_options
+        swics_options = url_options.copy()
         swics_options['FILE_NAME'] = fname
         swics_options['FILE_PATH'] = '/ufa/HiRes/data/swics'
         _download_ulysses(swics_options, fname, local_dir)
@@ -160,7 +161,8 @@ class _swicsDownloader(util.Downloader):
         readargs = {'names': self.names,
                     'delim_whitespace': True,
                     'na_values': ['******']}
-        thisdata = pd.read_csv(self.local_path(interval), **readargs)
+        with self.open_local_file(interval) as f:
+            thisdata = pd.read_csv(f, **readargs)
         thisdata = _convert_ulysses_time(thisdata)
         return thisdata
 
@@ -171,6 +173,8 @@ def _swics(starttime, endtime, names, product, units=None):
 
 
 class _fgmDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, units):
         self.units = units
 
@@ -196,7 +200,7 @@ class _fgmDownloader(util.Downloader):
         fname = self.fname(interval)
         yearstr = self.yearstr(interval)
 
-        fgm_options = url_options
+        fgm_options = url_options.copy()
         fgm_options['FILE_NAME'] = fname
         fgm_options['FILE_PATH'] = '/ufa/HiRes/VHM-FGM/' + yearstr
         _download_ulysses(fgm_options, fname, local_dir)
@@ -206,7 +210,8 @@ class _fgmDownloader(util.Downloader):
         readargs = {'names': ['year', 'doy', 'hour', 'minute', 'second',
                               'Bx', 'By', 'Bz', '|B|'],
                     'delim_whitespace': True}
-        thisdata = pd.read_csv(self.local_path(interval), **readargs)
+        with self.open_local_file(interval) as f:
+            thisdata = pd.read_csv(f, **readargs)
         thisdata = _convert_ulysses_time(thisdata)
         return thisdata
 
@@ -234,6 +239,8 @@ def fgm_hires(starttime, endtime):
 
 
 class _swoopsionDownloader(util.Downloader):
+    compress_raw = True
+
     def __init__(self, units):
         self.units = units
 
@@ -258,7 +265,7 @@ class _swoopsionDownloader(util.Downloader):
         local_dir.mkdir(parents=True, exist_ok=True)
         fname = self.fname(interval)
 
-        swoops_options = url_options
+        swoops_options = url_options.copy()
         year = fname[1:3]
         # doy = fname[5:8]
         swoops_options['FILE_NAME'] = fname
@@ -273,7 +280,8 @@ class _swoopsionDownloader(util.Downloader):
                               'T_p_large', 'T_p_small',
                               'v_r', 'v_t', 'v_n', 'iqual'],
                     'delim_whitespace': True}
-        thisdata = pd.read_csv(self.local_path(interval), **readargs)
+        with self.open_local_file(interval) as f:
+            thisdata = pd.read_csv(f, **readargs)
         thisdata = _convert_ulysses_time(thisdata)
         return thisdata
 
@@ -311,11 +319,8 @@ def _download_ulysses(options, fname, local_dir):
     dl_url = ulysses_url
     for key in options:
         dl_url += key + '=' + options[key] + '&'
-    # Download data
-    try:
-        util._download_remote(dl_url, fname, local_dir)
-    except urllib.error.HTTPError:
-        raise util.NoDataError
+    # Download data. Raises NoDataError if the server doesn't send the file.
+    util._download_remote(dl_url, fname, local_dir)
 
 
 def _convert_ulysses_time(data):
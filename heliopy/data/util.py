@@ -4,22 +4,36 @@ Utility functions for data downloading.
 **Note**: these methods are liable to change at any time.
 """
 import abc
+import contextlib
+import concurrent.futures as futures
 import datetime as dt
 import dateutil.relativedelta as reldelt
+import email.utils
 import ftplib
+import gzip
+import inspect
 import io
+import json
 import os
 import logging
 import pathlib as path
+import random
 import requests
+import requests.adapters
+import requests.exceptions
 import re
 import shutil
 import sys
+import threading
+import time
 import urllib.error as urlerror
+import urllib.parse
 import urllib.request as urlreq
+import urllib3.exceptions
 import astropy.units as u
 import sunpy.time
 import sunpy.timeseries as ts
+import tqdm.auto as tqdm
 import warnings
 import collections as coll
 import cdflib
@@ -27,6 +41,10 @@ import cdflib
 import numpy as np
 import pandas as pd
 import heliopy.data.helper as helper
+from heliopy.data import cache
+from heliopy.data import lock
+from heliopy.data import manifest
+from heliopy.data import quota
 
 from heliopy import config
 use_hdf = config['use_hdf']
@@ -53,62 +71,315 @@ class Downloader(abc.ABC):
       that interval.
     - :meth:`Downloader.load_local_file()`: given an interval, load the local
       file and return a :class:`pandas.DataFrame` object containing the data.
+      If it also takes a *columns* keyword argument, it is given the columns
+      requested from :meth:`Downloader.load()` so it can skip reading the
+      others.
 
     Attributes
     ----------
     units : dict
+    compress_raw : bool
+        If ``True``, downloaded files are plain text that can be compressed
+        before being stored, depending on the ``raw_compression`` setting in
+        the heliopyrc file. :meth:`Downloader.load_local_file()` should then
+        read the file using :meth:`Downloader.open_local_file()`. Default is
+        ``False``.
+    cache_version : int
+        Version of the data returned by
+        :meth:`Downloader.load_local_file()`. This should be increased when
+        the data it returns changes, so that any data converted by older
+        versions is converted again. Default is 1.
     """
-    def load(self, starttime, endtime):
+    compress_raw = False
+    cache_version = 1
+
+    def load(self, starttime, endtime, max_workers=None, columns=None):
         """
         Load all data between *starttime* and *endtime*.
+
+        Parameters
+        ----------
+        starttime : datetime.datetime
+            Start of interval.
+        endtime : datetime.datetime
+            End of interval.
+        max_workers : int, optional
+            Maximum number of intervals to download at the same time. Any
+            intervals missing locally are downloaded concurrently before the
+            data is read in. If not given, the ``max_workers`` value from the
+            heliopyrc file is used.
+        columns : list of str, optional
+            Names of the columns to load, as for
+            :func:`heliopy.data.cache.select_columns`. If not given, all
+            columns are loaded.
         """
-        data = []
         intervals = self.intervals(starttime, endtime)
         if not len(intervals):
             raise RuntimeError('No intervals provided')
-        for interval in self.intervals(starttime, endtime):
-            hdf_path = self.local_hdf_path(interval)
+        prefetch = _prefetch_options()
+        if max_workers is None and prefetch is not None:
+            max_workers = prefetch['max_workers']
+        no_data = self._download_missing(intervals, max_workers=max_workers)
+        if prefetch is not None:
+            if _saving_converted():
+                self._convert_intervals(intervals, no_data)
+            quota.enforce()
+            return
+        data = self._load_intervals(intervals, no_data, starttime, endtime,
+                                    columns=columns)
+        quota.enforce()
+        return data
+
+    def _convert_intervals(self, intervals, no_data):
+        """
+        Convert *intervals*, which must have already been downloaded, and
+        save them to the cache if they haven't already been saved.
+
+        Any intervals in *no_data* are skipped.
+        """
+        for interval in intervals:
+            if interval in no_data or self._find_cache(interval) is not None:
+                continue
+            self._convert_interval(interval)
+
+    def _convert_interval(self, interval):
+        """
+        Read in the whole of *interval* from its raw file, and save it to the
+        cache.
+
+        This is done while holding the lock on *interval*. If another process
+        converted it while waiting for the lock, its converted copy is read
+        instead.
+
+        Returns
+        -------
+        df : pandas.DataFrame
+        path : pathlib.Path
+            The file the data was read from.
+        """
+        local_path = self.local_path(interval)
+        with lock.locked(local_path):
+            cache_path = self._find_cache(interval)
+            if cache_path is not None:
+                return cache.backend_for(cache_path).read(cache_path), \
+                    cache_path
+            df = self.load_local_file(interval)
+            raw_path = _local_raw_file(local_path)
+            _save_cache(df, raw_path, self.local_cache_path(interval),
+                        key=self._cache_key())
+        return df, raw_path
+
+    def _load_intervals(self, intervals, no_data, starttime, endtime,
+                        columns=None):
+        """
+        Read in *intervals*, which must have already been downloaded, and
+        return *columns* of the data between *starttime* and *endtime*.
+
+        Any intervals in *no_data* are skipped.
+        """
+        data = []
+        # Files that have been read, to record in the manifest
+        read_paths = []
+        # Data kept in memory must contain the whole interval
+        read_all = cache.memory_cache.enabled
+        save = _saving_converted()
+        for interval in intervals:
             local_path = self.local_path(interval)
 
-            # Try to load HDF file
-            if hdf_path.exists():
-                data.append(pd.read_hdf(hdf_path))
-                # Store the local path if loading data was successful
+            # Try to use data kept in memory
+            memory_key = self._memory_cache_key(interval)
+            df = cache.memory_cache.get(memory_key)
+            if df is not None:
+                data.append(cache.select_columns(df, columns))
                 local_path_successful = local_path
                 continue
 
-            # Try to load original file
-            if not local_path.exists():
-                # Try to download file
-                try:
-                    local_path.parent.mkdir(parents=True, exist_ok=True)
-                    dl_path = self.download(interval)
-                    if dl_path is not None and dl_path != local_path:
-                        shutil.copy(dl_path, local_path)
-                        os.remove(dl_path)
-                except NoDataError:
-                    continue
-
-            data.append(self.load_local_file(interval))
+            # Try to load converted file
+            cache_path = self._find_cache(interval)
+            if cache_path is not None:
+                backend = cache.backend_for(cache_path)
+                if read_all:
+                    df = backend.read(cache_path)
+                else:
+                    df = backend.read(cache_path, columns=columns,
+                                      starttime=starttime, endtime=endtime)
+                read_paths.append(cache_path)
+            # Skip intervals that failed to download
+            elif interval in no_data:
+                continue
+            elif save:
+                # The whole file is needed to save it to the cache
+                df, read_path = self._convert_interval(interval)
+                read_paths.append(read_path)
+            elif read_all:
+                df = self.load_local_file(interval)
+                read_paths.append(_local_raw_file(local_path))
+            else:
+                df = _call_with_columns(self.load_local_file, columns,
+                                        interval)
+                read_paths.append(_local_raw_file(local_path))
+            cache.memory_cache.put(memory_key, df)
+            data.append(cache.select_columns(df, columns))
+            # Store the local path if loading data was successful
             local_path_successful = local_path
-            if use_hdf:
-                data[-1].to_hdf(hdf_path, 'data', mode='w', format='f')
 
-        # Loaded all the data, now filter between times
-        data = timefilter(data, starttime, endtime)
-        data = data.sort_index()
+        manifest.touch(read_paths)
+
+        # Loaded all the data, now filter between times. Data kept in memory
+        # is copied, so editing the output doesn't change the kept copy.
+        data = timefilter(data, starttime, endtime,
+                          copy=cache.memory_cache.enabled)
+        # Sorting copies the data, so is skipped if it's already sorted
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index()
+        _check_columns(data, columns)
 
         # Attach units
         if local_path.suffix == '.cdf':
-            cdf = _load_local(local_path_successful)
             if not hasattr(self, 'units'):
                 self.units = None
-            self.units = cdf_units(cdf, manual_units=self.units)
+            self.units = _saved_cdf_units(local_path_successful,
+                                          manual_units=self.units,
+                                          tag=self._cache_tag())
         if not hasattr(self, 'warn_missing_units'):
             self.warn_missing_units = True
         return units_attach(
             data, self.units, warn_missing_units=self.warn_missing_units)
 
+    def _download_missing(self, intervals, max_workers=None):
+        """
+        Download all of *intervals* that are not available locally.
+
+        If *max_workers* is greater than one, the downloads are run in a pool
+        of threads.
+
+        Returns
+        -------
+        no_data : list of sunpy.time.TimeRange
+            Intervals for which no data is available.
+        """
+        if max_workers is None:
+            max_workers = config['max_workers']
+        missing = self._missing_intervals(intervals)
+        if max_workers > 1 and len(missing) > 1:
+            with futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
+                available = list(ex.map(self._download_interval, missing))
+        else:
+            available = [self._download_interval(interval)
+                         for interval in missing]
+        return [interval for interval, ok in zip(missing, available)
+                if not ok]
+
+    def _missing_intervals(self, intervals):
+        """
+        The intervals out of *intervals* that are not available locally, or
+        that need revalidating against the remote copy.
+        """
+        return [interval for interval in intervals if
+                self.revalidate(interval) or not
+                (self._find_cache(interval) is not None or
+                 self.local_file_exists(interval))]
+
+    def _download_interval(self, interval):
+        """
+        Download a single interval, and move it to its local path.
+
+        This is done while holding the lock on *interval*, so it is only
+        downloaded once by all the processes sharing the data directory.
+
+        Returns ``False`` if there is no data available for *interval*.
+        """
+        with lock.locked(self.local_path(interval)):
+            if not self.revalidate(interval) and \
+                    self.local_file_exists(interval):
+                # Downloaded by another process while waiting for the lock
+                return True
+            return self._fetch_interval(interval)
+
+    def _fetch_interval(self, interval):
+        """
+        Download a single interval, which must be locked.
+        """
+        local_path = self.local_path(interval)
+        raw_path = _local_raw_file(local_path)
+        if raw_path is not None:
+            # Revalidating an existing file
+            mtime = raw_path.stat().st_mtime_ns
+            try:
+                self.download(interval)
+            except (NoDataError, requests.exceptions.ConnectionError) as e:
+                logger.info(f'Could not revalidate {raw_path}: {e}')
+                return True
+            # If the stored file is compressed, a new copy is downloaded
+            # next to it
+            changed = ((raw_path != local_path and local_path.exists()) or
+                       raw_path.stat().st_mtime_ns != mtime)
+            if changed and self.compress_raw:
+                _compress_raw_file(local_path)
+            if changed:
+                for cache_path in cache.remove(local_path):
+                    manifest.record(cache_path)
+                cache.memory_cache.discard(self._memory_cache_key(interval))
+                manifest.record(_local_raw_file(local_path),
+                                interval.start.datetime, interval.end.datetime)
+            return True
+
+        try:
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            dl_path = self.download(interval)
+        except NoDataError:
+            return False
+        if dl_path is not None and path.Path(dl_path) != local_path:
+            lock.move(dl_path, local_path)
+        if self.compress_raw:
+            _compress_raw_file(local_path)
+        raw_path = _local_raw_file(local_path)
+        if raw_path is not None:
+            manifest.record(raw_path, interval.start.datetime,
+                            interval.end.datetime)
+        return True
+
+    def _memory_cache_key(self, interval):
+        """
+        Key to keep the data for *interval* in memory under.
+        """
+        cls = type(self)
+        return (cls.__module__, cls.__qualname__,
+                str(self.local_path(interval)), self._cache_tag())
+
+    def cache_params(self):
+        """
+        Parameters of this downloader that change the data returned by
+        :meth:`Downloader.load_local_file()`, other than the interval.
+
+        Data converted with different parameters is saved in different
+        files. By default there are no parameters.
+
+        Returns
+        -------
+        dict
+        """
+        return {}
+
+    def _cache_tag(self):
+        return cache.tag(self.cache_params())
+
+    def _cache_key(self):
+        return _cache_key(self.cache_version, self.cache_params())
+
+    def _find_cache(self, interval):
+        """
+        Find the converted copy of *interval*, removing it if it is out of
+        date.
+        """
+        local_path = self.local_path(interval)
+        cache_path = cache.find(local_path, tag=self._cache_tag())
+        if cache_path is None or _cache_valid(
+                cache_path, _local_raw_file(local_path), self._cache_key()):
+            return cache_path
+        _remove_cache(cache_path)
+        cache.memory_cache.discard(self._memory_cache_key(interval))
+
     def local_path(self, interval):
         """
         Absolute path to a single local file.
@@ -121,13 +392,57 @@ class Downloader(abc.ABC):
         Absolute path to a single .hdf file.
         """
         local_path = self.local_path(interval)
-        return local_path.with_suffix('.hdf')
+        return cache.HDFBackend().path(local_path, tag=self._cache_tag())
+
+    def local_cache_path(self, interval):
+        """
+        Absolute path to a single file of converted data, in the format set
+        by ``cache_format`` in the heliopyrc file.
+        """
+        return cache.get_backend().path(self.local_path(interval),
+                                        tag=self._cache_tag())
 
     def local_file_exists(self, interval):
         """
-        Return ``True`` if the local file exists.
+        Return ``True`` if the local file exists, either as it was downloaded,
+        compressed, or as a converted copy.
+        """
+        local_path = self.local_path(interval)
+        return (_local_raw_file(local_path) is not None or
+                cache.find(local_path, tag=self._cache_tag()) is not None)
+
+    def open_local_file(self, interval):
+        """
+        Open the local file for reading as text, decompressing it if it has
+        been stored compressed.
+        """
+        raw_path = _local_raw_file(self.local_path(interval))
+        if raw_path is None:
+            raw_path = self.local_path(interval)
+        return _open_raw(raw_path)
+
+    def revalidate(self, interval):
+        """
+        Return ``True`` if the local copy of *interval* might be out of date.
+
+        Sub-classes can override this for intervals where the remote data is
+        still changing (e.g. a yearly file for the current year). These
+        intervals are re-downloaded each time they are loaded, so
+        :meth:`download` should only fetch the file if it has changed, e.g.
+        by passing ``revalidate=True`` to ``_download_remote``. If the file
+        changes, any converted copy is deleted.
+
+        By default returns ``False``.
+
+        Parameters
+        ----------
+        interval : sunpy.time.TimeRange
+
+        Returns
+        -------
+        bool
         """
-        return self.local_path(interval).exists()
+        return False
 
     @abc.abstractmethod
     def intervals(self, starttime, endtime):
@@ -253,7 +568,8 @@ def process(dirs, fnames, extension, local_base_dir, remote_base_url,
             download_func, processing_func, starttime, endtime,
             try_download=True, units=None,
             processing_kwargs={}, download_info=[], remote_fnames=None,
-            warn_missing_units=True):
+            warn_missing_units=True, compress_raw=False, columns=None,
+            cache_version=1):
     """
     The main utility method for systematically loading, downloading, and saving
     data.
@@ -332,6 +648,22 @@ def process(dirs, fnames, extension, local_base_dir, remote_base_url,
     warn_missing_units : bool, optional
         If ``True``, warnings will be shown for each variable that does not
         have associated units.
+    compress_raw : bool, optional
+        If ``True``, the raw files are plain text that is compressed after
+        downloading, depending on the ``raw_compression`` setting in the
+        heliopyrc file. *processing_func* is then given a file that
+        decompresses the data as it is read.
+    columns : list of str, optional
+        Names of the columns to load, as for
+        :func:`heliopy.data.cache.select_columns`. If *processing_func* takes
+        a *columns* keyword argument, they are also passed to it when the
+        processed data isn't being saved. If not given, all columns are
+        loaded.
+    cache_version : int, optional
+        Version of the data returned by *processing_func*. This should be
+        increased when the data it returns changes, so that any data
+        converted by older versions is converted again. Data converted with
+        different *processing_kwargs* is saved in different files.
 
     Returns
     -------
@@ -352,76 +684,195 @@ def process(dirs, fnames, extension, local_base_dir, remote_base_url,
         raise ValueError(
             'Must have the same number of remote filenames as filenames')
 
+    prefetch = _prefetch_options()
+    # Data kept in memory must contain the whole file
+    read_all = cache.memory_cache.enabled
+    read_columns = None if read_all else columns
+    cache_tag = cache.tag(processing_kwargs)
+    cache_key = _cache_key(cache_version, processing_kwargs)
+
+    # Files that have been read, to record in the manifest
+    read_paths = []
+
+    def add_data(df, raw_file_path):
+        cache.memory_cache.put(memory_key, (df, raw_file_path))
+        data.append(cache.select_columns(df, columns))
+        read_paths.append(raw_file_path)
+
     zips = zip(dirs, fnames, remote_fnames, download_info)
     for directory, fname, remote_fname, dl_info in zips:
         local_dir = local_base_dir / directory
         local_file = local_dir / fname
 
-        # Try to load hdf file
-        hdf_fname = _file_match(local_dir, fname + '.hdf')
-        if hdf_fname is not None:
-            hdf_file_path = local_dir / hdf_fname
-            raw_file_path = hdf_file_path.with_suffix(extension)
-            logger.info('Loading {}'.format(hdf_file_path))
-            data.append(pd.read_hdf(hdf_file_path))
+        # Try to use data kept in memory
+        memory_key = (processing_func.__module__,
+                      processing_func.__qualname__, str(local_file),
+                      extension, repr(sorted(processing_kwargs.items())))
+        stored = cache.memory_cache.get(memory_key)
+        if stored is not None and prefetch is None:
+            df, raw_file_path = stored
+            data.append(cache.select_columns(df, columns))
             continue
 
-        # Try to load raw file
-        raw_fname = _file_match(local_dir, fname + extension)
-        if raw_fname is not None:
-            raw_file_path = local_dir / raw_fname
-            logger.info('Loading {}'.format(raw_file_path))
-            df = _load_raw_file(raw_file_path,
-                                processing_func, processing_kwargs)
-            if df is not None:
-                data.append(df)
+        with contextlib.ExitStack() as file_lock:
+            # Try to load converted file
+            cache_file_path = _find_valid_cache(local_dir, fname, extension,
+                                                cache_tag, cache_key)
+            if cache_file_path is None and (
+                    _saving_converted() or
+                    _file_match(local_dir, fname + extension) is None):
+                # Hold the lock on the file while downloading or converting
+                # it, then look again in case another process has converted
+                # it in the meantime
+                file_lock.enter_context(lock.locked(local_file))
+                cache_file_path = _find_valid_cache(
+                    local_dir, fname, extension, cache_tag, cache_key)
+            if cache_file_path is not None and prefetch is not None:
                 continue
-
-        # If we can't find local file, try downloading
-        if try_download:
-            _checkdir(local_dir)
-            args = ()
-            if dl_info is not None:
-                args = (dl_info,)
-            try:
-                new_path = download_func(remote_base_url, local_base_dir,
-                                         directory, fname, remote_fname,
-                                         extension, *args)
-            except NoDataError as e:
-                print(str(e))
+            if cache_file_path is not None:
+                raw_file_path = cache_file_path.with_name(
+                    cache.raw_stem(cache_file_path) + extension)
+                logger.info('Loading {}'.format(cache_file_path))
+                backend = cache.backend_for(cache_file_path)
+                if read_all:
+                    df = backend.read(cache_file_path)
+                else:
+                    df = backend.read(cache_file_path, columns=columns,
+                                      starttime=starttime, endtime=endtime)
+                add_data(df, raw_file_path)
+                read_paths.append(cache_file_path)
                 continue
-            if new_path is not None:
-                shutil.copy(new_path, local_file.with_suffix(extension))
 
+            # Try to load raw file
             raw_fname = _file_match(local_dir, fname + extension)
-            # Print a message if file hasn't been downloaded
+            if raw_fname is not None and prefetch is not None and \
+                    not _saving_converted():
+                continue
             if raw_fname is not None:
                 raw_file_path = local_dir / raw_fname
+                logger.info('Loading {}'.format(raw_file_path))
                 df = _load_raw_file(raw_file_path,
-                                    processing_func, processing_kwargs)
+                                    processing_func, processing_kwargs,
+                                    columns=read_columns, cache_key=cache_key,
+                                    cache_tag=cache_tag)
                 if df is not None:
-                    data.append(df)
-                continue
-            else:
-                logger.info('File {}{}/{}{} not available remotely\n'.format(
+                    if prefetch is None:
+                        add_data(df, raw_file_path)
+                    continue
+
+            # If we can't find local file, try downloading
+            if try_download:
+                _checkdir(local_dir)
+                args = ()
+                if dl_info is not None:
+                    args = (dl_info,)
+                try:
+                    new_path = download_func(remote_base_url, local_base_dir,
+                                             directory, fname, remote_fname,
+                                             extension, *args)
+                except NoDataError as e:
+                    print(str(e))
+                    continue
+                if new_path is not None:
+                    lock.move(new_path, local_file.with_suffix(extension))
+                    manifest.record(local_file.with_suffix(extension))
+
+                raw_fname = _file_match(local_dir, fname + extension)
+                if raw_fname is not None and compress_raw:
+                    raw_fname = _compress_raw_file(local_dir / raw_fname).name
+                if raw_fname is not None and prefetch is not None and \
+                        not _saving_converted():
+                    continue
+                # Print a message if file hasn't been downloaded
+                if raw_fname is not None:
+                    raw_file_path = local_dir / raw_fname
+                    df = _load_raw_file(raw_file_path,
+                                        processing_func, processing_kwargs,
+                                        columns=read_columns,
+                                        cache_key=cache_key,
+                                        cache_tag=cache_tag)
+                    if df is not None and prefetch is None:
+                        add_data(df, raw_file_path)
+                    continue
+                else:
+                    logger.info(
+                        'File {}{}/{}{} not available remotely\n'.format(
                             remote_base_url, directory, fname, extension))
-                continue
-        else:
-            msg = ('File {a}/{b}{c} not available locally,\n'
-                   'and "try_download" set to False')
-            logger.info(msg.format(a=local_dir, b=fname, c=extension))
+                    continue
+            else:
+                msg = ('File {a}/{b}{c} not available locally,\n'
+                       'and "try_download" set to False')
+                logger.info(msg.format(a=local_dir, b=fname, c=extension))
+
+    if prefetch is None:
+        manifest.touch(read_paths)
+    quota.enforce()
+    if prefetch is not None:
+        return
 
-    # Loaded all the data, now filter between times
-    data = timefilter(data, starttime, endtime)
-    data = data.sort_index()
+    # Loaded all the data, now filter between times. Data kept in memory is
+    # copied, so editing the output doesn't change the kept copy.
+    data = timefilter(data, starttime, endtime,
+                      copy=cache.memory_cache.enabled)
+    # Sorting copies the data, so is skipped if it's already sorted
+    if not data.index.is_monotonic_increasing:
+        data = data.sort_index()
+    _check_columns(data, columns)
 
     # Attach units
     if extension == '.cdf':
-        cdf = _load_local(raw_file_path)
-        units = cdf_units(cdf, manual_units=units)
+        units = _saved_cdf_units(raw_file_path, manual_units=units,
+                                 tag=cache_tag)
     return units_attach(data, units, warn_missing_units=warn_missing_units)
 
 
+def _call_with_columns(func, columns, *args, **kwargs):
+    """
+    Call *func*, also passing it *columns* if it takes a ``columns`` keyword
+    argument and *columns* is not ``None``.
+    """
+    if columns is not None and \
+            'columns' in inspect.signature(func).parameters:
+        kwargs['columns'] = columns
+    return func(*args, **kwargs)
+
+
+def _check_columns(data, columns):
+    """
+    Raise an error if any of *columns* are missing from the loaded *data*.
+    """
+    if columns is None:
+        return
+    missing = [column for column in columns if
+               cache.select_columns(data, [column]).shape[1] == 0]
+    if missing:
+        raise ValueError(f'Columns {missing} are not in the data')
+
+
+_prefetch = threading.local()
+
+
+@contextlib.contextmanager
+def _prefetch_mode(convert=True, max_workers=None):
+    """
+    Context manager to only download data.
+
+    Inside the context :meth:`Downloader.load` and :func:`process` download
+    any data that is missing locally, and if *convert* is ``True`` save it to
+    the cache of converted files, but don't read it in and return ``None``.
+    This only applies to the current thread.
+    """
+    _prefetch.options = {'convert': convert, 'max_workers': max_workers}
+    try:
+        yield
+    finally:
+        _prefetch.options = None
+
+
+def _prefetch_options():
+    return getattr(_prefetch, 'options', None)
+
+
 def _file_match(directory, fname_regex):
     """
     Check if a file in *directory* matchs the regular expression given by
@@ -438,33 +889,228 @@ def _file_match(directory, fname_regex):
     fname : str
         Includes file extension.
     """
-    if directory.exists():
-        for f in directory.iterdir():
-            if f.is_file():
-                if re.match(fname_regex, f.name):
-                    return f.name
+    return manifest.match(directory, fname_regex)
+
+
+def _find_valid_cache(directory, fname_regex, extension, tag, key):
+    """
+    Find the converted copy of the file matching *fname_regex* + *extension*
+    in *directory*, as for :func:`_find_cached_file`, removing it if it is out
+    of date.
+
+    Returns
+    -------
+    pathlib.Path or None
+    """
+    cache_path = _find_cached_file(directory, fname_regex, tag=tag)
+    if cache_path is None:
+        return
+    raw_fname = _file_match(directory, fname_regex + extension)
+    raw_path = None
+    if raw_fname is not None:
+        raw_path = directory / raw_fname
+    if _cache_valid(cache_path, raw_path, key):
+        return cache_path
+    _remove_cache(cache_path)
+
+
+def _find_cached_file(directory, fname_regex, tag=None):
+    """
+    Find the converted copy of the file matching *fname_regex* (without a
+    file extension) in *directory*, in any format, converted with the
+    parameters identified by *tag*.
+
+    Returns
+    -------
+    pathlib.Path or None
+    """
+    if tag is not None:
+        fname_regex += re.escape(f'-{tag}')
+    for suffix in cache.suffixes():
+        fname = _file_match(directory, fname_regex + re.escape(suffix))
+        if fname is not None:
+            return directory / fname
+
+
+def _saving_converted():
+    """
+    Return ``True`` if converted copies of downloaded data should be saved.
+    """
+    if config['cache_tier'] == 'raw':
+        return False
+    prefetch = _prefetch_options()
+    if prefetch is not None:
+        return prefetch['convert']
+    return use_hdf or config['cache_tier'] == 'converted'
+
+
+def _save_cache(df, raw_file, cache_path=None, key=None):
+    """
+    Save *df*, converted from *raw_file*, to the cache.
+
+    The units of data from CDF files are saved along with it, as well as
+    *key* and the name and size of *raw_file*, which are checked by
+    :func:`_cache_valid` when the data is read. If only the converted copies
+    are being kept, *raw_file* is then removed.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+    raw_file : pathlib.Path
+    cache_path : pathlib.Path, optional
+        Where to save the data. Defaults to next to *raw_file*, in the format
+        set by ``cache_format``.
+    key : dict, optional
+        Returned by :func:`_cache_key`. Defaults to the first version, with
+        no parameters.
+    """
+    if cache_path is None:
+        cache_path = cache.get_backend().path(_uncompressed_path(raw_file))
+    if key is None:
+        key = _cache_key(1, {})
+    metadata = {'key': key, 'raw': _raw_identity(raw_file)}
+    if raw_file.suffix == '.cdf':
+        metadata['units'] = cache.encode_units(
+            cdf_units(_load_local(raw_file)))
+    cache_path = _write_cache(df, cache_path, metadata=metadata)
+    if config['cache_tier'] != 'converted':
+        return
+    # Check the data can be read back before removing the original
+    saved = cache.backend_for(cache_path).read(cache_path)
+    if saved.shape != df.shape or not saved.index.equals(df.index):
+        logger.warning(f'Keeping {raw_file}, as the data saved in '
+                       f'{cache_path} does not match it')
+        return
+    os.remove(raw_file)
+    manifest.record(raw_file)
+
+
+def _saved_cdf_units(raw_file, manual_units=None, tag=None):
+    """
+    Get the units of the data in the CDF file *raw_file*, from its converted
+    copy if they were saved there, or otherwise from the file itself.
+
+    Any *manual_units* replace the units in the file.
+    """
+    cache_path = cache.find(raw_file, tag=tag)
+    units = None
+    if cache_path is not None:
+        units = cache.read_units(cache_path)
+    if units is None:
+        return cdf_units(_load_local(raw_file), manual_units=manual_units)
+    if manual_units:
+        units.update(manual_units)
+    return units
+
+
+def _write_cache(df, cache_path, metadata=None):
+    """
+    Save *df* to *cache_path*, and record it in the manifest.
+
+    The data is written to a temporary file first, so *cache_path* is never
+    seen partly written. If the format of *cache_path* can't store *df*, it
+    is saved in the ``hdf`` format instead.
+
+    Returns
+    -------
+    pathlib.Path
+        Where the data was saved.
+    """
+    backend = cache.backend_for(cache_path)
+    try:
+        with lock.temporary_path(cache_path) as temp_path:
+            backend.write(df, temp_path, metadata=metadata)
+    except cache.UnsupportedDataError as e:
+        logger.info(f'Saving {cache_path} in the hdf format, as {e}')
+        cache_path = cache.HDFBackend().path(cache_path)
+        with lock.temporary_path(cache_path) as temp_path:
+            cache.HDFBackend().write(df, temp_path, metadata=metadata)
+    starttime = endtime = None
+    if isinstance(df.index, pd.DatetimeIndex) and len(df):
+        starttime = df.index.min().to_pydatetime()
+        endtime = df.index.max().to_pydatetime()
+    manifest.record(cache_path, starttime, endtime)
+    return cache_path
+
+
+def _cache_key(version, params):
+    """
+    Key identifying how converted data was made, from the *version* of the
+    code that converted it and the loader *params*.
+    """
+    return {'version': version,
+            'params': json.dumps(params, sort_keys=True, default=repr)}
+
+
+def _raw_identity(raw_file):
+    if raw_file is None or not raw_file.exists():
+        return None
+    return [raw_file.name, raw_file.stat().st_size]
+
+
+# Converted files that have already been checked by _cache_valid
+_valid_caches = set()
+
+
+def _cache_valid(cache_path, raw_file, key):
+    """
+    Return ``True`` if the converted data in *cache_path* was made with
+    *key*, and from *raw_file* if it exists.
 
+    Data converted before keys were saved is assumed to be the first
+    version.
+    """
+    raw = _raw_identity(raw_file)
+    checked = (str(cache_path), cache_path.stat().st_mtime_ns,
+               json.dumps(key, sort_keys=True), json.dumps(raw))
+    if checked in _valid_caches:
+        return True
+    metadata = cache.backend_for(cache_path).read_metadata(cache_path)
+    if 'key' in metadata:
+        valid = metadata['key'] == key and \
+            (raw is None or metadata['raw'] in (None, raw))
+    else:
+        valid = key['version'] == 1
+    if valid:
+        _valid_caches.add(checked)
+    return valid
 
-def _save_hdf(df, raw_file):
-    hdf_file = raw_file.with_suffix('.hdf')
-    df.to_hdf(hdf_file, 'data', mode='w', format='f')
 
+def _remove_cache(cache_path):
+    """
+    Remove the out of date converted data in *cache_path*.
+    """
+    logger.info(f'Removing out of date {cache_path}')
+    # Another process might have removed it already
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(cache_path)
+    manifest.record(cache_path)
 
-def _load_raw_file(raw_file, processing_func, processing_kwargs):
+
+def _load_raw_file(raw_file, processing_func, processing_kwargs,
+                   columns=None, cache_key=None, cache_tag=None):
     if not raw_file.exists():
         return
     # Convert raw file to a dataframe
     logger.info('Loading {}'.format(raw_file))
+    save = _saving_converted()
     try:
         file = _load_local(raw_file)
-        df = processing_func(file, **processing_kwargs)
-        if use_hdf:
-            _save_hdf(df, raw_file)
+        if save:
+            # The whole file is needed to save it to the cache
+            df = processing_func(file, **processing_kwargs)
+        else:
+            df = _call_with_columns(processing_func, columns, file,
+                                    **processing_kwargs)
         if isinstance(file, io.IOBase) and not file.closed:
             file.close()
-        return df
     except NoDataError:
         return
+    if save:
+        cache_path = cache.get_backend().path(_uncompressed_path(raw_file),
+                                              tag=cache_tag)
+        _save_cache(df, raw_file, cache_path, key=cache_key)
+    return df
 
 
 class NoDataError(RuntimeError):
@@ -591,7 +1237,7 @@ def cdf_units(cdf_, manual_units=None, length=None):
     return units
 
 
-def timefilter(data, starttime, endtime):
+def timefilter(data, starttime, endtime, copy=False):
     """
     Puts data in a single dataframe, and filters it between times.
 
@@ -604,17 +1250,31 @@ def timefilter(data, starttime, endtime):
         Start of interval.
     endtime : datetime
         End of interval.
+    copy : bool, optional
+        If ``True``, always return a copy of the data, e.g. because *data*
+        is also kept elsewhere and mustn't be changed by editing the output.
 
     Returns
     -------
     out : :class:`pandas.DataFrame`
-        Filtered data.
+        Filtered data. If *data* is a single DataFrame (or a list of one)
+        with a sorted time index, this is a slice of it rather than a copy,
+        unless *copy* is ``True``.
     """
     if len(data) == 0:
         raise RuntimeError(
             'No data available between {} and {}'.format(starttime, endtime))
     if isinstance(data, list):
-        data = pd.concat(data)
+        data = data[0] if len(data) == 1 else pd.concat(data)
+    if ('Time' not in data.columns and
+            isinstance(data.index, pd.DatetimeIndex) and
+            data.index.name == 'Time' and
+            data.index.is_monotonic_increasing):
+        # Slicing doesn't copy the data, e.g. if it is memory-mapped. The
+        # shallow copy stops pandas treating the result as a view of data.
+        start = data.index.searchsorted(starttime, side='right')
+        end = data.index.searchsorted(endtime, side='left')
+        return data.iloc[start:max(start, end)].copy(deep=copy)
     # Get time values
     if 'Time' in data.columns:
         time = data['Time']
@@ -714,7 +1374,8 @@ def pitchdist_cdf2df(cdf, distkeys, energykey, timekey, anglelabels):
     return data
 
 
-def cdf2df(cdf, index_key, dtimeindex=True, badvalues=None, ignore=None):
+def cdf2df(cdf, index_key, dtimeindex=True, badvalues=None, ignore=None,
+           columns=None):
     """
     Converts a cdf file to a pandas dataframe.
 
@@ -737,6 +1398,11 @@ def cdf2df(cdf, index_key, dtimeindex=True, badvalues=None, ignore=None):
     ignore : list, optional
         In case a CDF file has columns that are unused / not required, then
         the column names can be passed as a list into the function.
+    columns : list, optional
+        Names of the columns to read, as for
+        :func:`heliopy.data.cache.select_columns`. Variables that aren't
+        needed for these columns aren't read from the CDF file. If not given,
+        all variables are read.
 
     Returns
     -------
@@ -786,6 +1452,14 @@ def cdf2df(cdf, index_key, dtimeindex=True, badvalues=None, ignore=None):
                 keys[cdf_key] = cdf_key
     # Remove index key, as we have already used it to create the index
     keys.pop(index_key)
+    # Remove keys for columns that haven't been asked for, so they're
+    # never read
+    if columns is not None:
+        for cdf_key in keys.copy():
+            if not (keys[cdf_key] in columns or
+                    any(cache._selected(column, [keys[cdf_key]])
+                        for column in columns)):
+                keys.pop(cdf_key)
     # Remove keys for data that doesn't have the right shape to load in CDF
     for cdf_key in keys.copy():
         if type(cdf.varget(cdf_key)) is np.ndarray:
@@ -812,6 +1486,9 @@ def cdf2df(cdf, index_key, dtimeindex=True, badvalues=None, ignore=None):
                 for i in range(key_shape[1]):
                     df[df_key + '_' + str(i)] = cdf.varget(cdf_key)[...][:, i]
 
+    # Only keep the requested components of vector variables
+    df = cache.select_columns(df, columns)
+
     # Replace bad values with nans
     if badvalues is not None:
         df = df.replace(badvalues, np.nan)
@@ -867,16 +1544,19 @@ def load(filename, local_dir, remote_url,
     # Try to load locally
     if _checkdir(local_dir):
         local_dir = path.Path(local_dir)
-        for f in local_dir.iterdir():
-            if str(f) == filename or ((str(f)[:-6] == filename[:-6])):
-                return _load_local(local_dir / f, filetype)
+        # Also match other versions of the file, where the last six
+        # characters of the name differ
+        fname = manifest.match(local_dir,
+                               re.escape(filename[:-6]) + r'.{6}\Z')
+        if fname is not None:
+            return _load_local(local_dir / fname, filetype)
 
     if try_download:
         try:
             return _load_remote(remote_url, filename, local_dir, filetype)
-        except urlerror.URLError:
+        except (NoDataError, urlerror.URLError):
             if remote_error:
-                raise RemoteFileNotFoundError(
+                raise RemoteFileNotPresentError(
                     'File {}/{} not available'.format(remote_url, filename))
             else:
                 return None
@@ -900,23 +1580,71 @@ def _get_remote_fname(remote_url, fname_regex):
     fname : str
         Filename that matches including extension.
     '''
-    remote_url = _fix_url(remote_url)
-    # Split remote url into a server name and directory
-    # Strip ftp:// from front of url
-    remote_ftp = remote_url[6:]
-    for i, c in enumerate(remote_ftp):
-        if c == '/':
-            server = remote_ftp[:i]
-            server_dir = remote_ftp[i:]
-            break
-    # Login to remote server
-    with ftplib.FTP(server) as ftp:
-        ftp.login()
-        ftp.cwd(server_dir)
-        # Loop through and find files
-        for (f, _) in ftp.mlsd():
-            if re.match(fname_regex, f):
-                return f
+    for f in _list_remote_dir(_fix_url(remote_url)):
+        if re.match(fname_regex, f):
+            return f
+
+
+_remote_listings = {}
+_remote_listings_lock = threading.Lock()
+
+
+def _list_remote_dir(remote_url):
+    """
+    List the names of the files in a remote directory.
+
+    Listings are cached for ``remote_listing_ttl`` minutes (set in the heliopy
+    configuration file), so repeatedly looking up files in the same directory
+    only fetches the listing once.
+
+    Parameters
+    ----------
+    remote_url : str
+        URL of a FTP or HTTP directory.
+
+    Returns
+    -------
+    fnames : list of str
+        For FTP directories the file names, and for HTTP directories the
+        targets of all the links in the directory page.
+    """
+    with _remote_listings_lock:
+        if remote_url not in _remote_listings:
+            _remote_listings[remote_url] = [threading.Lock(), None, None]
+        listing = _remote_listings[remote_url]
+
+    # Only one thread fetches each listing, and the others wait for it
+    with listing[0]:
+        fetched, fnames = listing[1:]
+        if fnames is None or (time.monotonic() - fetched >
+                              config['remote_listing_ttl'] * 60):
+            fnames = _fetch_remote_listing(remote_url)
+            listing[1:] = time.monotonic(), fnames
+        return fnames
+
+
+def _fetch_remote_listing(remote_url):
+    if remote_url.startswith('ftp://'):
+        # Split remote url into a server name and directory
+        # Strip ftp:// from front of url
+        remote_ftp = remote_url[6:]
+        server, _, server_dir = remote_ftp.partition('/')
+
+        def list_dir():
+            # Login to remote server
+            with _host_slot(remote_url), ftplib.FTP(server) as ftp:
+                ftp.login()
+                ftp.cwd('/' + server_dir)
+                return [f for (f, _) in ftp.mlsd()]
+        return _call_with_retries(list_dir, (ftplib.error_temp, OSError),
+                                  f'Listing {remote_url}')
+
+    from bs4 import BeautifulSoup
+    response = _request(remote_url)
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    return [node.get('href') for node in soup.find_all('a')
+            if node.get('href') is not None]
 
 
 def _load_cdf(file_path):
@@ -944,8 +1672,117 @@ def _load_local(file_path, filetype=None):
     if _is_cdf(file_path):
         return _load_cdf(file_path)
     else:
-        f = open(str(file_path))
-        return f
+        return _open_raw(file_path)
+
+
+# Suffixes added to raw files compressed with each raw_compression method
+_COMPRESSION_SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+
+
+def _uncompressed_path(file_path):
+    """
+    Path of raw file *file_path* without any compression suffix.
+    """
+    if file_path.suffix in _COMPRESSION_SUFFIXES.values():
+        return file_path.with_suffix('')
+    return file_path
+
+
+def _local_raw_file(file_path):
+    """
+    Find the local copy of raw file *file_path*, which might have been stored
+    compressed. Returns ``None`` if there is no local copy.
+    """
+    for suffix in [''] + list(_COMPRESSION_SUFFIXES.values()):
+        raw_path = file_path.with_name(file_path.name + suffix)
+        if raw_path.exists():
+            return raw_path
+
+
+def _compress_raw_file(file_path, method=None):
+    """
+    Compress the plain text file *file_path*, replacing the original file.
+
+    Parameters
+    ----------
+    file_path : pathlib.Path
+    method : str, optional
+        ``'gzip'``, ``'zstd'`` or ``'none'``. If ``'none'`` the file is left
+        as it is. If not given, the ``raw_compression`` value from the
+        heliopyrc file is used.
+
+    Returns
+    -------
+    pathlib.Path
+        Path to the compressed file.
+    """
+    if method is None:
+        method = config['raw_compression']
+    if method == 'none' or file_path.suffix in _COMPRESSION_SUFFIXES.values():
+        return file_path
+    if method not in _COMPRESSION_SUFFIXES:
+        raise ValueError('raw_compression must be one of none, gzip or '
+                         f'zstd (got {method})')
+
+    compressed_path = file_path.with_name(
+        file_path.name + _COMPRESSION_SUFFIXES[method])
+    if method == 'gzip':
+        open_compressed = gzip.open
+    else:
+        open_compressed = _import_zstandard().open
+    with lock.temporary_path(compressed_path) as temp_path, \
+            open(file_path, 'rb') as f, \
+            open_compressed(temp_path, 'wb') as out:
+        shutil.copyfileobj(f, out)
+    os.remove(file_path)
+    manifest.record(file_path)
+    # Remove copies stored with a different compression method
+    for suffix in _COMPRESSION_SUFFIXES.values():
+        old_path = file_path.with_name(file_path.name + suffix)
+        if old_path != compressed_path and old_path.exists():
+            os.remove(old_path)
+            manifest.record(old_path)
+    manifest.record(compressed_path)
+    return compressed_path
+
+
+def _open_raw(file_path):
+    """
+    Open the raw text file *file_path* for reading, decompressing it if it
+    has a .gz or .zst suffix.
+    """
+    file_path = path.Path(file_path)
+    if file_path.suffix == '.gz':
+        return gzip.open(file_path, 'rt')
+    elif file_path.suffix == '.zst':
+        zstandard = _import_zstandard()
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(file_path, 'rb'), closefd=True)
+        return _DecompressedTextFile(reader, str(file_path))
+    return open(str(file_path))
+
+
+class _DecompressedTextFile(io.TextIOWrapper):
+    """
+    Text stream reading from a decompressing *buffer*, which keeps the
+    *name* of the compressed file like a normal file object does.
+    """
+    def __init__(self, buffer, name):
+        super().__init__(buffer)
+        self._name = name
+
+    @property
+    def name(self):
+        return self._name
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('The zstandard package is needed to store raw '
+                          'files with raw_compression = zstd')
+    return zstandard
 
 
 def _reporthook(blocknum, blocksize, totalsize):
@@ -976,18 +1813,418 @@ def _download_remote_unknown_version(
     _download_remote(remote_url_dir, fname, local_dir)
 
 
-def _download_remote(remote_url, filename, local_dir):
+def _download_remote(remote_url, filename, local_dir, revalidate=False):
+    """
+    Download *remote_url* / *filename* to *local_dir*.
+
+    Parameters
+    ----------
+    remote_url : str
+    filename : str
+    local_dir : str or pathlib.Path
+    revalidate : bool, optional
+        If ``True`` and the file has already been downloaded, only download
+        it again if the remote file has changed. This is done using the
+        ``ETag`` and ``Last-Modified`` headers from the previous download,
+        which are stored in a ``.http.json`` file next to the downloaded file.
+
+    Returns
+    -------
+    bool
+        ``False`` if the local file is already up to date, ``True`` otherwise.
+
+    Raises
+    ------
+    NoDataError
+        If the file isn't available remotely.
+    """
     dl_path = path.Path(local_dir) / filename
     remote_url = _fix_url(remote_url)
     remote_url = remote_url + '/' + filename
-    with requests.head(remote_url) as r:
-        if r.status_code != requests.codes.ok:
-            raise NoDataError
+    if remote_url.startswith('ftp://'):
+        # requests doesn't support FTP, so fall back on urllib
+        print(f'Downloading {remote_url} to {dl_path}')
+        part_path = _part_path(dl_path)
+
+        def retrieve():
+            with _host_slot(remote_url):
+                urlreq.urlretrieve(remote_url, filename=str(part_path),
+                                   reporthook=_reporthook)
+        # urllib reports all FTP errors as URLErrors. Permanent errors
+        # (e.g. the file not existing) have a 5xx reply code, so aren't worth
+        # retrying.
+        with lock.locked(dl_path):
+            _call_with_retries(
+                retrieve, urlerror.URLError, f'Download of {remote_url}',
+                retry_if=lambda e: not re.search(r'\b5\d\d\b', str(e)))
+            os.replace(part_path, dl_path)
+        manifest.record(dl_path)
+        print('\n')
+        return True
+
+    validators_path = dl_path.with_name(dl_path.name + '.http.json')
+    headers = {}
+    if revalidate and _local_raw_file(dl_path) is not None and \
+            validators_path.exists():
+        with open(validators_path) as f:
+            validators = json.load(f)
+        if validators.get('ETag'):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified'):
+            headers['If-Modified-Since'] = validators['Last-Modified']
+
     print(f'Downloading {remote_url} to {dl_path}')
-    fname, _ = urlreq.urlretrieve(remote_url,
-                                  filename=str(dl_path),
-                                  reporthook=_reporthook)
-    print('\n')
+    response_headers = _download_url(remote_url, dl_path, headers=headers)
+    if response_headers is None:
+        print(f'{dl_path} is up to date')
+        return False
+    manifest.record(dl_path)
+    if revalidate:
+        with open(validators_path, 'w') as f:
+            json.dump({key: response_headers.get(key) for key in
+                       ['ETag', 'Last-Modified']}, f)
+    return True
+
+
+class IncompleteDownloadError(RuntimeError):
+    pass
+
+
+def _part_path(dl_path):
+    """
+    Path that a download is written to before it is complete.
+    """
+    return dl_path.with_name(dl_path.name + '.part')
+
+
+def _download_url(url, dl_path, **kwargs):
+    """
+    Download *url* to *dl_path*.
+
+    The data is written to a ``.part`` file next to *dl_path*, along with a
+    small ``.part.json`` journal containing the URL and the validators
+    (``ETag``, ``Last-Modified``) sent by the server. If a download is
+    interrupted, the next call resumes from the end of the ``.part`` file using
+    a HTTP ``Range`` request. Once the size of the ``.part`` file matches the
+    size reported by the server it is renamed to *dl_path*, so *dl_path* never
+    contains a partial download. The lock on *dl_path* is held while
+    downloading, so other processes wait instead of writing to the same
+    ``.part`` file.
+
+    Parameters
+    ----------
+    url : str
+    dl_path : pathlib.Path
+    kwargs :
+        Passed to :meth:`requests.Session.get`.
+
+    Returns
+    -------
+    headers : dict or None
+        Headers of the response, or ``None`` if the server responded with
+        ``304 Not Modified`` to a conditional request.
+
+    Raises
+    ------
+    NoDataError
+        If the server doesn't respond with the requested file.
+    IncompleteDownloadError
+        If fewer bytes than expected were received, even after retrying
+        ``max_retries`` times. Calling this function again will resume the
+        download.
+    """
+    # Only one process at a time can write to the .part file
+    with lock.locked(dl_path):
+        return _call_with_retries(
+            lambda: _download_url_once(url, dl_path, **kwargs),
+            (IncompleteDownloadError, urllib3.exceptions.HTTPError),
+            f'Download of {url}')
+
+
+def _download_url_once(url, dl_path, **kwargs):
+    dl_path = path.Path(dl_path)
+    part_path = _part_path(dl_path)
+    journal_path = part_path.with_name(part_path.name + '.json')
+    # Ask for the raw bytes, so Content-Length and Range refer to the file
+    request_headers = kwargs.pop('headers', {})
+    headers = {'Accept-Encoding': 'identity'}
+    headers.update(request_headers)
+
+    journal = {}
+    if part_path.exists() and journal_path.exists():
+        with open(journal_path) as f:
+            journal = json.load(f)
+    offset = 0
+    if journal.get('url') == url and journal.get('validator'):
+        offset = part_path.stat().st_size
+        headers['Range'] = f'bytes={offset}-'
+        # If the remote file has changed, the server sends all of it
+        headers['If-Range'] = journal['validator']
+
+    r = _request(url, stream=True, headers=headers, **kwargs)
+    with _host_slot(url), r:
+        if r.status_code == requests.codes.not_modified:
+            return None
+        if (offset and r.status_code ==
+                requests.codes.requested_range_not_satisfiable):
+            # The partial file is no good, so start again from scratch
+            os.remove(part_path)
+            os.remove(journal_path)
+            return _download_url(url, dl_path, headers=request_headers,
+                                 **kwargs)
+        if r.status_code == requests.codes.partial_content:
+            total = int(r.headers['Content-Range'].split('/')[-1])
+        elif r.status_code == requests.codes.ok:
+            offset = 0
+            total = r.headers.get('Content-Length')
+            total = int(total) if total is not None else None
+        else:
+            raise NoDataError(
+                f'Request for {url} failed with status {r.status_code}')
+
+        validator = r.headers.get('ETag', r.headers.get('Last-Modified'))
+        with open(journal_path, 'w') as f:
+            json.dump({'url': url, 'validator': validator, 'size': total}, f)
+        # Keep whatever is received if the connection drops, and check the
+        # size below instead, so a retry can resume from there
+        r.raw.enforce_content_length = False
+        _write_response(r, part_path, offset=offset, totalsize=total)
+
+    size = part_path.stat().st_size
+    if total is not None and size != total:
+        raise IncompleteDownloadError(
+            f'Only received {size} out of {total} bytes from {url}')
+    os.replace(part_path, dl_path)
+    os.remove(journal_path)
+    return r.headers
+
+
+def _write_response(response, dl_path, offset=0, totalsize=None,
+                    min_block_size=2**16, max_block_size=2**23):
+    """
+    Write the content of a streamed *response* to *dl_path*.
+
+    The content is read in blocks that start at *min_block_size* bytes, and
+    double in size each time a full block is read up to *max_block_size*,
+    so fast downloads take few iterations. If *offset* is non-zero, the
+    content is appended to the first *offset* bytes of *dl_path*.
+    """
+    dl_path = path.Path(dl_path)
+    block_size = min_block_size
+    with open(dl_path, 'r+b' if offset else 'wb') as f, \
+            tqdm.tqdm(total=totalsize, initial=offset, desc=dl_path.name,
+                      unit='B', unit_scale=True, unit_divisor=1024,
+                      leave=False) as progress:
+        f.seek(offset)
+        f.truncate()
+        while True:
+            block = response.raw.read(block_size, decode_content=True)
+            if not block:
+                break
+            f.write(block)
+            progress.update(len(block))
+            if len(block) == block_size:
+                block_size = min(2 * block_size, max_block_size)
+
+
+# Status codes worth retrying a request after
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Longest time to wait between attempts, unless the server asks for longer
+_MAX_BACKOFF = 60
+
+
+def _request(url, method='GET', max_retries=None, **kwargs):
+    """
+    Make a HTTP request using the shared session from :func:`get_session`.
+
+    The number of requests running at the same time to each host is limited
+    (see :func:`_host_slot`). If the connection fails, or the server responds
+    with a status code in ``_RETRY_STATUSES``, the request is retried up to
+    ``max_retries`` times. Between each attempt the request waits for any
+    time given by a ``Retry-After`` header in the response, otherwise for
+    an exponentially increasing random time (see :func:`_backoff`).
+
+    Parameters
+    ----------
+    url : str
+    method : str, optional
+    max_retries : int, optional
+        Defaults to the ``max_retries`` configuration option.
+    kwargs :
+        Passed to :meth:`requests.Session.request`.
+
+    Returns
+    -------
+    response : requests.Response
+        The response to the last attempt.
+    """
+    if max_retries is None:
+        max_retries = config['max_retries']
+    attempt = 0
+    while True:
+        try:
+            with _host_slot(url):
+                response = get_session().request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            if attempt >= max_retries:
+                raise
+            delay = _backoff(attempt)
+            reason = str(e)
+        else:
+            if (response.status_code not in _RETRY_STATUSES or
+                    attempt >= max_retries):
+                return response
+            delay = _retry_after(response)
+            if delay is None:
+                delay = _backoff(attempt)
+            reason = f'status {response.status_code}'
+            response.close()
+        logger.info(f'Request for {url} failed ({reason}), retrying in '
+                    f'{delay:.1f} s')
+        time.sleep(delay)
+        attempt += 1
+
+
+def _call_with_retries(func, exceptions, description, max_retries=None,
+                       retry_if=None):
+    """
+    Call *func* with no arguments, retrying up to ``max_retries`` times with
+    an exponentially increasing delay if it raises one of *exceptions*.
+    If *retry_if* is given, it is called with the exception, and the call is
+    only retried if it returns ``True``.
+    """
+    if max_retries is None:
+        max_retries = config['max_retries']
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except exceptions as e:
+            if attempt >= max_retries or (retry_if is not None and
+                                          not retry_if(e)):
+                raise
+            delay = _backoff(attempt)
+            logger.info(f'{description} failed ({e}), retrying in '
+                        f'{delay:.1f} s')
+            time.sleep(delay)
+            attempt += 1
+
+
+def _backoff(attempt):
+    """
+    Time to wait before retrying after *attempt* (starting from zero) has
+    failed. This is a random time between zero and
+    ``backoff_factor * 2**attempt`` seconds, so that many clients retrying at
+    once don't all send their requests at the same time.
+    """
+    return random.uniform(
+        0, min(config['backoff_factor'] * 2**attempt, _MAX_BACKOFF))
+
+
+def _retry_after(response):
+    """
+    Number of seconds to wait given by the ``Retry-After`` header of
+    *response*, or ``None`` if it isn't present.
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0)
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max((date - dt.datetime.now(dt.timezone.utc)).total_seconds(), 0)
+
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+_held_hosts = threading.local()
+
+
+@contextlib.contextmanager
+def _host_slot(url):
+    """
+    Context manager that waits until fewer than ``max_connections_per_host``
+    (set in the heliopy configuration file) downloads from the host of *url*
+    are running.
+
+    A thread that already holds a slot for a host doesn't need another one.
+    """
+    host = urllib.parse.urlsplit(url).netloc
+    limit = config['max_connections_per_host']
+    if not hasattr(_held_hosts, 'hosts'):
+        _held_hosts.hosts = set()
+    if limit < 1 or host in _held_hosts.hosts:
+        yield
+        return
+
+    with _host_semaphores_lock:
+        if host not in _host_semaphores:
+            _host_semaphores[host] = threading.BoundedSemaphore(limit)
+        semaphore = _host_semaphores[host]
+    with semaphore:
+        _held_hosts.hosts.add(host)
+        try:
+            yield
+        finally:
+            _held_hosts.hosts.remove(host)
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Get the HTTP session shared by all of :mod:`heliopy.data`.
+
+    Using a single :class:`requests.Session` means connections to each remote
+    server are kept alive and re-used, instead of a new connection being
+    opened for every request. The number of connections kept open to each
+    host is set by the ``pool_maxsize`` and ``host_pool_sizes`` options in
+    the heliopyrc file.
+
+    Returns
+    -------
+    session : requests.Session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _new_session(config['pool_maxsize'],
+                                    config['host_pool_sizes'])
+    return _session
+
+
+def _new_session(pool_maxsize, host_pool_sizes):
+    """
+    Create a new session.
+
+    Parameters
+    ----------
+    pool_maxsize : int
+        Default number of connections to keep open to each host.
+    host_pool_sizes : dict
+        Maps host names to the number of connections to keep open to that
+        host, overriding *pool_maxsize*.
+    """
+    session = requests.Session()
+    pool_connections = max(10, len(host_pool_sizes))
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    for scheme in ['http://', 'https://']:
+        session.mount(scheme, adapter)
+    # Mounting an adapter for a host gives it its own connection pool
+    for host, size in host_pool_sizes.items():
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=size)
+        for scheme in ['http://', 'https://']:
+            session.mount(scheme + host, adapter)
+    return session
 
 
 def _load_remote(remote_url, filename, local_dir, filetype):
@@ -42,9 +42,9 @@ def _setup_spice():
     '''
     global _SPICE_SETUP
     if not _SPICE_SETUP:
-        for kernel in dataspice.generic_kernels:
-            loc = dataspice.get_kernel(kernel.short_name)
-            spiceypy.furnsh(loc)
+        names = [kernel.short_name for kernel in dataspice.generic_kernels]
+        for locs in dataspice.get_kernels(names):
+            spiceypy.furnsh(locs)
         _SPICE_SETUP = True
 
 
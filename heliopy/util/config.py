@@ -68,7 +68,77 @@ def load_config():
             config['DEFAULT']['cluster_cookie'] == 'none':
         config['DEFAULT']['cluster_cookie'] = os.environ.get('CLUSTERCOOKIE')
     config_dict['cluster_cookie'] = config['DEFAULT']['cluster_cookie']
+    # Request several days of Cluster data at once
+    config_dict['cluster_coalesce'] = \
+        config['DEFAULT'].get('cluster_coalesce', 'False') == 'True'
 
     config_dict['use_hdf'] = config['DEFAULT']['use_hdf'] == 'True'
+    # Format and compression of converted files
+    config_dict['cache_format'] = \
+        config['DEFAULT'].get('cache_format', 'hdf').lower()
+    config_dict['cache_compression'] = \
+        config['DEFAULT'].get('cache_compression', '').strip() or None
+    cache_compression_level = \
+        config['DEFAULT'].get('cache_compression_level', '').strip()
+    config_dict['cache_compression_level'] = \
+        int(cache_compression_level) if cache_compression_level else None
+    # Which copies of downloaded data to keep
+    config_dict['cache_tier'] = \
+        config['DEFAULT'].get('cache_tier', 'both').lower()
+    # Megabytes of converted data to keep in memory
+    config_dict['memory_cache_size'] = float(
+        config['DEFAULT'].get('memory_cache_size', '0'))
+    # Megabytes of local files to keep, overall and for each dataset
+    config_dict['disk_quota'] = float(
+        config['DEFAULT'].get('disk_quota', '0'))
+    dataset_quotas = {}
+    for item in config['DEFAULT'].get('dataset_quotas', '').split(','):
+        if item.strip():
+            dataset, size = item.rsplit(':', 1)
+            dataset_quotas[dataset.strip()] = float(size)
+    config_dict['dataset_quotas'] = dataset_quotas
+    # Which copies of the data to remove first to keep within the quotas
+    config_dict['quota_policy'] = \
+        config['DEFAULT'].get('quota_policy', 'both').lower()
+    # Compression of downloaded plain text files
+    config_dict['raw_compression'] = \
+        config['DEFAULT'].get('raw_compression', 'none').lower()
+
+    # Number of files to download at the same time
+    config_dict['max_workers'] = int(
+        config['DEFAULT'].get('max_workers', '1'))
+
+    # Number of files to download from each server at the same time
+    config_dict['max_connections_per_host'] = int(
+        config['DEFAULT'].get('max_connections_per_host', '4'))
+
+    # Retrying failed downloads
+    config_dict['max_retries'] = int(
+        config['DEFAULT'].get('max_retries', '3'))
+    config_dict['backoff_factor'] = float(
+        config['DEFAULT'].get('backoff_factor', '1'))
+
+    # Sizes of the HTTP connection pools
+    config_dict['pool_maxsize'] = int(
+        config['DEFAULT'].get('pool_maxsize', '10'))
+    host_pool_sizes = {}
+    for item in config['DEFAULT'].get('host_pool_sizes', '').split(','):
+        if item.strip():
+            host, size = item.rsplit(':', 1)
+            host_pool_sizes[host.strip()] = int(size)
+    config_dict['host_pool_sizes'] = host_pool_sizes
+
+    # Request several days of CDAS data at once
+    config_dict['cdas_coalesce'] = \
+        config['DEFAULT'].get('cdas_coalesce', 'False') == 'True'
+    # Number of days to cache CDAS variable descriptions for
+    config_dict['cdas_metadata_ttl'] = float(
+        config['DEFAULT'].get('cdas_metadata_ttl', '7'))
+    # Number of days to keep lists of MMS files for
+    config_dict['mms_inventory_ttl'] = float(
+        config['DEFAULT'].get('mms_inventory_ttl', '1'))
+    # Number of minutes to keep remote directory listings for
+    config_dict['remote_listing_ttl'] = float(
+        config['DEFAULT'].get('remote_listing_ttl', '60'))
 
     return config_dict
@@ -36,6 +36,9 @@ setup(name='HelioPy',
                       'data': ['pandas', 'sunpy', 'requests', 'cdflib',
                                'wget'],
                       'coordinates': ['sunpy']},
+      entry_points={'console_scripts': [
+          'heliopy-prefetch = heliopy.data.prefetch:main',
+          'heliopy-cache = heliopy.data.quota:main']},
       python_requires='>=3.6',
       packages=['heliopy',
                 'heliopy.data',